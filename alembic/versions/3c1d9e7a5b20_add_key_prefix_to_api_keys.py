@@ -0,0 +1,33 @@
+"""add key_prefix to api_keys
+
+Revision ID: 3c1d9e7a5b20
+Revises: af6bf7b1062f
+Create Date: 2026-10-18 09:12:31.402117
+
+As chaves já emitidas só possuem o hash bcrypt, então o prefixo não pode ser
+calculado aqui: a coluna nasce nula e é preenchida na primeira validação bem
+sucedida de cada chave antiga (ver ApiKeyService._find_legacy_api_key).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d9e7a5b20'
+down_revision: Union[str, None] = 'af6bf7b1062f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('api_keys', sa.Column('key_prefix', sa.String(), nullable=True))
+    op.create_index(op.f('ix_api_keys_key_prefix'), 'api_keys', ['key_prefix'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_api_keys_key_prefix'), table_name='api_keys')
+    op.drop_column('api_keys', 'key_prefix')
@@ -0,0 +1,32 @@
+"""add tier to api_keys
+
+Revision ID: 7b4e2f9c1d36
+Revises: 3c1d9e7a5b20
+Create Date: 2026-10-18 15:40:07.218345
+
+As chaves existentes ficam no tier "standard".
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b4e2f9c1d36'
+down_revision: Union[str, None] = '3c1d9e7a5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'api_keys',
+        sa.Column('tier', sa.String(), nullable=False, server_default='standard'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('api_keys', 'tier')
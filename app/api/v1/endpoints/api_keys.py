@@ -33,3 +33,4 @@ def create_new_api_key_endpoint(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao criar chave de API: {str(e)}",
         )
+
@@ -1,69 +1,317 @@
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+import json
+from typing import List, Optional
+from fastapi import APIRouter, File, Form, UploadFile, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import AnyHttpUrl
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from app.services.plate_service import PlateService
-from app.schemas.plate import TaskStatusResponse
-from app.core.dependencies import get_valid_api_key
+from app.schemas.plate import (
+    BatchSubmissionResponse,
+    CascadeAttemptStats,
+    CascadeClassStats,
+    QueueDepth,
+    TaskStatusBatchRequest,
+    TaskStatusResponse,
+)
+from app.core.dependencies import api_key_service, get_authenticated_api_key
+from app.db.database import get_async_db
 from app.schemas.api_key import ApiKeyInDB
-from app.celery_app import celery
+from app.services import task_status
+from app.services.admission import admission_controller
+from app.services.cascade_stats import cascade_stats
+from app.services.queues import queue_depths
+from app.celery_app import plate_queue
+from app.core.config import settings
+from app.services.notifications import (
+    UnsafeCallbackError,
+    resolve_callback_url,
+    task_notifier,
+)
 
 
 router = APIRouter()
 plate_service = PlateService()
 
 
+async def _admit_and_charge(
+    db: AsyncSession, api_key_data: ApiKeyInDB, amount: int
+) -> None:
+    """
+    Reserva 'amount' vagas no controle de admissão (429 se a chave já tem tasks
+    demais pendentes) e só então cobra a quota. Se a cobrança falhar, as vagas
+    são devolvidas; trabalho recusado nunca consome quota.
+    """
+    await admission_controller.reserve(api_key_data.id, amount)
+    try:
+        charged = await api_key_service.charge_api_key(db, api_key_data, amount)
+    except Exception:
+        await admission_controller.release(api_key_data.id, amount)
+        raise
+    if not charged:
+        await admission_controller.release(api_key_data.id, amount)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=(
+                "API Key inválida, inativa, expirada ou limite de chamadas excedido."
+                if amount == 1
+                else f"Limite de chamadas insuficiente para {amount} imagens."
+            ),
+            headers={"WWW-Authenticate": "X-API-Key"},
+        )
+
+
+async def _refund_charge(
+    db: AsyncSession, api_key_data: ApiKeyInDB, amount: int
+) -> None:
+    """
+    Devolve a quota cobrada por _admit_and_charge quando o processamento falha
+    antes de a resposta sair (as vagas de admissão são devolvidas pelo serviço).
+    """
+    try:
+        await api_key_service.refund_api_key(db, api_key_data, amount)
+    except Exception as e:
+        print(
+            f"ATENÇÃO: Falha ao devolver {amount} chamadas da chave "
+            f"{api_key_data.id}: {str(e)}"
+        )
+
+
+async def _checked_callback_url(callback_url: Optional[AnyHttpUrl]) -> Optional[str]:
+    """Recusa (400) callback_url que aponte para a rede interna ou host não permitido."""
+    if callback_url is None:
+        return None
+    url = str(callback_url)
+    try:
+        await run_in_threadpool(resolve_callback_url, url)
+    except UnsafeCallbackError as e:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail=f"callback_url recusada: {str(e)}",
+        )
+    return url
+
+
 @router.post(
     "/processar-placa",
     summary="Processar imagem de placa",
-    description="Envia a imagem para processamento assíncrono via Celery e retorna o task_id.",
+    description=(
+        "Envia a imagem para processamento assíncrono via Celery e retorna o task_id. "
+        "Com as filas sobrecarregadas a resposta é 503, e com tarefas demais da chave "
+        "aguardando processamento, 429 (ambas com Retry-After e sem cobrar a quota)."
+    ),
     response_model=TaskStatusResponse,
 )
 async def processar_placa(
     file: UploadFile = File(..., description="Imagem da placa"),
-    api_key_data: ApiKeyInDB = Depends(get_valid_api_key),
+    callback_url: Optional[AnyHttpUrl] = Form(
+        None, description="URL que receberá (POST) o resultado quando a task terminar"
+    ),
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    if not file.content_type.startswith("image/"):
+    callback = await _checked_callback_url(callback_url)
+
+    # A quota só é cobrada depois que a imagem foi validada, gravada e admitida.
+    # O formato é identificado pelos bytes da imagem (stage recusa com 400 o que
+    # não for imagem), e não pelo content type declarado pelo cliente.
+    blob_ref, content_type = await plate_service.stage(file)
+    await _admit_and_charge(db, api_key_data, 1)
+
+    try:
+        result = await plate_service.process_plate_image(
+            blob_ref,
+            file.filename,
+            content_type,
+            api_key=api_key_data,
+            callback_url=callback,
+        )
+    except Exception:
+        await _refund_charge(db, api_key_data, 1)
+        raise
+
+    return result
+
+
+@router.post(
+    "/processar-placas",
+    summary="Processar lote de imagens de placas",
+    description=(
+        "Envia várias imagens de uma vez (campo 'files' repetido e/ou um zip/tar no "
+        "campo 'arquivo'). A quota é cobrada uma vez, pelo número de imagens válidas, "
+        "e as tasks são enfileiradas como um grupo Celery."
+    ),
+    response_model=BatchSubmissionResponse,
+)
+async def processar_placas(
+    files: Optional[List[UploadFile]] = File(None, description="Imagens das placas"),
+    arquivo: Optional[UploadFile] = File(
+        None, description="Arquivo zip ou tar com as imagens"
+    ),
+    callback_url: Optional[AnyHttpUrl] = Form(
+        None, description="URL que receberá (POST) o resultado de cada imagem"
+    ),
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if not files and arquivo is None:
         raise HTTPException(
             status.HTTP_400_BAD_REQUEST,
-            detail="Arquivo enviado não é uma imagem válida.",
+            detail="Nenhuma imagem enviada.",
         )
 
-    result = await plate_service.process_plate_image(file)
+    callback = await _checked_callback_url(callback_url)
 
-    return result
+    staged, rejected = await run_in_threadpool(
+        plate_service.stage_batch, files or [], arquivo
+    )
+
+    if staged:
+        await _admit_and_charge(db, api_key_data, len(staged))
+
+    try:
+        return await plate_service.process_plate_batch(
+            staged,
+            rejected,
+            api_key=api_key_data,
+            callback_url=callback,
+        )
+    except Exception:
+        if staged:
+            await _refund_charge(db, api_key_data, len(staged))
+        raise
+
+
+@router.get(
+    "/events",
+    summary="Recebe as conclusões das tasks por Server-Sent Events",
+    description=(
+        "Mantém a conexão aberta e envia um evento 'task' (no formato de "
+        "/tasks/{task_id}, com group_id) a cada task da chave que terminar. "
+        "Com group_id, só as tasks daquele lote. Tasks concluídas antes da "
+        "conexão não são reenviadas: consulte-as por /tasks."
+    ),
+)
+async def stream_events(
+    group_id: Optional[str] = None,
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # A conexão fica aberta por muito tempo: devolve ao pool a conexão do banco
+    # usada na autenticação antes de começar a transmitir
+    await db.close()
+
+    async def event_stream():
+        async for event in task_notifier.listen(api_key_data.id, group_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: task\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _owned_task_ids(api_key_data: ApiKeyInDB, task_ids: List[str]) -> List[str]:
+    """Tasks (da lista) enviadas pela chave; 503 se o registro estiver indisponível."""
+    try:
+        return await task_status.owned_task_ids(api_key_data.id, task_ids)
+    except RedisError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Consulta de tasks indisponível: {str(e)}",
+        )
 
 
 @router.get(
     "/tasks/{task_id}",
     response_model=TaskStatusResponse,
     summary="Consulta status e resultado da task de processamento de placa",
+    description="Só a chave de API que enviou a task pode consultá-la; as demais recebem 404.",
+)
+async def get_task_status(
+    task_id: str,
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+):
+    if not await _owned_task_ids(api_key_data, [task_id]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task não encontrada.",
+        )
+    return await run_in_threadpool(task_status.get_task_status, task_id)
+
+
+@router.post(
+    "/tasks/status",
+    response_model=List[TaskStatusResponse],
+    summary="Consulta o status de várias tasks de uma vez",
+    description=(
+        "Recebe uma lista de task_ids e devolve o status de cada uma, na mesma "
+        "ordem, lendo o backend do Celery numa única operação. Só entram na "
+        "resposta as tasks enviadas pela chave de API da requisição."
+    ),
 )
-async def get_task_status(task_id: str):
-    async_result = celery.AsyncResult(task_id)
-    if async_result.state == "PENDING":
-        return TaskStatusResponse(task_id=task_id, status="pending")
-    elif async_result.state == "STARTED":
-        return TaskStatusResponse(task_id=task_id, status="started")
-    elif async_result.state == "FAILURE":
-        # Pode retornar a exceção ou mensagem de erro
-        return TaskStatusResponse(task_id=task_id, status="failure")
-    elif async_result.state == "SUCCESS":
-        result = async_result.result  # deve ser dict com placa e alternativas
-        placa = None
-        alternativas = []
-        if result:
-            placa = result.get("placa")
-            if result.get("results") and len(result["results"]) > 0:
-                top_result = result["results"][0]
-                alternativas = [
-                    c.get("plate")
-                    for c in top_result.get("candidates", [])
-                    if c.get("plate") and c.get("plate") != placa
-                ]
-        return TaskStatusResponse(
-            task_id=task_id,
-            status="success",
-            placa=placa,
-            alternativas=alternativas,
+async def get_task_statuses(
+    request: TaskStatusBatchRequest,
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+):
+    task_ids = await _owned_task_ids(api_key_data, request.task_ids)
+    return await run_in_threadpool(task_status.get_task_statuses, task_ids)
+
+
+@router.get(
+    "/queues",
+    response_model=List[QueueDepth],
+    summary="Tamanho das filas de processamento por tier",
+)
+async def get_queue_depths(
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+):
+    try:
+        depths = await queue_depths()
+    except RedisError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Tamanho das filas indisponível: {str(e)}",
+        )
+    return [
+        QueueDepth(tier=tier, queue=plate_queue(tier), depth=depth)
+        for tier, depth in depths.items()
+    ]
+
+
+@router.get(
+    "/ocr-cascade",
+    response_model=List[CascadeClassStats],
+    summary="Estatísticas e ordem atual da cascata de OCR por classe detectada",
+)
+async def get_ocr_cascade_stats(
+    api_key_data: ApiKeyInDB = Depends(get_authenticated_api_key),
+):
+    try:
+        snapshot = await cascade_stats.snapshot()
+    except RedisError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Estatísticas da cascata de OCR indisponíveis: {str(e)}",
+        )
+    return [
+        CascadeClassStats(
+            classe=classe,
+            ordem=cascade_stats.ordenar(stats, list(settings.OCR_CASCADE_ORDER)),
+            tentativas=[
+                CascadeAttemptStats(
+                    tentativa=nome,
+                    amostras=s["n"],
+                    taxa_acerto=s["ok"] / s["n"],
+                    latencia_media_segundos=s["lat"],
+                )
+                for nome, s in stats.items()
+            ],
         )
-    else:
-        return TaskStatusResponse(task_id=task_id, status=async_result.state.lower())
+        for classe, stats in snapshot.items()
+    ]
@@ -0,0 +1,20 @@
+"""
+Harness de carga e benchmark da API de placas.
+
+Sobe os stubs do detector e do OCR (app/stubs/plate_services.py) com perfis de
+latência e falha, a API e um worker do Celery, dispara envios para
+/api/v1/processar-placa e consultas a /api/v1/tasks/{task_id} com a
+concorrência pedida e grava o resultado (req/s, p50/p95/p99 de ponta a ponta e
+por etapa, custo da autenticação por número de chaves) num JSON que serve de
+baseline para comparações:
+
+    python -m app.bench.run --requests 500 --concurrency 32 --profile realistic
+    python -m app.bench.compare baseline.json atual.json --tolerance 0.1
+
+Por padrão o broker e o backend de resultados do Celery ficam em memória
+(tudo no mesmo processo); com '--broker redis' o worker roda num processo
+separado, como em produção. A autenticação usa o PostgreSQL configurado no
+ambiente (POSTGRES_*): o harness cria as chaves de que precisa e as apaga ao
+final. Para não gravar em produção por engano, ele só roda se o nome do banco
+contiver 'bench' ou 'test', ou com '--allow-db-writes'.
+"""
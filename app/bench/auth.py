@@ -0,0 +1,162 @@
+import time
+from typing import List, Tuple
+
+from passlib.context import CryptContext
+from sqlalchemy.orm import Session
+
+from app.bench.stats import resumir
+from app.core.api_key_cache import verified_key_cache
+from app.core.config import settings
+from app.core.security import (
+    generate_api_key,
+    get_api_key_hash,
+    get_api_key_prefix,
+    pwd_context,
+)
+from app.db.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.db.models import ApiKey
+from app.services.api_key_service import ApiKeyService
+
+api_key_service = ApiKeyService()
+
+# Descrição das chaves criadas pelo harness (usada para apagá-las ao final)
+DESCRICAO_BENCH = "bench:{execucao}"
+
+# Trechos do nome do banco (POSTGRES_DB) que o identificam como descartável
+MARCADORES_BANCO_BENCH = ("bench", "test")
+
+
+class BancoNaoPermitidoError(RuntimeError):
+    """O banco configurado não é de benchmark/teste e a gravação não foi liberada."""
+
+
+def exigir_banco_de_bench() -> None:
+    """
+    Recusa gravar no banco configurado se ele não for de benchmark/teste (nome
+    com um dos MARCADORES_BANCO_BENCH) e BENCH_ALLOW_DB_WRITES estiver desligado:
+    o harness cria milhares de chaves e não deve rodar contra produção por engano.
+    """
+    nome = settings.POSTGRES_DB.lower()
+    if settings.BENCH_ALLOW_DB_WRITES or any(m in nome for m in MARCADORES_BANCO_BENCH):
+        return
+    raise BancoNaoPermitidoError(
+        f"O banco '{settings.POSTGRES_DB}' não parece ser de benchmark/teste. Use um "
+        f"banco com 'bench' ou 'test' no nome ou rode com --allow-db-writes "
+        f"(BENCH_ALLOW_DB_WRITES=true)."
+    )
+
+
+# As chaves de preenchimento só ocupam a tabela: um bcrypt barato acelera a
+# criação de milhares delas sem mudar o custo da chave medida.
+_hash_barato = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+
+def criar_chave(db: Session, execucao: str, call_limit: int, tier: str | None = None) -> Tuple[int, str]:
+    """Cria uma chave de API com o custo de bcrypt real; devolve (id, chave em texto)."""
+    exigir_banco_de_bench()
+    chave = generate_api_key(settings.API_KEY_LENGTH)
+    db_key = ApiKey(
+        key_hash=get_api_key_hash(chave),
+        key_prefix=get_api_key_prefix(chave),
+        description=DESCRICAO_BENCH.format(execucao=execucao),
+        call_limit=call_limit,
+        tier=tier or settings.DEFAULT_API_KEY_TIER,
+    )
+    db.add(db_key)
+    db.commit()
+    return db_key.id, chave
+
+
+def criar_chaves_preenchimento(db: Session, execucao: str, quantidade: int) -> None:
+    """Cria 'quantidade' chaves ativas (com prefixo, como as emitidas hoje)."""
+    exigir_banco_de_bench()
+    descricao = DESCRICAO_BENCH.format(execucao=execucao)
+    for _ in range(quantidade):
+        chave = generate_api_key(settings.API_KEY_LENGTH)
+        db.add(
+            ApiKey(
+                key_hash=_hash_barato.hash(chave),
+                key_prefix=get_api_key_prefix(chave),
+                description=descricao,
+                call_limit=1,
+            )
+        )
+    db.commit()
+
+
+def apagar_chaves(execucao: str) -> int:
+    """Remove as chaves criadas pela execução; devolve quantas foram apagadas."""
+    with SessionLocal() as db:
+        apagadas = (
+            db.query(ApiKey)
+            .filter(ApiKey.description == DESCRICAO_BENCH.format(execucao=execucao))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+    return apagadas
+
+
+def _contar_chaves(db: Session) -> int:
+    return db.query(ApiKey).count()
+
+
+async def _medir(chave: str, iteracoes: int, frio: bool) -> List[float]:
+    """Duração de authenticate_api_key; 'frio' esvazia o cache antes de cada chamada."""
+    duracoes = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(iteracoes):
+            if frio:
+                verified_key_cache.clear()
+            inicio = time.perf_counter()
+            encontrada = await api_key_service.authenticate_api_key(db, chave)
+            duracoes.append(time.perf_counter() - inicio)
+            if encontrada is None:
+                raise RuntimeError("A chave do benchmark não foi autenticada.")
+    return duracoes
+
+
+async def medir_autenticacao(execucao: str, quantidades: List[int], iteracoes: int) -> dict:
+    """
+    Custo da autenticação em função do número de chaves na tabela. Para cada
+    quantidade (crescente), completa a tabela com chaves de preenchimento e mede
+    'iteracoes' autenticações frias (sem o cache de chaves verificadas: consulta
+    pelo prefixo + bcrypt) e quentes (acerto no cache: leitura da linha pelo ID).
+
+    As chaves criadas são apagadas ao final, mesmo se a medição falhar. As
+    conexões assíncronas também são descartadas, pois pertencem ao event loop
+    desta medição.
+    """
+    exigir_banco_de_bench()
+    resultados = []
+    try:
+        with SessionLocal() as db:
+            _, chave = criar_chave(db, execucao, call_limit=1)
+            for quantidade in sorted(quantidades):
+                faltam = quantidade - _contar_chaves(db)
+                if faltam > 0:
+                    criar_chaves_preenchimento(db, execucao, faltam)
+                total = _contar_chaves(db)
+
+                frio = await _medir(chave, iteracoes, frio=True)
+                quente = await _medir(chave, iteracoes, frio=False)
+                resultados.append(
+                    {"api_keys": total, "cold": resumir(frio), "warm": resumir(quente)}
+                )
+                print(
+                    f"auth: {total} chaves, fria p50={resumir(frio)['p50'] * 1000:.1f}ms, "
+                    f"quente p50={resumir(quente)['p50'] * 1000:.1f}ms"
+                )
+    finally:
+        verified_key_cache.clear()
+        await async_engine.dispose()
+        try:
+            print(f"auth: chaves da medição apagadas: {apagar_chaves(execucao)}")
+        except Exception as e:
+            print(f"ATENÇÃO: Falha ao apagar as chaves da execução {execucao}: {str(e)}")
+    return {
+        "iterations": iteracoes,
+        "bcrypt_rounds": pwd_context.handler("bcrypt").default_rounds,
+        "legacy_lookup": settings.API_KEY_LEGACY_LOOKUP,
+        "results": resultados,
+    }
+
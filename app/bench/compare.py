@@ -0,0 +1,112 @@
+import argparse
+import json
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+# Quantis de latência comparados
+QUANTIS_COMPARADOS = ("p50", "p95", "p99")
+
+# (nome da medida, valor, maior é melhor)
+Medida = Tuple[str, Optional[float], bool]
+
+
+def _latencias(prefixo: str, resumo: dict | None) -> Iterator[Medida]:
+    for q in QUANTIS_COMPARADOS:
+        yield f"{prefixo}.{q}", (resumo or {}).get(q), False
+
+
+def medidas(relatorio: dict) -> dict[str, Tuple[Optional[float], bool]]:
+    """Medidas comparáveis de um resultado de app.bench.run."""
+    load = relatorio.get("load", {})
+    requests = load.get("requests") or 0
+    sucesso = load.get("task_status", {}).get("success", 0)
+
+    itens: List[Medida] = [
+        ("load.submit_rps", load.get("submit_rps"), True),
+        ("load.completed_rps", load.get("completed_rps"), True),
+        ("load.success_ratio", sucesso / requests if requests else None, True),
+    ]
+    itens.extend(_latencias("load.submit_latency", load.get("submit_latency")))
+    itens.extend(_latencias("load.end_to_end_latency", load.get("end_to_end_latency")))
+    for etapa, resumo in relatorio.get("stages", {}).items():
+        itens.extend(_latencias(f"stages.{etapa}", resumo))
+    for resultado in relatorio.get("auth", {}).get("results", []):
+        chaves = resultado["api_keys"]
+        itens.extend(_latencias(f"auth.{chaves}_keys.cold", resultado.get("cold")))
+        itens.extend(_latencias(f"auth.{chaves}_keys.warm", resultado.get("warm")))
+    return {nome: (valor, maior_melhor) for nome, valor, maior_melhor in itens}
+
+
+def comparar(
+    baseline: dict, atual: dict, tolerancia: float, min_segundos: float
+) -> List[dict]:
+    """
+    Compara as medidas presentes nos dois resultados. Uma medida regride se
+    piorou mais que 'tolerancia' (fração do valor do baseline); diferenças de
+    latência abaixo de 'min_segundos' são ignoradas (ruído).
+    """
+    linhas = []
+    medidas_atuais = medidas(atual)
+    for nome, (anterior, maior_melhor) in medidas(baseline).items():
+        valor = medidas_atuais.get(nome, (None, maior_melhor))[0]
+        if anterior is None or valor is None:
+            continue
+        variacao = (valor - anterior) / anterior if anterior else 0.0
+        piora = -variacao if maior_melhor else variacao
+        regressao = piora > tolerancia
+        if regressao and not maior_melhor and abs(valor - anterior) < min_segundos:
+            regressao = False
+        linhas.append(
+            {
+                "metric": nome,
+                "baseline": anterior,
+                "current": valor,
+                "change": variacao,
+                "regression": regressao,
+            }
+        )
+    return linhas
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.bench.compare",
+        description="Compara um resultado de app.bench.run com um baseline.",
+    )
+    parser.add_argument("baseline", help="JSON do baseline.")
+    parser.add_argument("current", help="JSON da execução a comparar.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="Piora relativa aceita (padrão: 0.1 = 10%%)."
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.002,
+        help="Diferença absoluta de latência abaixo da qual não há regressão.",
+    )
+    parser.add_argument("--json", action="store_true", help="Imprime a comparação em JSON.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        atual = json.load(f)
+
+    linhas = comparar(baseline, atual, args.tolerance, args.min_seconds)
+    regressoes = [linha for linha in linhas if linha["regression"]]
+
+    if args.json:
+        print(json.dumps({"comparison": linhas, "regressions": len(regressoes)}, indent=2))
+    else:
+        for linha in linhas:
+            marca = "REGRESSÃO" if linha["regression"] else ""
+            print(
+                f"{linha['metric']:<40} {linha['baseline']:>12.4f} {linha['current']:>12.4f} "
+                f"{linha['change']:>+8.1%} {marca}"
+            )
+        print(f"{len(regressoes)} regressões com tolerância de {args.tolerance:.0%}.")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
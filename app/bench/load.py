@@ -0,0 +1,160 @@
+import asyncio
+import io
+import random
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+from PIL import Image
+
+from app.bench.stats import resumir
+
+# Status finais de GET /tasks/{task_id}
+STATUS_FINAIS = {"success", "failure", "revoked"}
+
+
+def gerar_imagem(indice: int, semente: int) -> bytes:
+    """
+    JPEG pequeno e único por requisição (o cache de resultados e a deduplicação
+    de tasks identificam a imagem pelo conteúdo), reproduzível pela semente.
+    """
+    rng = random.Random(semente * 1_000_003 + indice)
+    cor = tuple(rng.randrange(256) for _ in range(3))
+    imagem = Image.new("RGB", (320, 240), cor)
+    # Alguns pixels aleatórios para que imagens de mesma cor não coincidam
+    for _ in range(16):
+        imagem.putpixel((rng.randrange(320), rng.randrange(240)), (rng.randrange(256),) * 3)
+    buffer = io.BytesIO()
+    imagem.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class GeradorCarga:
+    """
+    Envia 'total' imagens para /processar-placa, com no máximo 'concorrencia'
+    envios em andamento (cada um conta até a task terminar), e consulta
+    /tasks/{task_id} a cada 'intervalo_consulta' segundos até o status final
+    ou até 'timeout_task' segundos.
+
+    Mede a latência do envio (resposta do POST) e de ponta a ponta (do POST ao
+    status final), a vazão e a contagem de status HTTP e de status das tasks.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        total: int,
+        concorrencia: int,
+        intervalo_consulta: float = 0.05,
+        timeout_task: float = 60.0,
+        semente: int = 0,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key
+        self.total = total
+        self.concorrencia = concorrencia
+        self.intervalo_consulta = intervalo_consulta
+        self.timeout_task = timeout_task
+        self.semente = semente
+        self.latencias_envio: List[float] = []
+        self.latencias_total: List[float] = []
+        self.status_envio: Counter = Counter()
+        self.status_tasks: Counter = Counter()
+        self.consultas = 0
+
+    async def _enviar(self, client: httpx.AsyncClient, indice: int) -> None:
+        imagem = gerar_imagem(indice, self.semente)
+        inicio = time.perf_counter()
+        try:
+            resp = await client.post(
+                "/api/v1/processar-placa",
+                files={"file": (f"bench_{indice}.jpg", imagem, "image/jpeg")},
+            )
+        except httpx.HTTPError as e:
+            self.status_envio[type(e).__name__] += 1
+            return
+        self.latencias_envio.append(time.perf_counter() - inicio)
+        self.status_envio[str(resp.status_code)] += 1
+        if not resp.is_success:
+            return
+
+        # Com o resultado já em cache, o envio responde com o status final
+        corpo = resp.json()
+        status = corpo["status"]
+        if status not in STATUS_FINAIS:
+            status = await self._aguardar(client, corpo["task_id"], inicio)
+        self.status_tasks[status] += 1
+        if status == "success":
+            self.latencias_total.append(time.perf_counter() - inicio)
+
+    async def _aguardar(self, client: httpx.AsyncClient, task_id: str, inicio: float) -> str:
+        """Consulta a task até o status final; 'timeout' se o prazo acabar."""
+        while time.perf_counter() - inicio < self.timeout_task:
+            try:
+                resp = await client.get(f"/api/v1/tasks/{task_id}")
+                self.consultas += 1
+                if resp.is_success:
+                    status = resp.json()["status"]
+                    if status in STATUS_FINAIS:
+                        return status
+            except httpx.HTTPError:
+                self.consultas += 1
+            await asyncio.sleep(self.intervalo_consulta)
+        return "timeout"
+
+    async def executar(self) -> dict:
+        proximo = iter(range(self.total))
+
+        async def trabalhador(client: httpx.AsyncClient) -> None:
+            for indice in proximo:
+                await self._enviar(client, indice)
+
+        limites = httpx.Limits(
+            max_connections=self.concorrencia * 2,
+            max_keepalive_connections=self.concorrencia * 2,
+        )
+        async with httpx.AsyncClient(
+            base_url=self.api_url,
+            headers={"X-API-Key": self.api_key},
+            limits=limites,
+            timeout=httpx.Timeout(30.0),
+        ) as client:
+            inicio = time.perf_counter()
+            await asyncio.gather(
+                *(trabalhador(client) for _ in range(min(self.concorrencia, self.total)))
+            )
+            duracao = time.perf_counter() - inicio
+
+        return self.relatorio(duracao)
+
+    def relatorio(self, duracao: float) -> dict:
+        aceitos = sum(n for codigo, n in self.status_envio.items() if codigo.startswith("2"))
+        return {
+            "requests": self.total,
+            "concurrency": self.concorrencia,
+            "duration_seconds": duracao,
+            "submit_rps": len(self.latencias_envio) / duracao if duracao else None,
+            "completed_rps": len(self.latencias_total) / duracao if duracao else None,
+            "accepted": aceitos,
+            "status_polls": self.consultas,
+            "submit_status": dict(sorted(self.status_envio.items())),
+            "task_status": dict(sorted(self.status_tasks.items())),
+            "submit_latency": resumir(self.latencias_envio),
+            "end_to_end_latency": resumir(self.latencias_total),
+        }
+
+
+async def ler_metricas(urls: List[str]) -> Optional[str]:
+    """Texto de /metrics de todas as URLs, concatenado (None se nenhuma responder)."""
+    textos = []
+    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
+        for url in urls:
+            try:
+                resp = await client.get(url)
+                resp.raise_for_status()
+                textos.append(resp.text)
+            except httpx.HTTPError as e:
+                print(f"ATENÇÃO: Métricas indisponíveis em {url}: {str(e)}")
+    return "\n".join(textos) if textos else None
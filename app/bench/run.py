@@ -0,0 +1,405 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List
+
+from app.bench.load import GeradorCarga, ler_metricas
+from app.bench.stats import resumir_histogramas
+
+# Perfis dos stubs por serviço: latência média e variação (ms), fração de
+# respostas 500 e fração de requisições travadas (ver PerfilStub)
+PERFIS: Dict[str, Dict[str, Dict[str, float]]] = {
+    # Sem atraso nem falhas: mede só o custo da API, do broker e do worker
+    "ideal": {"detector": {}, "ezocr": {}, "ocr": {}},
+    # Latências da ordem das observadas com os modelos em GPU
+    "realistic": {
+        "detector": {"latency_ms": 40, "jitter_ms": 15},
+        "ezocr": {"latency_ms": 25, "jitter_ms": 10},
+        "ocr": {"latency_ms": 60, "jitter_ms": 20},
+    },
+    # ezOCR fora do ar: toda leitura depende do fallback
+    "ezocr_down": {
+        "detector": {"latency_ms": 40, "jitter_ms": 15},
+        "ezocr": {"latency_ms": 5, "error_rate": 1.0},
+        "ocr": {"latency_ms": 60, "jitter_ms": 20},
+    },
+    # Falhas esporádicas e respostas que nunca chegam
+    "flaky": {
+        "detector": {"latency_ms": 40, "jitter_ms": 15, "error_rate": 0.02},
+        "ezocr": {"latency_ms": 25, "jitter_ms": 10, "hang_rate": 0.01, "hang_seconds": 30},
+        "ocr": {"latency_ms": 60, "jitter_ms": 20, "error_rate": 0.05},
+    },
+}
+
+# App de cada stub, variável de ambiente do Settings com a URL e rota chamada
+STUBS = {
+    "detector": ("app.stubs.plate_services:detector_app", "STUB_DETECTOR_", "YOLO_API_URL", "/detect"),
+    "ezocr": ("app.stubs.plate_services:ocr_app", "STUB_OCR_", "EZOCR_API_URL", "/ocr"),
+    "ocr": ("app.stubs.plate_services:ocr_app", "STUB_OCR_", "OCR_API_URL", "/ocr"),
+}
+
+# Em memória não há Redis: os recursos que dependem dele ficam desligados
+AMBIENTE_MEMORIA = {
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "RESULT_CACHE_ENABLED": "false",
+    "NOTIFY_ENABLED": "false",
+    "CIRCUIT_BREAKER_ENABLED": "false",
+    "ADAPTIVE_CASCADE_ENABLED": "false",
+    "TENANT_MAX_IN_FLIGHT": "0",
+    "ADMISSION_MAX_QUEUE_DEPTH": "0",
+    "ADMISSION_MAX_PENDING_PER_KEY": "0",
+    "CALL_COUNTER_MODE": "atomic",
+}
+
+# Nos dois modos: o limite de taxa por chave mediria a si mesmo, não a capacidade
+AMBIENTE_PADRAO = {
+    "RATE_LIMIT_ENABLED": "false",
+    "WORKER_METRICS_PORT": "0",
+}
+
+
+def porta_livre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def aguardar_porta(porta: int, timeout: float = 30.0) -> None:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(("127.0.0.1", porta), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nada respondeu na porta {porta} em {timeout:.0f}s.")
+
+
+def montar_perfis(nome: str, ajustes: List[str]) -> Dict[str, Dict[str, float]]:
+    """Perfil predefinido com os ajustes '--stub servico.campo=valor'."""
+    perfis = {servico: dict(valores) for servico, valores in PERFIS[nome].items()}
+    for ajuste in ajustes:
+        chave, _, valor = ajuste.partition("=")
+        servico, _, campo = chave.partition(".")
+        if servico not in perfis or not campo or not valor:
+            raise SystemExit(f"Ajuste inválido: {ajuste!r} (use servico.campo=valor).")
+        perfis[servico][campo] = float(valor)
+    return perfis
+
+
+@contextmanager
+def subir_stubs(perfis: Dict[str, Dict[str, float]], output_dir: str) -> Iterator[Dict[str, str]]:
+    """Sobe um uvicorn por stub; devolve as variáveis de ambiente com as URLs."""
+    processos = []
+    urls = {}
+    try:
+        for servico, (app_path, prefixo, variavel, rota) in STUBS.items():
+            porta = porta_livre()
+            env = {**os.environ, "STUB_OUTPUT_DIR": output_dir}
+            for campo, valor in perfis[servico].items():
+                env[f"{prefixo}{campo.upper()}"] = str(valor)
+            processos.append(
+                subprocess.Popen(
+                    [
+                        sys.executable, "-m", "uvicorn", app_path,
+                        "--host", "127.0.0.1", "--port", str(porta),
+                        "--log-level", "warning", "--no-access-log",
+                    ],
+                    env=env,
+                )
+            )
+            aguardar_porta(porta)
+            urls[variavel] = f"http://127.0.0.1:{porta}{rota}"
+        yield urls
+    finally:
+        for processo in processos:
+            processo.terminate()
+        for processo in processos:
+            processo.wait(timeout=10)
+
+
+@contextmanager
+def subir_api(porta: int) -> Iterator[str]:
+    """API (app.main) num uvicorn em thread, no mesmo processo do harness."""
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=porta, log_level="warning", access_log=False)
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    aguardar_porta(porta)
+    try:
+        yield f"http://127.0.0.1:{porta}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+
+
+@contextmanager
+def subir_worker(broker: str, concorrencia: int) -> Iterator[List[str]]:
+    """
+    Worker do Celery com '--pool threads'. Em memória, roda numa thread deste
+    processo (o transporte em memória só é visível dentro do processo) e suas
+    métricas saem no /metrics da API. Com Redis, roda num processo separado e
+    publica as métricas numa porta própria. Devolve as URLs de métricas extras.
+    """
+    from app.celery_app import celery
+
+    if broker == "memory":
+        from celery.contrib.testing.worker import start_worker
+
+        # O transporte em memória consulta as filas a cada 1s por padrão, e o
+        # loop síncrono do worker só confirma as mensagens (liberando o
+        # prefetch) entre esperas de até 2s. Com prefetch ilimitado e consulta
+        # a cada 10ms, nenhum dos dois entra na latência medida.
+        celery.conf.broker_transport_options = {
+            **celery.conf.broker_transport_options,
+            "polling_interval": 0.01,
+        }
+        celery.conf.worker_prefetch_multiplier = 0
+        with start_worker(
+            celery,
+            pool="threads",
+            concurrency=concorrencia,
+            perform_ping_check=False,
+            shutdown_timeout=60.0,
+        ):
+            yield []
+        return
+
+    porta = porta_livre()
+    processo = subprocess.Popen(
+        [
+            sys.executable, "-m", "celery", "-A", "app.celery_app", "worker",
+            "--pool", "threads", "--concurrency", str(concorrencia),
+            "--loglevel", "warning", "--without-gossip", "--without-mingle",
+        ],
+        env={**os.environ, "WORKER_METRICS_PORT": str(porta)},
+    )
+    try:
+        limite = time.monotonic() + 60
+        while not celery.control.ping(timeout=1.0):
+            if processo.poll() is not None or time.monotonic() > limite:
+                raise RuntimeError("O worker do Celery não ficou pronto.")
+        yield [f"http://127.0.0.1:{porta}/metrics"]
+    finally:
+        processo.terminate()
+        processo.wait(timeout=60)
+
+
+def _commit_atual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar_carga(args, api_url: str, api_key: str, metricas: List[str]) -> dict:
+    """Dispara a carga e resume as métricas Prometheus observadas durante ela."""
+
+    async def executar() -> dict:
+        antes = await ler_metricas(metricas) if metricas else None
+        carga = await GeradorCarga(
+            api_url,
+            api_key,
+            total=args.requests,
+            concorrencia=args.concurrency,
+            intervalo_consulta=args.poll_interval,
+            timeout_task=args.task_timeout,
+            semente=args.seed,
+        ).executar()
+        depois = await ler_metricas(metricas) if metricas else None
+        relatorio = {"load": carga}
+        if antes is not None and depois is not None:
+            relatorio["stages"] = resumir_histogramas(antes, depois, "plate_stage_seconds", "stage")
+            relatorio["backends"] = resumir_histogramas(
+                antes, depois, "plate_backend_request_seconds", "url", "outcome"
+            )
+            relatorio["ocr_attempts"] = resumir_histogramas(
+                antes, depois, "plate_ocr_attempt_seconds", "tentativa"
+            )
+        return relatorio
+
+    return asyncio.run(executar())
+
+
+def _nomear_backends(backends: dict, urls: Dict[str, str]) -> dict:
+    """Troca as URLs dos stubs (portas aleatórias) pelo nome do serviço."""
+    nomes = {urls[variavel]: servico for servico, (_, _, variavel, _) in STUBS.items() if variavel in urls}
+    renomeado = {}
+    for chave, valor in backends.items():
+        url, _, outcome = chave.partition("|")
+        renomeado[f"{nomes.get(url, url)}|{outcome}"] = valor
+    return renomeado
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.bench.run",
+        description="Benchmark de carga da API de placas com backends simulados.",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Imagens a enviar.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Envios simultâneos.")
+    parser.add_argument(
+        "--profile", choices=sorted(PERFIS), default="realistic", help="Perfil dos stubs."
+    )
+    parser.add_argument(
+        "--stub",
+        action="append",
+        default=[],
+        metavar="SERVICO.CAMPO=VALOR",
+        help="Ajusta o perfil (ex.: ocr.error_rate=0.2, detector.latency_ms=80).",
+    )
+    parser.add_argument(
+        "--broker",
+        choices=("memory", "redis"),
+        default="memory",
+        help="memory: tudo no processo; redis: CELERY_BROKER_URL do ambiente e worker separado.",
+    )
+    parser.add_argument("--worker-concurrency", type=int, default=8)
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Intervalo das consultas (s).")
+    parser.add_argument("--task-timeout", type=float, default=60.0, help="Prazo por imagem (s).")
+    parser.add_argument("--seed", type=int, default=0, help="Semente das imagens geradas.")
+    parser.add_argument(
+        "--auth-keys",
+        default="1,10,100,1000",
+        help="Números de chaves na tabela para medir a autenticação ('' desativa).",
+    )
+    parser.add_argument("--auth-iterations", type=int, default=10)
+    parser.add_argument(
+        "--api-url",
+        help="Mede uma API já em execução (sem subir stubs, API e worker); exige --api-key.",
+    )
+    parser.add_argument("--api-key", help="Chave de API usada com --api-url.")
+    parser.add_argument(
+        "--metrics-url",
+        action="append",
+        default=[],
+        help="URLs de /metrics a ler com --api-url (API e workers).",
+    )
+    parser.add_argument(
+        "--allow-db-writes",
+        action="store_true",
+        help=(
+            "Permite criar (e apagar) chaves de API num banco cujo nome não indica "
+            "bench/teste."
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        help="Arquivo JSON do resultado (padrão: bench_results/<data>_<perfil>.json).",
+    )
+    args = parser.parse_args(argv)
+    if args.api_url and not args.api_key:
+        parser.error("--api-url exige --api-key.")
+    return args
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    perfis = montar_perfis(args.profile, args.stub)
+    execucao = uuid.uuid4().hex[:12]
+    quantidades = [int(n) for n in args.auth_keys.split(",") if n.strip()]
+
+    for nome, valor in AMBIENTE_PADRAO.items():
+        os.environ.setdefault(nome, valor)
+    if args.allow_db_writes:
+        os.environ["BENCH_ALLOW_DB_WRITES"] = "true"
+    if args.broker == "memory" and not args.api_url:
+        os.environ.update(AMBIENTE_MEMORIA)
+
+    relatorio = {
+        "meta": {
+            "run_id": execucao,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_commit": _commit_atual(),
+            "python": sys.version.split()[0],
+            "args": vars(args),
+            "stub_profiles": None if args.api_url else perfis,
+        }
+    }
+
+    with ExitStack() as stack:
+        urls: Dict[str, str] = {}
+        if not args.api_url:
+            output_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="bench_yolo_"))
+            urls = stack.enter_context(subir_stubs(perfis, output_dir))
+            os.environ.update(urls)
+            os.environ["YOLO_OUTPUT_DIR"] = output_dir
+            os.environ.setdefault("BLOB_STORE_DIR", os.path.join(output_dir, "_blobs"))
+
+        # Daqui em diante o Settings já pode ser lido
+        from app.bench.auth import (
+            apagar_chaves,
+            criar_chave,
+            exigir_banco_de_bench,
+            medir_autenticacao,
+        )
+        from app.db.database import SessionLocal
+
+        if quantidades or not args.api_url:
+            exigir_banco_de_bench()
+        stack.callback(lambda: print(f"Chaves do benchmark apagadas: {apagar_chaves(execucao)}"))
+
+        if quantidades:
+            relatorio["auth"] = asyncio.run(
+                medir_autenticacao(execucao, quantidades, args.auth_iterations)
+            )
+
+        if args.api_url:
+            api_url, api_key, metricas = args.api_url, args.api_key, args.metrics_url
+        else:
+            with SessionLocal() as db:
+                _, api_key = criar_chave(db, execucao, call_limit=args.requests + 1)
+            metricas = stack.enter_context(subir_worker(args.broker, args.worker_concurrency))
+            api_url = stack.enter_context(subir_api(porta_livre()))
+            metricas = [f"{api_url}/metrics"] + metricas
+
+        print(
+            f"Carga: {args.requests} imagens, concorrência {args.concurrency}, "
+            f"perfil {args.profile}, broker {args.broker}"
+        )
+        relatorio.update(executar_carga(args, api_url, api_key, metricas))
+        if "backends" in relatorio:
+            relatorio["backends"] = _nomear_backends(relatorio["backends"], urls)
+
+    load = relatorio["load"]
+    print(
+        f"Envios: {load['submit_rps']:.1f} req/s, concluídas: {load['completed_rps']:.1f}/s, "
+        f"status: {load['task_status']}"
+    )
+    for etapa, resumo in relatorio.get("stages", {}).items():
+        print(
+            f"  {etapa:<14} n={resumo['count']:<6} p50={resumo['p50'] * 1000:8.1f}ms "
+            f"p95={resumo['p95'] * 1000:8.1f}ms p99={resumo['p99'] * 1000:8.1f}ms"
+        )
+
+    output = args.output or os.path.join(
+        "bench_results",
+        f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.profile}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(relatorio, f, indent=2, sort_keys=True)
+    print(f"Resultado gravado em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client.parser import text_string_to_metric_families
+
+# Quantis reportados em todas as medições
+QUANTIS = (0.5, 0.95, 0.99)
+
+# Buckets de um histograma: limite superior (le) -> contagem acumulada
+Buckets = Dict[float, float]
+# Rótulos de uma série, sem o 'le', como tupla ordenada de (nome, valor)
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _nome_quantil(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def percentil(ordenados: List[float], q: float) -> Optional[float]:
+    """Percentil por interpolação linear entre as amostras (já ordenadas)."""
+    if not ordenados:
+        return None
+    posicao = q * (len(ordenados) - 1)
+    inferior = math.floor(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    fracao = posicao - inferior
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * fracao
+
+
+def resumir(amostras: List[float]) -> dict:
+    """Contagem, média, p50/p95/p99 e máximo de uma lista de durações (segundos)."""
+    ordenados = sorted(amostras)
+    resumo = {
+        "count": len(ordenados),
+        "mean": sum(ordenados) / len(ordenados) if ordenados else None,
+    }
+    for q in QUANTIS:
+        resumo[_nome_quantil(q)] = percentil(ordenados, q)
+    resumo["max"] = ordenados[-1] if ordenados else None
+    return resumo
+
+
+def histogramas(texto: str, nome: str) -> Dict[Rotulos, Buckets]:
+    """
+    Buckets de cada série do histograma 'nome' no texto de /metrics (formato
+    Prometheus), indexados pelos demais rótulos da série.
+    """
+    series: Dict[Rotulos, Buckets] = {}
+    for familia in text_string_to_metric_families(texto):
+        if familia.name != nome:
+            continue
+        for amostra in familia.samples:
+            if not amostra.name.endswith("_bucket"):
+                continue
+            rotulos = dict(amostra.labels)
+            le = float(rotulos.pop("le"))
+            chave = tuple(sorted(rotulos.items()))
+            buckets = series.setdefault(chave, {})
+            # Mesma série exposta por mais de um processo: soma
+            buckets[le] = buckets.get(le, 0.0) + amostra.value
+    return series
+
+
+def diferenca(depois: Dict[Rotulos, Buckets], antes: Dict[Rotulos, Buckets]) -> Dict[Rotulos, Buckets]:
+    """Observações feitas entre as duas leituras, série a série."""
+    resultado = {}
+    for chave, buckets in depois.items():
+        anteriores = antes.get(chave, {})
+        delta = {le: valor - anteriores.get(le, 0.0) for le, valor in buckets.items()}
+        if delta.get(math.inf, 0.0) > 0:
+            resultado[chave] = delta
+    return resultado
+
+
+def quantil_histograma(buckets: Buckets, q: float) -> Optional[float]:
+    """
+    Quantil estimado a partir dos buckets acumulados, interpolando dentro do
+    bucket (como o histogram_quantile do Prometheus). Se cair no bucket +Inf,
+    devolve o maior limite finito.
+    """
+    total = buckets.get(math.inf, 0.0)
+    if total <= 0:
+        return None
+    alvo = q * total
+    limite_anterior, contagem_anterior = 0.0, 0.0
+    for le in sorted(buckets):
+        contagem = buckets[le]
+        if contagem >= alvo:
+            if math.isinf(le):
+                return limite_anterior
+            if contagem == contagem_anterior:
+                return le
+            fracao = (alvo - contagem_anterior) / (contagem - contagem_anterior)
+            return limite_anterior + (le - limite_anterior) * fracao
+        limite_anterior, contagem_anterior = le, contagem
+    return limite_anterior
+
+
+def resumir_histogramas(antes: str, depois: str, nome: str, *rotulos: str) -> dict:
+    """
+    Resumo (contagem e quantis) das observações do histograma 'nome' entre duas
+    leituras de /metrics, agrupado pelos valores dos rótulos indicados (ex.:
+    stage), unidos por '|'. Séries com os mesmos valores desses rótulos são somadas.
+    """
+    agrupado: Dict[str, Buckets] = {}
+    for chave, buckets in diferenca(histogramas(depois, nome), histogramas(antes, nome)).items():
+        valores = dict(chave)
+        grupo = "|".join(valores.get(rotulo, "") for rotulo in rotulos)
+        destino = agrupado.setdefault(grupo, {})
+        for le, contagem in buckets.items():
+            destino[le] = destino.get(le, 0.0) + contagem
+
+    resumo = {}
+    for grupo, buckets in sorted(agrupado.items()):
+        item = {"count": int(buckets[math.inf])}
+        for q in QUANTIS:
+            item[_nome_quantil(q)] = quantil_histograma(buckets, q)
+        resumo[grupo] = item
+    return resumo
@@ -1,16 +1,63 @@
 from celery import Celery
+from kombu import Queue
 from app.core.config import settings
 
+# Filas das tasks de placa: uma por tier de chave de API, na ordem de prioridade
+# de PLATE_QUEUE_TIERS. Os workers consomem todas (ver task_queues abaixo); para
+# isolar tiers, rode workers dedicados com '-Q plates.priority' etc.
+
+
+def plate_queue(tier: str | None) -> str:
+    """Fila das tasks de placa para o tier (tier desconhecido usa o padrão)."""
+    if tier not in settings.PLATE_QUEUE_TIERS:
+        tier = settings.DEFAULT_API_KEY_TIER
+    return f"{settings.PLATE_QUEUE_PREFIX}.{tier}"
+
+
+def plate_queues() -> list[str]:
+    """Todas as filas de placa, da mais para a menos prioritária."""
+    return [plate_queue(tier) for tier in settings.PLATE_QUEUE_TIERS]
+
+
 celery = Celery(
     "controller_api",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.services.task"],
+    include=[
+        "app.services.task",
+        "app.services.quota",
+        "app.services.notifications",
+        "app.services.worker_metrics",
+    ],
 )
 
 celery.conf.update(
     task_track_started=True,
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer=settings.CELERY_SERIALIZER,
+    accept_content=sorted({"json", "msgpack", settings.CELERY_SERIALIZER}),
+    result_serializer=settings.CELERY_SERIALIZER,
+    result_accept_content=sorted({"json", "msgpack", settings.CELERY_SERIALIZER}),
+    task_compression=settings.CELERY_COMPRESSION or None,
+    result_expires=settings.CELERY_RESULT_EXPIRES_SECONDS,
+    # Fila padrão (tasks periódicas e webhooks) e uma fila por tier, na ordem em
+    # que o worker as atende
+    task_queues=[Queue("celery")] + [Queue(name) for name in plate_queues()],
+    broker_transport_options={
+        "queue_order_strategy": settings.CELERY_QUEUE_ORDER_STRATEGY
+    },
+    # Pool de threads: as tasks do processo compartilham o event loop e o pool
+    # de conexões do pipeline (ver app/services/pipeline.py)
+    worker_pool=settings.CELERY_WORKER_POOL,
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+    beat_schedule={
+        "sync-quota-counters": {
+            "task": "quota.sync_quota_counters_task",
+            "schedule": settings.QUOTA_SYNC_INTERVAL_SECONDS,
+        },
+        "cleanup-blobs": {
+            "task": "plate.cleanup_blobs_task",
+            "schedule": settings.BLOB_CLEANUP_INTERVAL_SECONDS,
+        },
+    },
 )
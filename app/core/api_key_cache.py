@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.core.metrics import (
+    API_KEY_CACHE_ENTRIES,
+    API_KEY_CACHE_EVICTIONS,
+    API_KEY_CACHE_LOOKUPS,
+)
+from app.core.security import get_api_key_digest
+
+
+class VerifiedKeyCache:
+    """
+    Cache LRU com TTL, em memória do processo, das chaves de API já verificadas
+    com bcrypt. A entrada é indexada pelo SHA-256 da chave apresentada e guarda o
+    ID e o hash bcrypt da linha correspondente, permitindo pular o bcrypt.
+
+    O cache não substitui a leitura da linha no banco: quem consulta continua
+    conferindo is_active, key_hash e limites, então uma chave desativada por outro
+    processo deixa de ser aceita imediatamente, mesmo antes de expirar aqui.
+
+    Acertos, falhas, descartes e tamanho são exportados como métricas
+    Prometheus (api_key_cache_*).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[int, str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(api_key: str) -> str:
+        """Retorna o digest rápido (SHA-256) usado como chave do cache."""
+        return get_api_key_digest(api_key)
+
+    def get(self, api_key: str) -> tuple[int, str] | None:
+        """Retorna (api_key_id, key_hash) se a chave estiver no cache e não expirada."""
+        if self.max_entries <= 0:
+            return None
+        digest = self.digest(api_key)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                API_KEY_CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            api_key_id, key_hash, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[digest]
+                API_KEY_CACHE_EVICTIONS.inc()
+                API_KEY_CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            self._entries.move_to_end(digest)
+            API_KEY_CACHE_LOOKUPS.labels("hit").inc()
+            return api_key_id, key_hash
+
+    def contains(self, api_key: str) -> bool:
+        """Se a chave está no cache e não expirou (sem contar nas métricas)."""
+        if self.max_entries <= 0:
+            return False
+        with self._lock:
+            entry = self._entries.get(self.digest(api_key))
+        return entry is not None and entry[2] > time.monotonic()
+
+    def set(self, api_key: str, api_key_id: int, key_hash: str) -> None:
+        """Registra uma chave verificada, descartando a menos usada se necessário."""
+        if self.max_entries <= 0:
+            return
+        digest = self.digest(api_key)
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[digest] = (api_key_id, key_hash, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                API_KEY_CACHE_EVICTIONS.inc()
+
+    def invalidate(self, api_key: str) -> None:
+        """Remove a entrada de uma chave em texto puro."""
+        with self._lock:
+            if self._entries.pop(self.digest(api_key), None) is not None:
+                API_KEY_CACHE_EVICTIONS.inc()
+
+    def invalidate_key_id(self, api_key_id: int) -> None:
+        """Remove todas as entradas que apontam para a linha informada."""
+        with self._lock:
+            stale = [
+                digest
+                for digest, (entry_id, _, _) in self._entries.items()
+                if entry_id == api_key_id
+            ]
+            for digest in stale:
+                del self._entries[digest]
+            API_KEY_CACHE_EVICTIONS.inc(len(stale))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Instância única por processo
+verified_key_cache = VerifiedKeyCache(
+    max_entries=settings.API_KEY_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.API_KEY_CACHE_TTL_SECONDS,
+)
+API_KEY_CACHE_ENTRIES.set_function(verified_key_cache.__len__)
@@ -19,6 +19,20 @@ class Settings(BaseSettings):
         # Importante: usar f-string para construir a URL
         return f"postgresql+psycopg2://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    # URL para o motor assíncrono (caminho da requisição), com o driver asyncpg
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+
+    # Pool de conexões do Postgres (valem para os motores síncrono e assíncrono)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # segundos esperando uma conexão livre
+    DB_POOL_RECYCLE: int = 1800  # recicla conexões mais velhas que isso (segundos)
+    DB_POOL_PRE_PING: bool = True  # testa a conexão no checkout (evita conexões mortas)
+    # True quando há um pooler externo (PgBouncer em modo transaction) na frente
+    DB_EXTERNAL_POOLER: bool = False
+
     # Suas outras variáveis de configuração
     API_KEY_LENGTH: int
     DEFAULT_CALL_LIMIT: int
@@ -26,9 +40,207 @@ class Settings(BaseSettings):
     OCR_API_URL: str
     EZOCR_API_URL: str
     YOLO_OUTPUT_DIR: str
+    # Como o worker recebe o recorte da placa: "shared" (arquivo no volume
+    # compartilhado), "inline" (JPEG em base64 na resposta) ou "bbox"
+    # (coordenadas; o worker recorta a imagem original em memória). Se a
+    # resposta não trouxer o pedido, o volume compartilhado é usado.
+    YOLO_CROP_MODE: str = "shared"
+    # Timeouts por backend (segundos)
+    YOLO_TIMEOUT_SECONDS: float = 30.0
+    EZOCR_TIMEOUT_SECONDS: float = 30.0
+    OCR_TIMEOUT_SECONDS: float = 30.0
+    # Atraso até disparar a próxima tentativa de OCR em paralelo (0 = todas juntas)
+    OCR_HEDGE_DELAY_SECONDS: float = 1.0
+    # Quanto esperar pelas tentativas de OCR mais prioritárias ainda em curso
+    # quando uma menos prioritária já tem leitura aceitável (0 = aceita na hora)
+    OCR_CASCADE_GRACE_SECONDS: float = 0.25
+    # Valida as leituras do OCR pela gramática das placas (LLL9999 e LLL9L99),
+    # corrigindo trocas como O/0 e B/8. A cascata para na primeira placa válida
+    # com confiança >= OCR_MIN_CONFIDENCE (ou sem confiança informada pelo OCR).
+    OCR_PLATE_VALIDATION: bool = True
+    OCR_MIN_CONFIDENCE: float = 0.8
+    # Ordem padrão da cascata de OCR ("<backend>:categoria" usa a classe do YOLO)
+    OCR_CASCADE_ORDER: list[str] = ["ezocr:categoria", "ocr:categoria", "ezocr", "ocr"]
+    # Ordem adaptativa por classe detectada, a partir da taxa de acerto e da
+    # latência observadas pelos workers (médias com decaimento DECAY por amostra).
+    # Só tentativas com MIN_SAMPLES amostras mudam de posição; EXPLORE_RATE das
+    # imagens usam a ordem padrão, para continuar medindo as demais tentativas.
+    ADAPTIVE_CASCADE_ENABLED: bool = True
+    ADAPTIVE_CASCADE_MIN_SAMPLES: int = 50
+    ADAPTIVE_CASCADE_DECAY: float = 0.995
+    ADAPTIVE_CASCADE_EXPLORE_RATE: float = 0.05
+    ADAPTIVE_CASCADE_CACHE_SECONDS: float = 30.0
+    # Endpoints em lote (micro-batching); vazio desativa o lote para o backend.
+    # O contrato está descrito em app/services/batching.py.
+    YOLO_BATCH_API_URL: str = ""
+    EZOCR_BATCH_API_URL: str = ""
+    OCR_BATCH_API_URL: str = ""
+    # Réplicas adicionais de cada backend (lista JSON de URLs individuais); a
+    # URL principal acima é sempre a primeira. Cada chamada vai para a réplica
+    # com o circuito fechado e a menor latência média.
+    YOLO_REPLICA_URLS: list[str] = []
+    EZOCR_REPLICA_URLS: list[str] = []
+    OCR_REPLICA_URLS: list[str] = []
+    BATCH_MAX_SIZE: int = 8
+    BATCH_MAX_WAIT_MS: float = 20.0
+    # Máximo de imagens processadas ao mesmo tempo pelo pipeline em cada processo.
+    # Só há concorrência dentro do processo com o pool de threads do worker
+    # (CELERY_WORKER_POOL = "threads", o padrão): cada thread entrega a task ao
+    # event loop do pipeline. Com "prefork", cada processo roda uma imagem por vez.
+    PIPELINE_MAX_CONCURRENCY: int = 32
+
+    # Cliente HTTP do pipeline (keep-alive, pool e retentativas em 5xx)
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    HTTP_MAX_CONNECTIONS: int = 64  # conexões abertas (e mantidas) por processo
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF_SECONDS: float = 0.2
+    # Circuit breaker por réplica de backend, com estado compartilhado no Redis:
+    # abre com taxa de falha >= ERROR_RATE (chamadas acima de SLOW_CALL_SECONDS
+    # contam como falha) após MIN_REQUESTS chamadas na janela; aberto, a réplica
+    # é pulada por OPEN_SECONDS e depois recebe uma chamada de sonda.
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_BREAKER_WINDOW_SECONDS: float = 30.0
+    CIRCUIT_BREAKER_MIN_REQUESTS: int = 5
+    CIRCUIT_BREAKER_ERROR_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 10.0
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30.0
+    # Porta HTTP das métricas Prometheus do worker do Celery (0 desativa). Com o
+    # pool prefork, defina PROMETHEUS_MULTIPROC_DIR para somar os processos filhos.
+    WORKER_METRICS_PORT: int = 9101
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
+    # Serialização das mensagens e resultados: "json" ou "msgpack" (binário).
+    # Ambos continuam aceitos no consumo, para trocar sem esvaziar as filas.
+    CELERY_SERIALIZER: str = "json"
+    # Compressão das mensagens das tasks (ex.: "gzip", "zlib", "bzip2"); vazio desativa
+    CELERY_COMPRESSION: str = ""
+    # Por quanto tempo os resultados ficam no backend (segundos)
+    CELERY_RESULT_EXPIRES_SECONDS: int = 3600
+    # Por quanto tempo fica registrada a chave de API que enviou cada task (só ela
+    # consulta o status); deve cobrir a espera na fila mais a retenção do resultado
+    TASK_OWNER_TTL_SECONDS: int = 86400
+    # Filas por nível de prioridade ("tier") da chave de API, em ordem de
+    # prioridade: a fila do tier vira '<PLATE_QUEUE_PREFIX>.<tier>'
+    PLATE_QUEUE_TIERS: list[str] = ["priority", "standard", "bulk"]
+    PLATE_QUEUE_PREFIX: str = "plates"
+    DEFAULT_API_KEY_TIER: str = "standard"
+    # "priority": o worker sempre esvazia as filas mais prioritárias primeiro;
+    # "round_robin": alterna entre as filas
+    CELERY_QUEUE_ORDER_STRATEGY: str = "priority"
+    # Pool do worker do Celery e número de tasks simultâneas por processo (usados
+    # quando '--pool'/'--concurrency' não são passados na linha de comando). Com
+    # "threads", a concorrência acompanha PIPELINE_MAX_CONCURRENCY.
+    CELERY_WORKER_POOL: str = "threads"
+    CELERY_WORKER_CONCURRENCY: int = 32
+    # Mensagens reservadas por processo do worker além das em execução
+    CELERY_WORKER_PREFETCH_MULTIPLIER: int = 1
+    # Máximo de tasks de uma mesma chave em execução ao mesmo tempo em todos os
+    # workers (0 desativa). Acima disso, a task é republicada no fim da fila,
+    # após uma pausa curta no worker (evita girar em vão quando só essa chave
+    # tem trabalho). Depois de TENANT_MAX_REQUEUES republicações, executa mesmo
+    # sem vaga.
+    TENANT_MAX_IN_FLIGHT: int = 16
+    TENANT_REQUEUE_PAUSE_SECONDS: float = 0.05
+    TENANT_MAX_REQUEUES: int = 1000
+    # Validade de cada vaga de execução (libera as de workers que caíram); deve
+    # ser maior que a duração máxima de uma task
+    TENANT_IN_FLIGHT_TTL_SECONDS: int = 600
+    # Controle de admissão das submissões (0 desativa cada limite):
+    # - total de mensagens nas filas de placa acima do qual a API responde 503,
+    #   verificado antes da leitura do corpo (vale para todas as chaves)
+    ADMISSION_MAX_QUEUE_DEPTH: int = 10_000
+    # - tasks aceitas e não concluídas por chave acima das quais a API responde 429
+    ADMISSION_MAX_PENDING_PER_KEY: int = 1_000
+    ADMISSION_DEPTH_CACHE_SECONDS: float = 1.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+    # Validade do contador de pendências (protege contra tasks perdidas)
+    ADMISSION_PENDING_TTL_SECONDS: int = 3600
+    # Guarda no backend só placa/alternativas (e o erro, se houver), não a
+    # resposta completa do OCR; a resposta completa continua salva em disco
+    TRIM_TASK_RESULTS: bool = True
     MAX_TOTAL_API_KEYS: int = 20
 
+    # Diretório compartilhado (API e workers) onde as imagens enviadas aguardam o
+    # processamento. Se vazio, usa YOLO_OUTPUT_DIR/_blobs.
+    BLOB_STORE_DIR: str = ""
+    BLOB_TTL_SECONDS: int = 3600
+    BLOB_CLEANUP_INTERVAL_SECONDS: float = 300.0
+    # Tamanho máximo de uma imagem enviada (bytes)
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    # Envio em lote (/processar-placas): máximo de imagens e tamanho total do corpo
+    BULK_MAX_ITEMS: int = 500
+    BULK_MAX_UPLOAD_BYTES: int = 256 * 1024 * 1024
+    # Máximo de task_ids por consulta em POST /tasks/status
+    TASK_STATUS_MAX_IDS: int = 1000
+
+    # Cache de resultados por chave de API e hash da imagem (evita reprocessar
+    # imagens repetidas pela mesma chave)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL_SECONDS: int = 3600
+    RESULT_CACHE_MAX_ENTRIES: int = 100_000
+    # Tempo máximo que um envio fica marcado como "em processamento"
+    RESULT_CACHE_INFLIGHT_TTL_SECONDS: int = 300
+
+    # Avisos de conclusão (webhook por callback_url e eventos SSE em /events)
+    NOTIFY_ENABLED: bool = True
+    NOTIFY_SUBSCRIPTION_TTL_SECONDS: int = 3600
+    WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    WEBHOOK_MAX_RETRIES: int = 5
+    # Se definido, o corpo do webhook é assinado (HMAC-SHA256) no cabeçalho
+    # X-BRPlates-Signature
+    WEBHOOK_SIGNING_SECRET: str = ""
+    # Destinos aceitos para callback_url: só https (se True) e, se a lista não
+    # for vazia, só esses hosts ("exemplo.com" ou ".exemplo.com" para incluir
+    # subdomínios). Endereços de loopback, privados, link-local e reservados são
+    # sempre recusados.
+    WEBHOOK_REQUIRE_HTTPS: bool = True
+    WEBHOOK_ALLOWED_HOSTS: list[str] = []
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Quantidade de caracteres iniciais da chave usados como identificador indexado
+    API_KEY_PREFIX_LENGTH: int = 12
+    # Permite validar chaves emitidas antes da coluna key_prefix (linhas com
+    # key_prefix nulo). A varredura só acontece quando nenhuma chave com o prefixo
+    # confere e custa um bcrypt por chave antiga, por isso é limitada a
+    # API_KEY_LEGACY_SCANS_PER_SECOND em todas as réplicas (token bucket no Redis).
+    # Cada chave antiga ganha o prefixo no primeiro uso; desative quando o log
+    # informar que não restam chaves sem prefixo.
+    API_KEY_LEGACY_LOOKUP: bool = True
+    API_KEY_LEGACY_SCANS_PER_SECOND: float = 2.0
+    API_KEY_LEGACY_SCAN_BURST: int = 10
+    # Cache em memória de chaves já verificadas (0 desativa o cache)
+    API_KEY_CACHE_MAX_ENTRIES: int = 1024
+    API_KEY_CACHE_TTL_SECONDS: float = 300.0
+    # Contagem de chamadas: "atomic" (UPDATE condicional por requisição),
+    # "buffered" (acumula em memória e grava em lote periodicamente) ou
+    # "redis" (contador compartilhado no Redis, sincronizado pelo Celery beat)
+    CALL_COUNTER_MODE: str = "atomic"
+    CALL_COUNTER_FLUSH_INTERVAL_SECONDS: float = 1.0
+    QUOTA_SYNC_INTERVAL_SECONDS: float = 5.0
+    QUOTA_COUNTER_TTL_SECONDS: int = 86400
+
+    # Redis de uso geral (limites, quotas); se vazio, usa o CELERY_BROKER_URL
+    REDIS_URL: str = ""
+    # Timeouts (segundos) da conexão com o broker usada para ler o tamanho das
+    # filas, para que um broker lento não prenda a API
+    BROKER_REDIS_SOCKET_TIMEOUT_SECONDS: float = 2.0
+    BROKER_REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    # Intervalo (segundos) da leitura do tamanho das filas para /metrics
+    QUEUE_DEPTH_METRICS_INTERVAL_SECONDS: float = 5.0
+
+    # Limite de taxa por chave de API (token bucket no Redis)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_SECOND: float = 10.0
+    RATE_LIMIT_BURST: int = 20
+    # Limite por IP do cliente para requisições sem chave ou com chave ainda não
+    # verificada por este processo (contém quem troca de chave a cada requisição)
+    RATE_LIMIT_IP_PER_SECOND: float = 5.0
+    RATE_LIMIT_IP_BURST: int = 20
+
+    # O harness de benchmark (app.bench) cria e apaga chaves de API no banco
+    # configurado; só o faz se o nome do banco indicar bench/teste ou com esta
+    # opção ligada (python -m app.bench.run --allow-db-writes)
+    BENCH_ALLOW_DB_WRITES: bool = False
+
 
 settings = Settings()
@@ -1,6 +1,6 @@
 from fastapi import Header, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.services.api_key_service import ApiKeyService
 from app.schemas.api_key import ApiKeyInDB
 
@@ -8,26 +8,24 @@ from app.schemas.api_key import ApiKeyInDB
 api_key_service = ApiKeyService()
 
 
-async def get_valid_api_key(
-    # FastAPI automaticamente mapeia 'x_api_key' para o cabeçalho 'X-API-Key'
+async def get_authenticated_api_key(
     x_api_key: str = Header(
         ..., alias="X-API-Key", description="Sua chave de API para autenticação."
     ),
-    db: Session = Depends(get_db),  # Injeta a sessão do banco de dados
+    db: AsyncSession = Depends(get_async_db),
 ) -> ApiKeyInDB:
     """
-    Dependência que valida a chave de API fornecida no cabeçalho 'X-API-Key'.
-    Se a chave for válida, ativa, não expirada e dentro do limite de chamadas,
-    o contador de chamadas é incrementado e o objeto ApiKey é retornado.
-    Caso contrário, uma exceção HTTPException 401 UNAUTHORIZED é levantada.
+    Dependência que valida a chave de API fornecida no cabeçalho 'X-API-Key'
+    (ativa e não expirada) e retorna seus dados, sem consumir chamadas: a rota
+    cobra a quota depois, com a quantidade certa (ex.: uma chamada por imagem
+    de um lote). Caso a chave seja inválida, levanta HTTPException 401.
     """
-    api_key_data = api_key_service.validate_and_use_api_key(db, x_api_key)
+    api_key_data = await api_key_service.authenticate_api_key(db, x_api_key)
 
     if not api_key_data:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API Key inválida, inativa, expirada ou limite de chamadas excedido.",
-            # O cabeçalho WWW-Authenticate indica o esquema de autenticação esperado
             headers={"WWW-Authenticate": "X-API-Key"},
         )
     return api_key_data
@@ -0,0 +1,99 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# --- Pool de conexões do Postgres ---
+# O rótulo 'engine' distingue o motor síncrono ("sync") do assíncrono ("async").
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Tempo para obter uma conexão do pool do Postgres.",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CHECKOUT_WAITS = Counter(
+    "db_pool_checkout_waits_total",
+    "Checkouts que encontraram o pool saturado e precisaram esperar uma conexão.",
+    ["engine"],
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts que excederam DB_POOL_TIMEOUT sem obter conexão.",
+    ["engine"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out",
+    "Conexões do pool em uso no momento.",
+    ["engine"],
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_connections_capacity",
+    "Máximo de conexões do pool (pool_size + max_overflow).",
+    ["engine"],
+)
+DB_POOL_SATURATION = Gauge(
+    "db_pool_saturation_ratio",
+    "Fração da capacidade do pool em uso (0 a 1).",
+    ["engine"],
+)
+
+# --- Cache de chaves de API verificadas (por processo da API) ---
+# outcome: "hit" ou "miss" (ausente ou expirada)
+API_KEY_CACHE_LOOKUPS = Counter(
+    "api_key_cache_lookups_total",
+    "Consultas ao cache de chaves de API verificadas.",
+    ["outcome"],
+)
+API_KEY_CACHE_EVICTIONS = Counter(
+    "api_key_cache_evictions_total",
+    "Entradas removidas do cache de chaves (expiradas, descartadas ou invalidadas).",
+)
+API_KEY_CACHE_ENTRIES = Gauge(
+    "api_key_cache_entries",
+    "Entradas no cache de chaves de API verificadas.",
+)
+
+# --- Etapas do processamento de placas (API e workers) ---
+# API: "auth", "quota_charge", "upload", "enqueue".
+# Worker: "task", "yolo", "crop", "ocr", "result_write", "result_cache", "notify".
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PLATE_STAGE_SECONDS = Histogram(
+    "plate_stage_seconds",
+    "Duração de cada etapa do processamento de placas.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+# outcome: "success", "failure" (rede, timeout, 5xx) ou "client_error" (4xx,
+# erro de um item do lote)
+BACKEND_REQUEST_SECONDS = Histogram(
+    "plate_backend_request_seconds",
+    "Duração das chamadas aos backends (YOLO e OCR), por URL de réplica.",
+    ["url", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+BACKEND_CIRCUIT_REJECTIONS = Counter(
+    "plate_backend_circuit_rejections_total",
+    "Chamadas não feitas porque todas as réplicas do backend estavam com o circuito aberto.",
+    ["url"],
+)
+OCR_ATTEMPT_SECONDS = Histogram(
+    "plate_ocr_attempt_seconds",
+    "Duração de cada tentativa da cascata de OCR que chegou ao fim.",
+    ["tentativa"],
+    buckets=STAGE_BUCKETS,
+)
+# outcome: "accepted" (placa aceita), "invalid" (leitura fora do formato ou com
+# confiança baixa) ou "empty" (sem leitura, inclusive por falha do backend)
+OCR_ATTEMPTS = Counter(
+    "plate_ocr_attempts_total",
+    "Tentativas da cascata de OCR que chegaram ao fim, por resultado.",
+    ["tentativa", "outcome"],
+)
+# outcome: "hit" (resultado em cache), "inflight" (task em curso reaproveitada) ou "miss"
+RESULT_CACHE_LOOKUPS = Counter(
+    "plate_result_cache_lookups_total",
+    "Consultas ao cache de resultados no envio de imagens.",
+    ["outcome"],
+)
+TASKS_IN_FLIGHT = Gauge(
+    "plate_tasks_in_flight",
+    "Tasks de placa em execução no worker.",
+    multiprocess_mode="livesum",
+)
@@ -0,0 +1,181 @@
+import json
+import logging
+import math
+from dataclasses import dataclass
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.api_key_cache import verified_key_cache
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.core.security import get_api_key_digest
+
+logger = logging.getLogger(__name__)
+
+# Token bucket atômico. O relógio é o do próprio Redis, para que todas as réplicas
+# da API compartilhem a mesma referência de tempo.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after_seconds: int
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_seconds),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after_seconds)
+        return headers
+
+
+class TokenBucketRateLimiter:
+    """
+    Limitador de taxa distribuído (token bucket) com estado no Redis.
+    Cada identificador ganha 'rate' fichas por segundo, até o máximo de 'burst'.
+    """
+
+    def __init__(self, rate: float, burst: int, key_prefix: str = "ratelimit"):
+        self.rate = rate
+        self.burst = burst
+        self.key_prefix = key_prefix
+
+    async def hit(self, identifier: str, cost: int = 1) -> RateLimitResult:
+        client = get_async_redis()
+        allowed, tokens, retry_after = await client.eval(
+            TOKEN_BUCKET_SCRIPT,
+            1,
+            f"{self.key_prefix}:{identifier}",
+            self.rate,
+            self.burst,
+            cost,
+        )
+        tokens = float(tokens)
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=self.burst,
+            remaining=max(0, math.floor(tokens)),
+            reset_seconds=math.ceil((self.burst - tokens) / self.rate),
+            retry_after_seconds=math.ceil(float(retry_after)),
+        )
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que aplica o limite de taxa antes de o corpo da requisição
+    ser lido e antes de qualquer acesso ao banco.
+
+    - Chave já verificada por este processo (presente no cache de chaves
+      verificadas): balde da chave, identificado pelo digest do X-API-Key.
+    - Sem X-API-Key, ou com uma chave ainda não verificada (inválida, ou
+      válida mas ainda não vista aqui): balde do IP do cliente, em 'ip_limiter'.
+      Assim, quem troca de chave a cada requisição continua no mesmo balde e
+      não chega ao banco e ao bcrypt além desse limite.
+
+    Se o Redis estiver indisponível, a requisição segue (fail-open) para não
+    derrubar a API junto com o limitador.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: TokenBucketRateLimiter,
+        ip_limiter: TokenBucketRateLimiter,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.ip_limiter = ip_limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        api_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                api_key = value.decode("latin-1")
+                break
+
+        try:
+            if api_key and verified_key_cache.contains(api_key):
+                result = await self.limiter.hit(get_api_key_digest(api_key))
+            else:
+                client = scope.get("client")
+                result = await self.ip_limiter.hit(client[0] if client else "unknown")
+        except Exception:
+            logger.warning("Limitador de taxa indisponível; requisição liberada.", exc_info=True)
+            await self.app(scope, receive, send)
+            return
+
+        rate_headers = [
+            (k.lower().encode("latin-1"), v.encode("latin-1"))
+            for k, v in result.headers().items()
+        ]
+
+        if not result.allowed:
+            body = json.dumps(
+                {"detail": "Limite de requisições por segundo excedido."}
+            ).encode("utf-8")
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode("latin-1")),
+                        *rate_headers,
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + rate_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+rate_limiter = TokenBucketRateLimiter(
+    rate=settings.RATE_LIMIT_PER_SECOND,
+    burst=settings.RATE_LIMIT_BURST,
+)
+ip_rate_limiter = TokenBucketRateLimiter(
+    rate=settings.RATE_LIMIT_IP_PER_SECOND,
+    burst=settings.RATE_LIMIT_IP_BURST,
+    key_prefix="ratelimit:ip",
+)
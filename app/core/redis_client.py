@@ -0,0 +1,55 @@
+import asyncio
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+_sync_client: redis.Redis | None = None
+_async_clients: dict[asyncio.AbstractEventLoop, aioredis.Redis] = {}
+_async_broker_clients: dict[asyncio.AbstractEventLoop, aioredis.Redis] = {}
+
+
+def get_redis_url() -> str:
+    """URL do Redis de uso geral; por padrão, o mesmo Redis usado como broker."""
+    return settings.REDIS_URL or settings.CELERY_BROKER_URL
+
+
+def get_redis() -> redis.Redis:
+    """Retorna o cliente Redis síncrono compartilhado pelo processo."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(get_redis_url())
+    return _sync_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Retorna o cliente Redis assíncrono do event loop corrente.
+    As conexões do redis.asyncio pertencem a um loop, por isso há um cliente por loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(get_redis_url())
+        _async_clients[loop] = client
+    return client
+
+
+def get_async_broker_redis() -> aioredis.Redis:
+    """
+    Cliente Redis assíncrono do broker do Celery (para consultar o tamanho das
+    filas), um por event loop. É o mesmo servidor de get_async_redis quando
+    REDIS_URL não é definido. Tem timeouts de conexão e de leitura, para que um
+    broker que não responde não segure quem consulta as filas.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_broker_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(
+            settings.CELERY_BROKER_URL,
+            socket_timeout=settings.BROKER_REDIS_SOCKET_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.BROKER_REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+        )
+        _async_broker_clients[loop] = client
+    return client
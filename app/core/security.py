@@ -1,5 +1,8 @@
+import hashlib
 import secrets
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
 
 # Para hashing de chaves (semelhante a senhas), bcrypt é uma boa escolha
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -13,6 +16,23 @@ def generate_api_key(length: int) -> str:
     return secrets.token_urlsafe(length)
 
 
+def get_api_key_prefix(api_key: str) -> str:
+    """
+    Retorna o prefixo da chave de API usado como identificador de busca.
+    O prefixo é armazenado em texto puro numa coluna indexada, permitindo
+    localizar a única chave candidata antes da verificação com bcrypt.
+    """
+    return api_key[: settings.API_KEY_PREFIX_LENGTH]
+
+
+def get_api_key_digest(api_key: str) -> str:
+    """
+    Retorna um digest rápido (SHA-256) da chave de API. Não substitui o bcrypt:
+    serve apenas como identificador da chave apresentada em caches e contadores.
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
 def get_api_key_hash(api_key: str) -> str:
     """
     Cria um hash seguro para uma chave de API em texto puro.
@@ -26,3 +46,11 @@ def verify_api_key(plain_api_key: str, hashed_api_key: str) -> bool:
     Verifica se uma chave de API em texto puro corresponde a um hash armazenado.
     """
     return pwd_context.verify(plain_api_key, hashed_api_key)
+
+
+async def verify_api_key_async(plain_api_key: str, hashed_api_key: str) -> bool:
+    """
+    Versão assíncrona de verify_api_key. O bcrypt é CPU-bound, então roda no
+    pool de threads para não bloquear o event loop durante a verificação.
+    """
+    return await run_in_threadpool(verify_api_key, plain_api_key, hashed_api_key)
@@ -1,7 +1,9 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.db.models import ApiKey
 from app.schemas.api_key import ApiKeyCreate
 from app.core.config import settings
+from app.core.api_key_cache import verified_key_cache
 
 
 def get_api_key_by_hash(db: Session, key_hash: str) -> ApiKey | None:
@@ -14,7 +16,9 @@ def get_api_key_by_id(db: Session, api_key_id: int) -> ApiKey | None:
     return db.query(ApiKey).filter(ApiKey.id == api_key_id).first()
 
 
-def create_api_key_db(db: Session, key_hash: str, api_key_data: ApiKeyCreate) -> ApiKey:
+def create_api_key_db(
+    db: Session, key_hash: str, key_prefix: str, api_key_data: ApiKeyCreate
+) -> ApiKey:
     """Cria uma nova chave de API no banco de dados."""
     # Define o limite de chamadas: usa o valor fornecido ou o padrão do sistema
     call_limit_val = (
@@ -25,8 +29,10 @@ def create_api_key_db(db: Session, key_hash: str, api_key_data: ApiKeyCreate) ->
 
     db_api_key = ApiKey(
         key_hash=key_hash,
+        key_prefix=key_prefix,
         description=api_key_data.description,
         call_limit=call_limit_val,
+        tier=api_key_data.tier or settings.DEFAULT_API_KEY_TIER,
     )
     db.add(db_api_key)
     db.commit()
@@ -34,12 +40,58 @@ def create_api_key_db(db: Session, key_hash: str, api_key_data: ApiKeyCreate) ->
     return db_api_key
 
 
-def increment_api_key_calls(db: Session, api_key: ApiKey) -> ApiKey:
-    """Incrementa o contador de chamadas de uma chave de API."""
-    api_key.calls_made += 1
-    db.add(api_key)  # Adiciona ao controle da sessão (caso já não esteja)
-    db.commit()  # Salva a alteração no banco de dados
-    db.refresh(api_key)  # Atualiza o objeto com os dados mais recentes do DB
+def increment_api_key_calls(db: Session, api_key_id: int, amount: int = 1) -> int | None:
+    """
+    Incrementa o contador de chamadas de forma atômica, numa única instrução que
+    também confere se a chave está ativa e se ainda há quota disponível.
+    Retorna o novo valor de calls_made, ou None se a quota foi excedida.
+    """
+    stmt = (
+        update(ApiKey)
+        .where(
+            ApiKey.id == api_key_id,
+            ApiKey.is_active == True,
+            ApiKey.calls_made + amount <= ApiKey.call_limit,
+        )
+        .values(calls_made=ApiKey.calls_made + amount)
+        .returning(ApiKey.calls_made)
+    )
+    calls_made = db.execute(stmt).scalar_one_or_none()
+    db.commit()
+    return calls_made
+
+
+def add_api_key_calls(db: Session, increments: dict[int, int]) -> None:
+    """
+    Soma incrementos acumulados ao contador de várias chaves (sem conferir a quota,
+    que já foi verificada quando as chamadas foram aceitas).
+    """
+    for api_key_id, amount in increments.items():
+        db.execute(
+            update(ApiKey)
+            .where(ApiKey.id == api_key_id)
+            .values(calls_made=ApiKey.calls_made + amount)
+        )
+    db.commit()
+
+
+def update_api_key_call_limit(db: Session, api_key: ApiKey, call_limit: int) -> ApiKey:
+    """Altera o limite de chamadas de uma chave de API."""
+    api_key.call_limit = call_limit
+    db.add(api_key)
+    db.commit()
+    db.refresh(api_key)
+    verified_key_cache.invalidate_key_id(api_key.id)
+    return api_key
+
+
+def update_api_key_tier(db: Session, api_key: ApiKey, tier: str) -> ApiKey:
+    """Altera o nível de prioridade (fila) de uma chave de API."""
+    api_key.tier = tier
+    db.add(api_key)
+    db.commit()
+    db.refresh(api_key)
+    verified_key_cache.invalidate_key_id(api_key.id)
     return api_key
 
 
@@ -49,4 +101,5 @@ def deactivate_api_key(db: Session, api_key: ApiKey) -> ApiKey:
     db.add(api_key)
     db.commit()
     db.refresh(api_key)
+    verified_key_cache.invalidate_key_id(api_key.id)
     return api_key
@@ -0,0 +1,82 @@
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import ApiKey
+
+# Versões assíncronas das operações usadas no caminho da requisição
+# (validação e contagem de chamadas). As operações administrativas continuam
+# em app.crud.api_key, com a sessão síncrona.
+
+
+async def get_api_key_by_id(db: AsyncSession, api_key_id: int) -> ApiKey | None:
+    """Retorna uma chave de API pelo seu ID."""
+    result = await db.execute(select(ApiKey).where(ApiKey.id == api_key_id))
+    return result.scalar_one_or_none()
+
+
+async def get_active_api_keys_by_prefix(
+    db: AsyncSession, key_prefix: str
+) -> list[ApiKey]:
+    """Retorna as chaves ativas que possuem o prefixo informado (busca indexada)."""
+    result = await db.execute(
+        select(ApiKey).where(ApiKey.key_prefix == key_prefix, ApiKey.is_active == True)
+    )
+    return list(result.scalars())
+
+
+async def get_active_legacy_api_keys(db: AsyncSession) -> list[ApiKey]:
+    """Retorna as chaves ativas emitidas antes da coluna key_prefix existir."""
+    result = await db.execute(
+        select(ApiKey).where(ApiKey.key_prefix.is_(None), ApiKey.is_active == True)
+    )
+    return list(result.scalars())
+
+
+async def set_api_key_prefix(
+    db: AsyncSession, api_key: ApiKey, key_prefix: str
+) -> ApiKey:
+    """Grava o prefixo de uma chave antiga, migrando-a para a busca indexada."""
+    api_key.key_prefix = key_prefix
+    db.add(api_key)
+    await db.commit()
+    return api_key
+
+
+async def increment_api_key_calls(
+    db: AsyncSession, api_key_id: int, amount: int = 1
+) -> int | None:
+    """
+    Incrementa o contador de chamadas de forma atômica, conferindo na mesma
+    instrução se a chave está ativa e se ainda há quota disponível.
+    Retorna o novo valor de calls_made, ou None se a quota foi excedida.
+    """
+    stmt = (
+        update(ApiKey)
+        .where(
+            ApiKey.id == api_key_id,
+            ApiKey.is_active == True,
+            ApiKey.calls_made + amount <= ApiKey.call_limit,
+        )
+        .values(calls_made=ApiKey.calls_made + amount)
+        .returning(ApiKey.calls_made)
+    )
+    result = await db.execute(stmt)
+    calls_made = result.scalar_one_or_none()
+    await db.commit()
+    return calls_made
+
+
+async def decrement_api_key_calls(
+    db: AsyncSession, api_key_id: int, amount: int = 1
+) -> None:
+    """Devolve chamadas cobradas por trabalho que acabou não sendo aceito."""
+    await db.execute(
+        update(ApiKey)
+        .where(ApiKey.id == api_key_id)
+        # case no lugar de greatest(), que nem todo banco tem (ex.: SQLite)
+        .values(
+            calls_made=case(
+                (ApiKey.calls_made > amount, ApiKey.calls_made - amount), else_=0
+            )
+        )
+    )
+    await db.commit()
@@ -1,20 +1,77 @@
+from uuid import uuid4
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
 from app.core.config import settings
+from app.db.pool import instrumented_pool_class, register_pool_gauges
 
 # URL de conexão do PostgreSQL
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+ASYNC_SQLALCHEMY_DATABASE_URL = settings.ASYNC_DATABASE_URL
+
+
+def _pool_options(pool_class, engine_label: str) -> dict:
+    """
+    Opções de pool comuns aos dois motores, lidas do Settings.
+    Com um pooler externo (PgBouncer em modo transaction), o pool local é
+    desativado (NullPool): quem mantém as conexões abertas é o PgBouncer.
+    """
+    if settings.DB_EXTERNAL_POOLER:
+        return {
+            "poolclass": instrumented_pool_class(NullPool, engine_label),
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+    return {
+        "poolclass": instrumented_pool_class(pool_class, engine_label),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _async_connect_args() -> dict:
+    """
+    Em modo transaction o PgBouncer pode trocar a conexão do servidor entre
+    transações, então os prepared statements do asyncpg não podem ser cacheados
+    e precisam de nomes únicos.
+    """
+    if not settings.DB_EXTERNAL_POOLER:
+        return {}
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
 
 # Cria o motor de banco de dados
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_pool_options(QueuePool, "sync"))
+register_pool_gauges(engine, "sync")
 
 # Configura a sessão do banco de dados
 # autocommit=False: não comita transações automaticamente
 # autoflush=False: não libera alterações pendentes automaticamente
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor e sessão assíncronos, usados no caminho da requisição (FastAPI)
+# expire_on_commit=False: os objetos continuam legíveis após o commit sem
+# disparar novas consultas (lazy load não é permitido em contexto assíncrono)
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    connect_args=_async_connect_args(),
+    **_pool_options(AsyncAdaptedQueuePool, "async"),
+)
+register_pool_gauges(async_engine.sync_engine, "async")
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 # Base declarativa para seus modelos SQLAlchemy
 Base = declarative_base()
 
@@ -26,3 +83,9 @@ def get_db():
         yield db  # Retorna a sessão para ser usada pelo endpoint
     finally:
         db.close()  # Garante que a sessão seja fechada após o uso
+
+
+# Dependência para obter a sessão assíncrona do banco de dados
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -10,8 +10,14 @@ class ApiKey(Base):
     key_hash = Column(
         String, unique=True, index=True, nullable=False
     )  # Hash da chave de API
+    key_prefix = Column(
+        String, index=True, nullable=True
+    )  # Prefixo da chave em texto puro, usado para busca indexada
     description = Column(String, nullable=True)  # Descrição para identificar a chave
     call_limit = Column(Integer, default=1000)  # Limite de chamadas permitidas
     calls_made = Column(Integer, default=0)  # Contador de chamadas realizadas
     is_active = Column(Boolean, default=True)  # Status da chave (ativa/inativa)
+    tier = Column(
+        String, nullable=False, default="standard", server_default="standard"
+    )  # Nível de prioridade: define a fila das tasks da chave
     created_at = Column(DateTime, server_default=func.now())  # Data de criação
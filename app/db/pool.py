@@ -0,0 +1,62 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app.core.config import settings
+from app.core.metrics import (
+    DB_POOL_CAPACITY,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_CHECKOUT_TIMEOUTS,
+    DB_POOL_CHECKOUT_WAITS,
+    DB_POOL_SATURATION,
+)
+
+
+def instrumented_pool_class(pool_class: type[Pool], engine_label: str) -> type[Pool]:
+    """
+    Cria uma subclasse do pool informado que mede o tempo de checkout e conta
+    esperas (pool saturado) e timeouts. A subclasse sobrevive a engine.dispose(),
+    que recria o pool com a mesma classe.
+    """
+
+    class InstrumentedPool(pool_class):
+        def connect(self):
+            saturated = False
+            if hasattr(self, "checkedin"):
+                saturated = (
+                    self.checkedin() == 0
+                    and self.overflow() >= settings.DB_MAX_OVERFLOW
+                )
+            if saturated:
+                DB_POOL_CHECKOUT_WAITS.labels(engine_label).inc()
+            start = time.perf_counter()
+            try:
+                return super().connect()
+            except exc.TimeoutError:
+                DB_POOL_CHECKOUT_TIMEOUTS.labels(engine_label).inc()
+                raise
+            finally:
+                DB_POOL_CHECKOUT_SECONDS.labels(engine_label).observe(
+                    time.perf_counter() - start
+                )
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+
+def register_pool_gauges(engine: Engine, engine_label: str) -> None:
+    """Publica ocupação e saturação do pool, calculadas no momento da coleta."""
+    if not hasattr(engine.pool, "checkedout"):
+        return  # NullPool (pooler externo): não há pool local para observar
+
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    DB_POOL_CAPACITY.labels(engine_label).set(capacity)
+    DB_POOL_CHECKED_OUT.labels(engine_label).set_function(
+        lambda: engine.pool.checkedout()
+    )
+    DB_POOL_SATURATION.labels(engine_label).set_function(
+        lambda: engine.pool.checkedout() / capacity if capacity else 0
+    )
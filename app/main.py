@@ -1,10 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from prometheus_client import REGISTRY, make_asgi_app
 from app.api.v1.endpoints import api_keys, plates  # Importe os routers
+from app.services.call_counter import buffered_call_counter
+from app.core.config import settings
+from app.core.rate_limit import RateLimitMiddleware, ip_rate_limiter, rate_limiter
+from app.core.upload_limit import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD_BYTES
+from app.services.admission import AdmissionControlMiddleware, admission_controller
+from app.services.queues import queue_depth_collector
+
+# O tamanho das filas só é lido com broker Redis
+QUEUE_DEPTH_METRICS = settings.CELERY_BROKER_URL.startswith(("redis://", "rediss://"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Atualiza em segundo plano o tamanho das filas exposto em /metrics
+    depth_refresh = None
+    if QUEUE_DEPTH_METRICS:
+        depth_refresh = asyncio.create_task(queue_depth_collector.run())
+    yield
+    if depth_refresh:
+        depth_refresh.cancel()
+    # Grava os contadores de chamadas ainda pendentes antes de encerrar
+    buffered_call_counter.stop()
+
 
 app = FastAPI(
     title="BRPlates API - Processamento de Placas",
     description="API para detecção e leitura de placas em imagens, com autenticação por chave de API e limite de chamadas.",
     version="1.0.0",
+    lifespan=lifespan,
     # Adicione tags para organizar a documentação Swagger UI
     openapi_tags=[
         {"name": "API Keys", "description": "Operações para gerenciar chaves de API."},
@@ -15,13 +42,48 @@ app = FastAPI(
     ],
 )
 
+# Recusa corpos maiores que o tamanho máximo de envio antes de lê-los por completo
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_bytes=settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    path_limits={
+        "/api/v1/processar-placas": settings.BULK_MAX_UPLOAD_BYTES
+        + MULTIPART_OVERHEAD_BYTES
+    },
+)
+
+# Recusa (503) novas imagens enquanto as filas estão acima da capacidade
+if settings.ADMISSION_MAX_QUEUE_DEPTH > 0:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        controller=admission_controller,
+        paths={"/api/v1/processar-placa", "/api/v1/processar-placas"},
+    )
+
+# Limite de taxa por chave de API (ou por IP, sem chave verificada), aplicado antes
+# da leitura do corpo da requisição.
+# Adicionado por último para ser o middleware mais externo.
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware, limiter=rate_limiter, ip_limiter=ip_rate_limiter
+    )
+
 # Inclua os routers de API
 # As rotas de chaves de API estarão em /api/v1/keys
 app.include_router(api_keys.router, prefix="/api/v1", tags=["API Keys"])
 # As rotas de processamento de placas estarão em /api/v1/processar-placa
+# (e /api/v1/processar-placas para envio em lote)
 app.include_router(plates.router, prefix="/api/v1", tags=["Plates"])
 
 
+# Métricas no formato Prometheus: pool de conexões, duração das etapas
+# (autenticação, cobrança, upload, enfileiramento), cache e filas. As métricas
+# dos workers são expostas por eles (ver app/services/worker_metrics.py).
+if QUEUE_DEPTH_METRICS:
+    REGISTRY.register(queue_depth_collector)
+app.mount("/metrics", make_asgi_app())
+
+
 # Opcional: Rota raiz para verificar se a API está online
 @app.get("/", tags=["Status"], summary="Verifica o status da API")
 async def read_root():
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 from datetime import datetime
 from app.core.config import settings
@@ -16,6 +16,19 @@ class ApiKeyCreate(BaseModel):
         le=MAX_CALL_LIMIT_PER_KEY,  # <--- AQUI: Limite máximo
         description=f"Limite de chamadas para esta chave (máx: {MAX_CALL_LIMIT_PER_KEY}). Se nulo, usa o padrão do sistema.",
     )
+    tier: Optional[str] = Field(
+        None,
+        description=f"Nível de prioridade das tasks da chave ({', '.join(settings.PLATE_QUEUE_TIERS)}). Se nulo, usa '{settings.DEFAULT_API_KEY_TIER}'.",
+    )
+
+    @field_validator("tier")
+    @classmethod
+    def validate_tier(cls, tier: Optional[str]) -> Optional[str]:
+        if tier is not None and tier not in settings.PLATE_QUEUE_TIERS:
+            raise ValueError(
+                f"Tier inválido; use um de: {', '.join(settings.PLATE_QUEUE_TIERS)}"
+            )
+        return tier
 
 
 class ApiKeyResponse(BaseModel):
@@ -27,6 +40,7 @@ class ApiKeyResponse(BaseModel):
     call_limit: int
     calls_made: int
     is_active: bool
+    tier: str = settings.DEFAULT_API_KEY_TIER
     created_at: datetime
 
     class Config:
@@ -40,7 +54,9 @@ class ApiKeyInDB(BaseModel):
     call_limit: int
     calls_made: int
     is_active: bool
+    tier: str = settings.DEFAULT_API_KEY_TIER
     created_at: datetime
 
     class Config:
         from_attributes = True
+
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from app.core.config import settings
 
 
 class OCRResultItem(BaseModel):
@@ -31,3 +32,53 @@ class TaskStatusResponse(BaseModel):
     status: str
     placa: Optional[str] = None
     alternativas: Optional[List[str]] = None
+
+
+class TaskStatusBatchRequest(BaseModel):
+    task_ids: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.TASK_STATUS_MAX_IDS,
+        description="IDs das tasks a consultar",
+    )
+
+
+class BatchItemStatus(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    task_id: Optional[str] = None
+    status: str
+    placa: Optional[str] = None
+    alternativas: Optional[List[str]] = None
+    detail: Optional[str] = None
+
+
+class BatchSubmissionResponse(BaseModel):
+    # Identifica o lote no backend do Celery (GroupResult) e nos avisos de
+    # conclusão; None se todas as imagens já tinham resultado em cache
+    group_id: Optional[str] = None
+    total: int
+    accepted: int
+    items: List[BatchItemStatus] = Field(default_factory=list)
+
+
+class CascadeAttemptStats(BaseModel):
+    tentativa: str
+    # Amostras, acertos e latência são médias com decaimento (ver CascadeStats)
+    amostras: float
+    taxa_acerto: float
+    latencia_media_segundos: float
+
+
+class CascadeClassStats(BaseModel):
+    classe: str
+    # Ordem usada atualmente para a classe (sem contar a exploração)
+    ordem: List[str]
+    tentativas: List[CascadeAttemptStats] = Field(default_factory=list)
+
+
+class QueueDepth(BaseModel):
+    tier: str
+    queue: str
+    # Mensagens aguardando na fila (não inclui as já reservadas pelos workers)
+    depth: int
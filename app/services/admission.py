@@ -0,0 +1,181 @@
+import json
+import logging
+import math
+import time
+
+from fastapi import HTTPException, status
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis, get_redis
+from app.services.queues import queue_depths
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "plate:pending:{api_key_id}"
+
+# Reserva 'amount' tasks pendentes para a chave se couberem no limite.
+RESERVE_SCRIPT = """
+local pending = tonumber(redis.call('GET', KEYS[1])) or 0
+local amount = tonumber(ARGV[2])
+if pending + amount > tonumber(ARGV[1]) then
+    return -1
+end
+pending = redis.call('INCRBY', KEYS[1], amount)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return pending
+"""
+
+# Devolve reservas sem deixar o contador negativo
+RELEASE_SCRIPT = """
+local pending = tonumber(redis.call('GET', KEYS[1])) or 0
+local amount = math.min(pending, tonumber(ARGV[1]))
+if amount > 0 then
+    return redis.call('DECRBY', KEYS[1], amount)
+end
+return 0
+"""
+
+
+class AdmissionController:
+    """
+    Controle de admissão das submissões de imagens, para recusar logo o trabalho
+    que não seria atendido a tempo em vez de deixar a fila crescer sem limite.
+
+    - Capacidade global: se as filas de placa somam mais que 'max_queue_depth'
+      mensagens, novas submissões recebem 503 (ver AdmissionControlMiddleware).
+      O tamanho das filas é reaproveitado por 'depth_cache_seconds'.
+    - Pendências por chave: cada chave pode ter no máximo 'max_pending_per_key'
+      tasks aceitas e ainda não concluídas; acima disso, 429. A rota reserva as
+      vagas antes de cobrar a quota; o worker as devolve ao concluir a task.
+
+    Limites iguais a 0 desativam a respectiva verificação.
+    """
+
+    def __init__(
+        self,
+        max_queue_depth: int,
+        max_pending_per_key: int,
+        depth_cache_seconds: float,
+        retry_after_seconds: int,
+        pending_ttl_seconds: int,
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.max_pending_per_key = max_pending_per_key
+        self.depth_cache_seconds = depth_cache_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self._depth = 0
+        self._depth_checked_at = -math.inf
+
+    async def total_queue_depth(self) -> int:
+        now = time.monotonic()
+        if now - self._depth_checked_at >= self.depth_cache_seconds:
+            self._depth = sum((await queue_depths()).values())
+            self._depth_checked_at = now
+        return self._depth
+
+    async def has_capacity(self) -> bool:
+        if self.max_queue_depth <= 0:
+            return True
+        return await self.total_queue_depth() < self.max_queue_depth
+
+    async def reserve(self, api_key_id: int, amount: int = 1) -> None:
+        """
+        Reserva 'amount' tasks pendentes para a chave, ou levanta 429 (com
+        Retry-After) se a chave já tem tasks demais aguardando.
+        """
+        if self.max_pending_per_key <= 0 or amount <= 0:
+            return
+        pending = await get_async_redis().eval(
+            RESERVE_SCRIPT,
+            1,
+            PENDING_KEY.format(api_key_id=api_key_id),
+            self.max_pending_per_key,
+            amount,
+            self.pending_ttl_seconds,
+        )
+        if pending < 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=(
+                    "Muitas imagens desta chave aguardando processamento. "
+                    "Aguarde a conclusão das anteriores."
+                ),
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+
+    async def release(self, api_key_id: int, amount: int = 1) -> None:
+        """Devolve reservas que não viraram task (cache, task reaproveitada, erro)."""
+        if self.max_pending_per_key <= 0 or amount <= 0:
+            return
+        await get_async_redis().eval(
+            RELEASE_SCRIPT, 1, PENDING_KEY.format(api_key_id=api_key_id), amount
+        )
+
+    def complete(self, api_key_id: int) -> None:
+        """Devolve a reserva de uma task concluída (chamado pelo worker)."""
+        if self.max_pending_per_key <= 0:
+            return
+        get_redis().eval(RELEASE_SCRIPT, 1, PENDING_KEY.format(api_key_id=api_key_id), 1)
+
+
+class AdmissionControlMiddleware:
+    """
+    Middleware ASGI que recusa com 503 (e Retry-After) as submissões de imagens
+    quando as filas estão acima da capacidade, antes de o corpo ser lido. Se o
+    Redis estiver indisponível, a requisição segue (fail-open).
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, paths: set[str]):
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            has_capacity = await self.controller.has_capacity()
+        except Exception:
+            logger.warning("Controle de admissão indisponível; requisição liberada.", exc_info=True)
+            has_capacity = True
+
+        if has_capacity:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps(
+            {"detail": "Serviço sobrecarregado. Tente novamente em instantes."}
+        ).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (
+                        b"retry-after",
+                        str(self.controller.retry_after_seconds).encode("latin-1"),
+                    ),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+admission_controller = AdmissionController(
+    max_queue_depth=settings.ADMISSION_MAX_QUEUE_DEPTH,
+    max_pending_per_key=settings.ADMISSION_MAX_PENDING_PER_KEY,
+    depth_cache_seconds=settings.ADMISSION_DEPTH_CACHE_SECONDS,
+    retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    pending_ttl_seconds=settings.ADMISSION_PENDING_TTL_SECONDS,
+)
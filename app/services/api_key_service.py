@@ -1,17 +1,46 @@
+import logging
+
 from sqlalchemy.orm import Session
-from app.crud.api_key import (
-    create_api_key_db,
-    get_api_key_by_hash,
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud.api_key import create_api_key_db
+from app.crud.api_key_async import (
+    decrement_api_key_calls,
+    get_active_api_keys_by_prefix,
+    get_active_legacy_api_keys,
+    get_api_key_by_id,
     increment_api_key_calls,
+    set_api_key_prefix,
 )
 from app.schemas.api_key import ApiKeyCreate, ApiKeyResponse, ApiKeyInDB
-from app.core.security import generate_api_key, get_api_key_hash, verify_api_key
+from app.core.security import (
+    generate_api_key,
+    get_api_key_hash,
+    get_api_key_prefix,
+    verify_api_key_async,
+)
 from app.core.config import settings
+from app.core.api_key_cache import verified_key_cache
+from app.core.metrics import PLATE_STAGE_SECONDS
+from app.core.rate_limit import TokenBucketRateLimiter
+from app.services.call_counter import buffered_call_counter
+from app.services.quota import redis_quota_counter
 from datetime import datetime
 from app.db.models import ApiKey
 from fastapi import HTTPException, status
 from sqlalchemy import func
 
+logger = logging.getLogger(__name__)
+
+# Limita as varreduras de chaves antigas (um bcrypt por chave sem prefixo), para
+# que chaves inválidas em massa não consumam a CPU da API
+legacy_scan_limiter = TokenBucketRateLimiter(
+    rate=settings.API_KEY_LEGACY_SCANS_PER_SECOND,
+    burst=settings.API_KEY_LEGACY_SCAN_BURST,
+    key_prefix="ratelimit:legacy-scan",
+)
+# Avisa uma vez por processo que a varredura de chaves antigas já pode ser desligada
+_legacy_exhausted_logged = False
+
 
 class ApiKeyService:
     def create_new_api_key(
@@ -28,38 +57,29 @@ class ApiKeyService:
             )
         plain_key = generate_api_key(settings.API_KEY_LENGTH)
         key_hash = get_api_key_hash(plain_key)
-        db_api_key = create_api_key_db(db, key_hash, api_key_data)
+        key_prefix = get_api_key_prefix(plain_key)
+        db_api_key = create_api_key_db(db, key_hash, key_prefix, api_key_data)
         # Retorna a chave em texto puro APENAS NESTE PONTO.
         # Nunca armazene ou retorne a chave em texto puro em outros lugares.
         return ApiKeyResponse(key=plain_key, **db_api_key.__dict__)
 
-    def validate_and_use_api_key(
-        self, db: Session, client_api_key: str
+    async def authenticate_api_key(
+        self, db: AsyncSession, client_api_key: str
     ) -> ApiKeyInDB | None:
         """
-        Valida a chave de API fornecida pelo cliente, verifica limites e expiração,
-        e incrementa o contador de chamadas.
-        Retorna o objeto ApiKeyInDB se a chave for válida e autorizada, None caso contrário.
+        Valida a chave de API sem consumir chamadas. Usado quando a quantidade a
+        cobrar só é conhecida depois (ex.: envio em lote).
         """
-        # Em cenários de alta performance com muitas chaves, um cache (Redis)
-        # das chaves ativas ou um mecanismo de busca otimizado pode ser necessário.
-        # A verificação iterativa de hash pode ser lenta com milhares de chaves.
-        # No entanto, para começar, essa abordagem é clara e funcional.
-
-        all_active_keys = db.query(ApiKey).filter(ApiKey.is_active == True).all()
+        with PLATE_STAGE_SECONDS.labels("auth").time():
+            found_key = await self._find_cached_api_key(db, client_api_key)
 
-        found_key = None
-        for db_key_model in all_active_keys:
-            if verify_api_key(client_api_key, db_key_model.key_hash):
-                found_key = db_key_model
-                break
+            if not found_key:
+                found_key = await self._find_api_key(db, client_api_key)
+                if found_key:
+                    verified_key_cache.set(client_api_key, found_key.id, found_key.key_hash)
 
         if not found_key:
-            return None  # Chave não encontrada ou hash não corresponde a nenhuma chave ativa
-
-        # Verifica se a chave excedeu o limite de chamadas
-        if found_key.calls_made >= found_key.call_limit:
-            return None  # Limite de chamadas excedido
+            return None
 
         # # Verifica se a chave expirou
         # if found_key.expires_at and found_key.expires_at < datetime.utcnow():
@@ -67,7 +87,124 @@ class ApiKeyService:
         #     # deactivate_api_key(db, found_key)
         #     return None  # Chave expirada
 
-        # Incrementa o contador de chamadas APENAS SE a chave for válida e autorizada
-        increment_api_key_calls(db, found_key)
+        # Copia os dados, desacoplando o retorno da sessão
+        return ApiKeyInDB.model_validate(found_key)
+
+    async def charge_api_key(
+        self, db: AsyncSession, api_key_data: ApiKeyInDB, amount: int = 1
+    ) -> ApiKeyInDB | None:
+        """
+        Consome 'amount' chamadas da quota da chave de uma só vez.
+        Retorna a chave com calls_made atualizado, ou None se o limite seria excedido
+        (nesse caso nada é cobrado).
+        """
+        with PLATE_STAGE_SECONDS.labels("quota_charge").time():
+            # A conferência do limite e o incremento acontecem juntos, sem corrida.
+            if settings.CALL_COUNTER_MODE == "buffered":
+                calls_made = buffered_call_counter.try_charge(
+                    api_key_data.id, api_key_data.calls_made, api_key_data.call_limit, amount
+                )
+            elif settings.CALL_COUNTER_MODE == "redis":
+                calls_made = await redis_quota_counter.try_charge(
+                    api_key_data.id, api_key_data.calls_made, api_key_data.call_limit, amount
+                )
+            else:
+                calls_made = await increment_api_key_calls(db, api_key_data.id, amount)
+
+        if calls_made is None:
+            return None  # Limite de chamadas excedido
+
+        return api_key_data.model_copy(update={"calls_made": calls_made})
+
+    async def refund_api_key(
+        self, db: AsyncSession, api_key_data: ApiKeyInDB, amount: int = 1
+    ) -> None:
+        """Devolve 'amount' chamadas cobradas por trabalho que acabou não sendo aceito."""
+        if settings.CALL_COUNTER_MODE == "buffered":
+            buffered_call_counter.refund(api_key_data.id, amount)
+        elif settings.CALL_COUNTER_MODE == "redis":
+            await redis_quota_counter.refund(api_key_data.id, amount)
+        else:
+            await decrement_api_key_calls(db, api_key_data.id, amount)
+
+    async def _find_cached_api_key(
+        self, db: AsyncSession, client_api_key: str
+    ) -> ApiKey | None:
+        """
+        Consulta o cache de chaves verificadas. Num acerto, a linha é lida pelo ID
+        e o bcrypt é evitado; se ela tiver mudado (desativada ou com outro hash),
+        a entrada é descartada e a validação segue pelo caminho normal.
+        """
+        cached = verified_key_cache.get(client_api_key)
+        if not cached:
+            return None
+        api_key_id, key_hash = cached
+        db_key_model = await get_api_key_by_id(db, api_key_id)
+        if (
+            db_key_model
+            and db_key_model.is_active
+            and db_key_model.key_hash == key_hash
+        ):
+            return db_key_model
+        verified_key_cache.invalidate(client_api_key)
+        return None
+
+    async def _find_api_key(
+        self, db: AsyncSession, client_api_key: str
+    ) -> ApiKey | None:
+        """
+        Localiza a chave pelo prefixo (coluna indexada) para encontrar a única
+        candidata, de forma que cada validação custa uma consulta e um bcrypt.
+        """
+        key_prefix = get_api_key_prefix(client_api_key)
+
+        for db_key_model in await get_active_api_keys_by_prefix(db, key_prefix):
+            if await verify_api_key_async(client_api_key, db_key_model.key_hash):
+                return db_key_model
+
+        if settings.API_KEY_LEGACY_LOOKUP:
+            return await self._find_legacy_api_key(db, client_api_key, key_prefix)
+        return None
+
+    async def _find_legacy_api_key(
+        self, db: AsyncSession, client_api_key: str, key_prefix: str
+    ) -> ApiKey | None:
+        """
+        Procura a chave entre as chaves antigas (sem key_prefix) verificando o hash
+        de cada uma. Ao encontrar, grava o prefixo para que as próximas requisições
+        usem a busca indexada. Conforme as chaves antigas forem usadas, esta
+        varredura encolhe até ficar vazia. As varreduras são limitadas por
+        legacy_scan_limiter; acima do limite, a chave é recusada sem bcrypt.
+        """
+        global _legacy_exhausted_logged
+        legacy_keys = await get_active_legacy_api_keys(db)
+        if not legacy_keys:
+            if not _legacy_exhausted_logged:
+                logger.info(
+                    "Não há chaves ativas sem prefixo; API_KEY_LEGACY_LOOKUP pode ser desativado."
+                )
+                _legacy_exhausted_logged = True
+            return None
+        if not await self._legacy_scan_allowed():
+            logger.warning(
+                "Varredura de %d chaves antigas recusada pelo limite de varreduras.",
+                len(legacy_keys),
+            )
+            return None
+        for db_key_model in legacy_keys:
+            if await verify_api_key_async(client_api_key, db_key_model.key_hash):
+                logger.info(
+                    "Chave antiga %s migrada para a busca por prefixo; restam %d sem prefixo.",
+                    db_key_model.id,
+                    len(legacy_keys) - 1,
+                )
+                return await set_api_key_prefix(db, db_key_model, key_prefix)
+        return None
 
-        return found_key
+    async def _legacy_scan_allowed(self) -> bool:
+        try:
+            return (await legacy_scan_limiter.hit("scan")).allowed
+        except Exception:
+            # Mesmo critério do limite de taxa: Redis fora do ar não derruba a API
+            logger.warning("Limite de varreduras indisponível; varredura liberada.", exc_info=True)
+            return True
@@ -0,0 +1,130 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+import httpx
+
+from app.services.http_client import http_timeout, post_with_retry
+
+# Micro-batching das chamadas ao YOLO e ao OCR.
+#
+# Contrato dos endpoints em lote (configurados por YOLO_BATCH_API_URL,
+# EZOCR_BATCH_API_URL e OCR_BATCH_API_URL):
+#
+# - Requisição: POST multipart com o campo 'files' repetido, um por imagem.
+#   No OCR, o campo 'categorias' é repetido na mesma ordem ('' = sem categoria).
+#   No YOLO, o campo opcional 'crop_mode' vale para o lote todo.
+# - Resposta: JSON {"results": [...]} com um item por imagem, na mesma ordem.
+#   Cada item tem o mesmo formato da resposta do endpoint individual, ou
+#   {"error": "<mensagem>"} quando aquela imagem falhou.
+#
+# Há um servidor de referência com os dois formatos em app.stubs.plate_services.
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# (nome do arquivo, bytes, content type)
+ArquivoLote = Tuple[str, bytes, str]
+
+
+class BatchItemError(Exception):
+    """O endpoint em lote devolveu erro para um item específico."""
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Agrupa itens enviados por várias corrotinas e os despacha juntos quando o
+    lote chega a 'max_size' itens ou quando o primeiro item completa 'max_wait'
+    segundos de espera. Cada corrotina recebe o resultado da sua posição.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[T]], Awaitable[List[R]]],
+        max_size: int,
+        max_wait: float,
+    ):
+        self.send_batch = send_batch
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # O event loop guarda só referências fracas às tasks: sem esta referência,
+        # um despacho em curso poderia ser coletado antes de terminar
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # Descarta itens cujos solicitantes já desistiram (ex.: cascata cancelada)
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            results = await self.send_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Lote com {len(batch)} itens recebeu {len(results)} resultados."
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # quem esperava foi cancelado (ex.: tentativa de OCR descartada)
+            if isinstance(result, dict) and "error" in result:
+                future.set_exception(BatchItemError(result["error"]))
+            else:
+                future.set_result(result)
+
+
+async def enviar_lote_yolo(
+    client: httpx.AsyncClient,
+    url: str,
+    timeout: float,
+    crop_mode: str,
+    itens: List[ArquivoLote],
+) -> List[dict]:
+    resp = await post_with_retry(
+        client,
+        url,
+        files=[("files", item) for item in itens],
+        data={"crop_mode": crop_mode} if crop_mode in ("inline", "bbox") else {},
+        timeout=http_timeout(timeout),
+    )
+    resp.raise_for_status()
+    return resp.json()["results"]
+
+
+async def enviar_lote_ocr(
+    client: httpx.AsyncClient,
+    url: str,
+    timeout: float,
+    itens: List[Tuple[bytes, Optional[str]]],
+) -> List[dict]:
+    resp = await post_with_retry(
+        client,
+        url,
+        files=[("files", ("input.jpg", crop, "image/jpeg")) for crop, _ in itens],
+        data={"categorias": [categoria or "" for _, categoria in itens]},
+        timeout=http_timeout(timeout),
+    )
+    resp.raise_for_status()
+    return resp.json()["results"]
@@ -0,0 +1,129 @@
+import hashlib
+import itertools
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+from app.core.config import settings
+
+# Tamanho dos blocos lidos/gravados ao copiar um envio para o armazenamento
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobTooLargeError(ValueError):
+    """O conteúdo excede o tamanho máximo permitido."""
+
+
+class BlobStore:
+    """
+    Armazenamento de imagens endereçado por conteúdo num diretório compartilhado
+    entre API e workers. A API grava o arquivo e envia ao Celery apenas a
+    referência (SHA-256 do conteúdo); o worker abre o arquivo via mmap, sem que
+    os bytes passem pelo broker.
+
+    Imagens idênticas resultam na mesma referência e ocupam um único arquivo.
+    A limpeza é por idade (cleanup), já que vários envios podem compartilhar
+    o mesmo blob.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def path(self, ref: str) -> str:
+        """Caminho do blob; subdiretórios pelos 2 primeiros caracteres do hash."""
+        if len(ref) != 64 or not all(c in "0123456789abcdef" for c in ref):
+            raise ValueError(f"Referência de blob inválida: {ref!r}")
+        return os.path.join(self.root_dir, ref[:2], ref)
+
+    def put(self, data: bytes) -> str:
+        """Grava os bytes (se ainda não existirem) e retorna a referência."""
+        ref = hashlib.sha256(data).hexdigest()
+        final_path = self.path(ref)
+        if os.path.exists(final_path):
+            os.utime(final_path)  # renova a idade para a limpeza
+            return ref
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Escrita atômica: grava num temporário do mesmo diretório e renomeia
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(final_path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return ref
+
+    def put_stream(self, fileobj: BinaryIO, max_bytes: int, head: bytes = b"") -> str:
+        """
+        Copia o conteúdo de um arquivo em blocos, calculando o hash durante a
+        cópia, sem carregar tudo em memória. Levanta BlobTooLargeError (e descarta
+        o que foi gravado) se o conteúdo passar de max_bytes.
+
+        'head' são bytes do início do conteúdo já lidos de fileobj, para fontes
+        que não permitem voltar ao início (ex.: membros de um tar em streaming).
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                chunks = iter(lambda: fileobj.read(CHUNK_SIZE), b"")
+                for chunk in itertools.chain([head] if head else [], chunks):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise BlobTooLargeError(
+                            f"Conteúdo excede o limite de {max_bytes} bytes."
+                        )
+                    digest.update(chunk)
+                    out.write(chunk)
+            ref = digest.hexdigest()
+            final_path = self.path(ref)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return ref
+
+    @contextmanager
+    def open(self, ref: str) -> Iterator[mmap.mmap]:
+        """Abre o blob mapeado em memória (somente leitura)."""
+        with open(self.path(ref), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def delete(self, ref: str) -> None:
+        try:
+            os.unlink(self.path(ref))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self, max_age_seconds: float) -> int:
+        """Remove blobs mais antigos que max_age_seconds. Retorna quantos removeu."""
+        if not os.path.isdir(self.root_dir):
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                try:
+                    if os.stat(full_path).st_mtime < cutoff:
+                        os.unlink(full_path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+# Sem BLOB_STORE_DIR, usa um subdiretório do volume já compartilhado com o YOLO
+blob_store = BlobStore(
+    settings.BLOB_STORE_DIR or os.path.join(settings.YOLO_OUTPUT_DIR, "_blobs")
+)
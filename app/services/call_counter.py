@@ -0,0 +1,98 @@
+import logging
+import threading
+from collections import defaultdict
+
+from app.core.config import settings
+from app.crud.api_key import add_api_key_calls
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCallCounter:
+    """
+    Acumula em memória os incrementos de calls_made e os grava no Postgres em lote,
+    numa thread de fundo, a cada CALL_COUNTER_FLUSH_INTERVAL_SECONDS.
+
+    A quota é conferida contra o calls_made lido do banco somado ao que este
+    processo ainda não descarregou. Com várias réplicas, cada uma só enxerga os
+    próprios pendentes, então o limite pode ser ultrapassado em até um intervalo
+    de descarga de chamadas por réplica.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def try_charge(
+        self, api_key_id: int, calls_made: int, call_limit: int, amount: int = 1
+    ) -> int | None:
+        """
+        Reserva 'amount' chamadas para a chave se couberem na quota.
+        Retorna o calls_made efetivo (banco + pendentes), ou None se excedido.
+        """
+        with self._lock:
+            effective = calls_made + self._pending[api_key_id] + amount
+            if effective > call_limit:
+                return None
+            self._pending[api_key_id] += amount
+        self.start()
+        return effective
+
+    def refund(self, api_key_id: int, amount: int = 1) -> None:
+        """Devolve 'amount' chamadas reservadas por try_charge."""
+        with self._lock:
+            self._pending[api_key_id] -= amount
+
+    def flush(self) -> None:
+        """Grava no banco os incrementos pendentes."""
+        with self._lock:
+            batch = {k: v for k, v in self._pending.items() if v}
+            self._pending.clear()
+        if not batch:
+            return
+        db = SessionLocal()
+        try:
+            add_api_key_calls(db, batch)
+        except Exception:
+            logger.exception("Erro ao gravar contadores de chamadas; reagendando.")
+            # Devolve os incrementos para a próxima tentativa
+            with self._lock:
+                for api_key_id, amount in batch.items():
+                    self._pending[api_key_id] += amount
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        """Inicia a thread de descarga, se ainda não estiver rodando."""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="call-counter-flush", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Interrompe a thread de descarga e grava o que estiver pendente."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval * 2)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+
+# Instância única por processo (usada quando CALL_COUNTER_MODE == "buffered")
+buffered_call_counter = BufferedCallCounter(
+    flush_interval=settings.CALL_COUNTER_FLUSH_INTERVAL_SECONDS
+)
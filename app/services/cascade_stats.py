@@ -0,0 +1,163 @@
+import logging
+import random
+import time
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Estatísticas das tentativas de OCR de uma classe detectada (hash com os campos
+# "<tentativa>:n", "<tentativa>:ok" e "<tentativa>:lat") e o conjunto de classes
+CASCADE_STATS_KEY = "plate:cascade:{classe}"
+CASCADE_CLASSES_KEY = "plate:cascade:classes"
+# Classe usada quando o YOLO não informa nenhuma
+SEM_CLASSE = "-"
+
+# (nome da tentativa, acertou, duração em segundos)
+Observacao = Tuple[str, bool, float]
+
+# Atualiza as médias com decaimento: a cada amostra, os totais anteriores são
+# multiplicados por ARGV[1]; a latência é a média ponderada pelos mesmos pesos.
+RECORD_SCRIPT = """
+local decay = tonumber(ARGV[1])
+for i = 3, #ARGV, 3 do
+    local nome = ARGV[i]
+    local v = redis.call('HMGET', KEYS[1], nome .. ':n', nome .. ':ok', nome .. ':lat')
+    local n = (tonumber(v[1]) or 0) * decay + 1
+    local ok = (tonumber(v[2]) or 0) * decay + tonumber(ARGV[i + 1])
+    local lat = tonumber(ARGV[i + 2])
+    local media = tonumber(v[3])
+    if media then
+        lat = media + (lat - media) / n
+    end
+    redis.call('HSET', KEYS[1], nome .. ':n', n, nome .. ':ok', ok, nome .. ':lat', lat)
+end
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+class CascadeStats:
+    """
+    Escolhe a ordem da cascata de OCR de cada classe detectada pelo YOLO a
+    partir da taxa de acerto e da latência de cada tentativa, observadas por
+    todos os workers e guardadas no Redis.
+
+    As tentativas com pelo menos 'min_samples' amostras são ordenadas pela razão
+    acerto / latência média (a ordem que minimiza o tempo esperado até a
+    primeira leitura); as demais mantêm a posição da ordem padrão. Uma fração
+    'explore_rate' das imagens usa a ordem padrão, para que as tentativas
+    rebaixadas continuem sendo medidas. As estatísticas lidas ficam em cache no
+    processo por 'cache_seconds'.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        min_samples: int,
+        decay: float,
+        explore_rate: float,
+        cache_seconds: float,
+    ):
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.decay = decay
+        self.explore_rate = explore_rate
+        self.cache_seconds = cache_seconds
+        self._cache: dict[str, Tuple[float, dict]] = {}
+
+    @staticmethod
+    def _classe(classe: Optional[str]) -> str:
+        return classe or SEM_CLASSE
+
+    @staticmethod
+    def _parse(raw: dict) -> dict[str, dict]:
+        """{"<tentativa>": {"n": ..., "ok": ..., "lat": ...}} a partir do hash."""
+        stats: dict[str, dict] = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            nome, _, campo = field.rpartition(":")
+            stats.setdefault(nome, {})[campo] = float(value)
+        return stats
+
+    def ordenar(self, stats: dict[str, dict], padrao: List[str]) -> List[str]:
+        """Ordem das tentativas segundo as estatísticas, respeitando 'padrao'."""
+
+        def pontuacao(nome: str) -> float:
+            s = stats[nome]
+            return (s["ok"] / s["n"]) / max(s["lat"], 1e-3)
+
+        conhecidas = [
+            nome for nome in padrao if stats.get(nome, {}).get("n", 0) >= self.min_samples
+        ]
+        ordenadas = iter(sorted(conhecidas, key=pontuacao, reverse=True))
+        return [next(ordenadas) if nome in conhecidas else nome for nome in padrao]
+
+    async def _stats(self, classe: str) -> dict[str, dict]:
+        now = time.monotonic()
+        cached = self._cache.get(classe)
+        if cached and cached[0] > now:
+            return cached[1]
+        stats = self._parse(
+            await get_async_redis().hgetall(CASCADE_STATS_KEY.format(classe=classe))
+        )
+        self._cache[classe] = (now + self.cache_seconds, stats)
+        return stats
+
+    async def ordem(self, classe: Optional[str]) -> List[str]:
+        """Ordem da cascata para a classe detectada (ou a padrão)."""
+        padrao = list(settings.OCR_CASCADE_ORDER)
+        if not self.enabled or random.random() < self.explore_rate:
+            return padrao
+        try:
+            stats = await self._stats(self._classe(classe))
+        except Exception:
+            logger.warning("Estatísticas da cascata indisponíveis; usando a ordem padrão.", exc_info=True)
+            return padrao
+        return self.ordenar(stats, padrao)
+
+    async def record(self, classe: Optional[str], observacoes: List[Observacao]) -> None:
+        """Registra o resultado das tentativas que terminaram para uma imagem."""
+        if not self.enabled or not observacoes:
+            return
+        classe = self._classe(classe)
+        args = []
+        for nome, acertou, duracao in observacoes:
+            args.extend([nome, 1 if acertou else 0, duracao])
+        try:
+            await get_async_redis().eval(
+                RECORD_SCRIPT,
+                2,
+                CASCADE_STATS_KEY.format(classe=classe),
+                CASCADE_CLASSES_KEY,
+                self.decay,
+                classe,
+                *args,
+            )
+        except Exception:
+            logger.warning("Falha ao registrar estatísticas da cascata.", exc_info=True)
+
+    async def snapshot(self) -> dict[str, dict[str, dict]]:
+        """Estatísticas atuais de todas as classes observadas (sem cache)."""
+        client = get_async_redis()
+        classes = sorted(
+            c.decode() if isinstance(c, bytes) else c
+            for c in await client.smembers(CASCADE_CLASSES_KEY)
+        )
+        pipe = client.pipeline(transaction=False)
+        for classe in classes:
+            pipe.hgetall(CASCADE_STATS_KEY.format(classe=classe))
+        return {
+            classe: self._parse(raw) for classe, raw in zip(classes, await pipe.execute())
+        }
+
+
+cascade_stats = CascadeStats(
+    enabled=settings.ADAPTIVE_CASCADE_ENABLED,
+    min_samples=settings.ADAPTIVE_CASCADE_MIN_SAMPLES,
+    decay=settings.ADAPTIVE_CASCADE_DECAY,
+    explore_rate=settings.ADAPTIVE_CASCADE_EXPLORE_RATE,
+    cache_seconds=settings.ADAPTIVE_CASCADE_CACHE_SECONDS,
+)
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Tuple, TypeVar
+from uuid import uuid4
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import BACKEND_CIRCUIT_REJECTIONS, BACKEND_REQUEST_SECONDS
+from app.core.redis_client import get_async_redis
+from app.services.batching import BatchItemError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Estado de cada réplica (hash): janela de contagem (ws, n, f), latência média
+# (lat), fim do período aberto (open_until), reserva da sonda (probe_until) e o
+# token da sonda reservada (probe).
+CIRCUIT_KEY = "plate:circuit:{url}"
+
+# Peso da última chamada na média móvel exponencial da latência
+LATENCY_ALPHA = 0.2
+
+# Escolhe a réplica: uma réplica meio aberta cuja sonda esteja livre (reservando
+# a sonda com o token ARGV[3]) ou, senão, a réplica fechada de menor latência
+# média. Devolve {índice (base 0) ou -1 se todas estiverem abertas, 1 se a
+# chamada é a sonda}.
+SELECT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local best, best_lat = -1, nil
+for i, key in ipairs(KEYS) do
+    local v = redis.call('HMGET', key, 'open_until', 'probe_until', 'lat')
+    local open_until = tonumber(v[1]) or 0
+    if open_until == 0 then
+        local lat = tonumber(v[3]) or 0
+        if best_lat == nil or lat < best_lat then
+            best, best_lat = i, lat
+        end
+    elseif now >= open_until and now >= (tonumber(v[2]) or 0) then
+        redis.call('HSET', key, 'probe_until', now + tonumber(ARGV[2]), 'probe', ARGV[3])
+        return {i - 1, 1}
+    end
+end
+if best > 0 then
+    return {best - 1, 0}
+end
+return {-1, 0}
+"""
+
+# Registra o resultado de uma chamada. Fechado: conta falhas na janela e abre
+# se a taxa de erro passar do limite. Meio aberto: só a sonda reservada (token
+# em ARGV[10]) fecha (sucesso) ou reabre (falha) o circuito. Aberto, ou chamada
+# que não é a sonda: respostas atrasadas só atualizam a latência.
+RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local failed = ARGV[2] == '1'
+local latency = tonumber(ARGV[3])
+local open_seconds = tonumber(ARGV[7])
+local v = redis.call('HMGET', KEYS[1], 'ws', 'n', 'f', 'lat', 'open_until', 'probe')
+
+local lat = tonumber(v[4])
+if lat then
+    lat = lat + tonumber(ARGV[8]) * (latency - lat)
+else
+    lat = latency
+end
+redis.call('HSET', KEYS[1], 'lat', lat)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[9]))
+
+local open_until = tonumber(v[5]) or 0
+if open_until > 0 then
+    if now < open_until or ARGV[10] == '' or ARGV[10] ~= v[6] then
+        return 'open'
+    end
+    if failed then
+        redis.call('HSET', KEYS[1], 'open_until', now + open_seconds, 'probe_until', 0, 'probe', '')
+        return 'open'
+    end
+    redis.call('HSET', KEYS[1], 'open_until', 0, 'probe_until', 0, 'probe', '', 'ws', now, 'n', 0, 'f', 0)
+    return 'closed'
+end
+
+local ws, n, f = tonumber(v[1]) or 0, tonumber(v[2]) or 0, tonumber(v[3]) or 0
+if now - ws >= tonumber(ARGV[4]) then
+    ws, n, f = now, 0, 0
+end
+n = n + 1
+if failed then
+    f = f + 1
+end
+if n >= tonumber(ARGV[5]) and f / n >= tonumber(ARGV[6]) then
+    redis.call('HSET', KEYS[1], 'open_until', now + open_seconds, 'probe_until', 0, 'ws', now, 'n', 0, 'f', 0)
+    return 'open'
+end
+redis.call('HSET', KEYS[1], 'ws', ws, 'n', n, 'f', f)
+return 'closed'
+"""
+
+
+class CircuitOpenError(Exception):
+    """Todas as réplicas do backend estão com o circuito aberto."""
+
+
+def is_backend_failure(exc: Exception) -> bool:
+    """
+    Falhas que contam contra o backend: erros de rede/timeout, respostas 5xx e
+    respostas ilegíveis. Respostas 4xx e erros de um item do lote indicam que o
+    backend está respondendo.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return not isinstance(exc, BatchItemError)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por URL de backend (YOLO, ezOCR, OCR), com o estado no Redis
+    para ser compartilhado por todos os processos dos workers.
+
+    - Fechado: as chamadas passam; falhas e chamadas lentas (acima de
+      'slow_call_seconds') são contadas numa janela de 'window_seconds'. Com
+      pelo menos 'min_requests' chamadas e taxa de falha >= 'error_rate', abre.
+    - Aberto: a réplica é pulada imediatamente por 'open_seconds'.
+    - Meio aberto: passado esse período, uma única chamada (sonda) é liberada a
+      cada 'open_seconds'; sucesso fecha o circuito, falha o reabre. Só o
+      resultado da sonda conta: chamadas iniciadas antes da abertura que
+      terminam depois dela não fecham o circuito.
+
+    Um backend pode ter várias réplicas; cada chamada vai para a réplica fechada
+    de menor latência média. Se o Redis estiver indisponível, as chamadas vão
+    para a primeira réplica (fail-open).
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        window_seconds: float,
+        min_requests: int,
+        error_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+    ):
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+
+    async def select(self, urls: List[str]) -> Tuple[str | None, str | None]:
+        """
+        Réplica a chamar (None se todas estiverem com o circuito aberto) e, se a
+        chamada for a sonda de uma réplica meio aberta, o token da sonda, a ser
+        repassado a record().
+        """
+        if not self.enabled:
+            return urls[0], None
+        token = uuid4().hex
+        try:
+            index, is_probe = await get_async_redis().eval(
+                SELECT_SCRIPT,
+                len(urls),
+                *[CIRCUIT_KEY.format(url=url) for url in urls],
+                time.time(),
+                self.open_seconds,
+                token,
+            )
+        except Exception:
+            logger.warning("Circuit breaker indisponível; usando a réplica principal.", exc_info=True)
+            return urls[0], None
+        if index < 0:
+            return None, None
+        return urls[index], token if is_probe else None
+
+    async def record(
+        self, url: str, failed: bool, latency: float, probe: str | None = None
+    ) -> None:
+        if not self.enabled:
+            return
+        failed = failed or latency > self.slow_call_seconds
+        try:
+            await get_async_redis().eval(
+                RECORD_SCRIPT,
+                1,
+                CIRCUIT_KEY.format(url=url),
+                time.time(),
+                "1" if failed else "0",
+                latency,
+                self.window_seconds,
+                self.min_requests,
+                self.error_rate,
+                self.open_seconds,
+                LATENCY_ALPHA,
+                max(int(self.window_seconds + self.open_seconds) * 10, 3600),
+                probe or "",
+            )
+        except Exception:
+            logger.warning("Falha ao registrar chamada de %s no circuit breaker.", url, exc_info=True)
+
+    async def call(self, urls: List[str], func: Callable[[str], Awaitable[T]]) -> T:
+        """
+        Executa 'func(url)' na réplica escolhida e registra o resultado. Levanta
+        CircuitOpenError, sem chamar nada, se todas as réplicas estão abertas.
+
+        Chamadas canceladas (ex.: tentativa de OCR descartada pelo hedging) só
+        contam se já passavam de 'slow_call_seconds': nesse caso o backend estava
+        lento e a chamada é registrada como falha. Canceladas antes disso não
+        dizem nada sobre o backend e são ignoradas.
+        """
+        url, probe = await self.select(urls)
+        if url is None:
+            BACKEND_CIRCUIT_REJECTIONS.labels(urls[0]).inc()
+            raise CircuitOpenError(f"Circuito aberto para {urls[0]}.")
+        start = time.monotonic()
+        try:
+            result = await func(url)
+        except asyncio.CancelledError:
+            latency = time.monotonic() - start
+            if latency > self.slow_call_seconds:
+                BACKEND_REQUEST_SECONDS.labels(url, "cancelled").observe(latency)
+                # shield: um novo cancelamento não interrompe o registro
+                await asyncio.shield(self.record(url, True, latency, probe))
+            raise
+        except Exception as e:
+            failed = is_backend_failure(e)
+            latency = time.monotonic() - start
+            outcome = "failure" if failed else "client_error"
+            BACKEND_REQUEST_SECONDS.labels(url, outcome).observe(latency)
+            await self.record(url, failed, latency, probe)
+            raise
+        latency = time.monotonic() - start
+        BACKEND_REQUEST_SECONDS.labels(url, "success").observe(latency)
+        await self.record(url, False, latency, probe)
+        return result
+
+
+circuit_breaker = CircuitBreaker(
+    enabled=settings.CIRCUIT_BREAKER_ENABLED,
+    window_seconds=settings.CIRCUIT_BREAKER_WINDOW_SECONDS,
+    min_requests=settings.CIRCUIT_BREAKER_MIN_REQUESTS,
+    error_rate=settings.CIRCUIT_BREAKER_ERROR_RATE,
+    slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+)
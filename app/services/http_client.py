@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+
+from app.core.config import settings
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Cria o cliente HTTP assíncrono usado pelo pipeline, com pool de conexões
+    keep-alive para YOLO e OCR. O cliente pertence ao event loop em que é usado.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(
+            settings.OCR_TIMEOUT_SECONDS,
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+def http_timeout(read_timeout: float) -> httpx.Timeout:
+    """Timeout de leitura por backend, mantendo o timeout de conexão comum."""
+    return httpx.Timeout(read_timeout, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+
+async def post_with_retry(
+    client: httpx.AsyncClient, url: str, **kwargs
+) -> httpx.Response:
+    """
+    POST com retentativas e backoff exponencial para respostas 5xx e falhas ao
+    abrir a conexão. A última resposta (ou exceção) é repassada a quem chamou.
+
+    Timeouts de leitura, escrita ou do pool não são repetidos: a requisição pode
+    já ter chegado ao backend (o POST não é idempotente), e repetir um backend
+    travado multiplicaria a espera pelo número de tentativas.
+    """
+    attempt = 0
+    while True:
+        try:
+            resp = await client.post(url, **kwargs)
+            if resp.status_code < 500 or attempt >= settings.HTTP_RETRIES:
+                return resp
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if attempt >= settings.HTTP_RETRIES:
+                raise
+        await asyncio.sleep(settings.HTTP_RETRY_BACKOFF_SECONDS * (2**attempt))
+        attempt += 1
@@ -0,0 +1,294 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+from typing import AsyncIterator
+
+import httpx
+
+from app.celery_app import celery
+from app.core.config import settings
+from app.core.redis_client import get_async_redis, get_redis
+
+# Quem deve ser avisado quando a task terminar (lista de JSONs)
+SUBSCRIBERS_KEY = "plate:notify:{task_id}"
+# Evento de conclusão já publicado, para quem se inscrever depois
+DONE_KEY = "plate:notify:done:{task_id}"
+# Canal pub/sub com as conclusões das tasks de uma chave de API
+EVENTS_CHANNEL = "plate:events:{api_key_id}"
+
+# Inscreve o assinante, a menos que a task já tenha terminado: nesse caso
+# devolve o evento publicado. Atômico em relação a publish(), que esvazia a
+# lista e grava o evento numa transação.
+SUBSCRIBE_SCRIPT = """
+local done = redis.call('GET', KEYS[2])
+if done then
+    return done
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return false
+"""
+
+
+class TaskNotifier:
+    """
+    Entrega o resultado das tasks sem que o cliente precise consultar
+    /tasks/{task_id} em loop.
+
+    No envio, a API registra em 'plate:notify:<task_id>' quem deve ser avisado
+    (chave de API, callback_url e grupo). Ao terminar, o worker lê e apaga esse
+    registro e, para cada inscrito, publica o evento no canal da chave (lido pelo
+    endpoint SSE) e agenda o webhook, se houver. Como o registro é por task, um
+    envio que reaproveita uma task em curso (imagem idêntica) também é avisado.
+    O evento fica guardado em 'plate:notify:done:<task_id>': quem se inscreve
+    numa task que acabou de terminar recebe o aviso na hora, em vez de nunca.
+
+    A API usa os métodos assíncronos; o worker, os síncronos.
+    """
+
+    def __init__(self, subscription_ttl_seconds: int):
+        self.subscription_ttl_seconds = subscription_ttl_seconds
+
+    async def subscribe_many(
+        self,
+        task_ids: list[str],
+        api_key_id: int,
+        callback_url: str | None = None,
+        group_id: str | None = None,
+    ) -> None:
+        """
+        Inscreve a chave (e o callback) nas conclusões das tasks indicadas. As
+        tasks que já terminaram são avisadas imediatamente.
+        """
+        if not task_ids:
+            return
+        subscriber = {
+            "api_key_id": api_key_id,
+            "callback_url": callback_url,
+            "group_id": group_id,
+        }
+        raw_subscriber = json.dumps(subscriber)
+        client = get_async_redis()
+        pipe = client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.eval(
+                SUBSCRIBE_SCRIPT,
+                2,
+                SUBSCRIBERS_KEY.format(task_id=task_id),
+                DONE_KEY.format(task_id=task_id),
+                raw_subscriber,
+                self.subscription_ttl_seconds,
+            )
+        finished = [json.loads(done) for done in await pipe.execute() if done]
+        if not finished:
+            return
+
+        pipe = client.pipeline(transaction=False)
+        webhooks = []
+        for event in finished:
+            self._dispatch(pipe, subscriber, event, webhooks)
+        await pipe.execute()
+        for callback_url, payload in webhooks:
+            deliver_webhook_task.delay(callback_url, payload)
+
+    @staticmethod
+    def _dispatch(pipe, subscriber: dict, event: dict, webhooks: list) -> None:
+        """Enfileira no pipeline o evento do inscrito e anota o webhook, se houver."""
+        payload = {**event, "group_id": subscriber["group_id"]}
+        pipe.publish(
+            EVENTS_CHANNEL.format(api_key_id=subscriber["api_key_id"]),
+            json.dumps(payload),
+        )
+        if subscriber["callback_url"]:
+            webhooks.append((subscriber["callback_url"], payload))
+
+    def publish(self, task_id: str, event: dict) -> int:
+        """
+        Avisa os inscritos de que a task terminou. 'event' tem o formato de
+        TaskStatusResponse; cada inscrito recebe também o seu group_id.
+        Retorna quantos inscritos foram avisados.
+        """
+        client = get_redis()
+        key = SUBSCRIBERS_KEY.format(task_id=task_id)
+        pipe = client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        pipe.set(
+            DONE_KEY.format(task_id=task_id),
+            json.dumps(event),
+            ex=self.subscription_ttl_seconds,
+        )
+        subscribers = [json.loads(raw) for raw in pipe.execute()[0]]
+        if not subscribers:
+            return 0
+
+        pipe = client.pipeline(transaction=False)
+        webhooks = []
+        for subscriber in subscribers:
+            self._dispatch(pipe, subscriber, event, webhooks)
+        pipe.execute()
+
+        for callback_url, payload in webhooks:
+            deliver_webhook_task.delay(callback_url, payload)
+        return len(subscribers)
+
+    async def listen(
+        self, api_key_id: int, group_id: str | None = None
+    ) -> AsyncIterator[dict | None]:
+        """
+        Gera os eventos de conclusão da chave (opcionalmente só de um grupo), à
+        medida que chegam. Gera None a cada SSE_HEARTBEAT_SECONDS sem eventos,
+        para que quem consome mantenha a conexão viva.
+        """
+        pubsub = get_async_redis().pubsub()
+        channel = EVENTS_CHANNEL.format(api_key_id=api_key_id)
+        await pubsub.subscribe(channel)
+        try:
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=settings.SSE_HEARTBEAT_SECONDS,
+                )
+                if message is None:
+                    yield None
+                    continue
+                event = json.loads(message["data"])
+                if group_id and event.get("group_id") != group_id:
+                    continue
+                yield event
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+
+class UnsafeCallbackError(ValueError):
+    """callback_url que o worker não deve chamar (destino interno ou não permitido)."""
+
+
+class CallbackResolutionError(UnsafeCallbackError):
+    """O host do callback_url não pôde ser resolvido (pode ser temporário)."""
+
+
+def _host_allowed(host: str) -> bool:
+    for allowed in settings.WEBHOOK_ALLOWED_HOSTS:
+        allowed = allowed.lower()
+        if host == allowed or (allowed.startswith(".") and host.endswith(allowed)):
+            return True
+    return False
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def resolve_callback_url(callback_url: str) -> str:
+    """
+    Confere o callback_url (esquema, hosts permitidos) e resolve o host; todos
+    os endereços precisam ser públicos. Devolve o endereço a que a conexão deve
+    ser feita, para que a entrega use exatamente o IP verificado (uma nova
+    resolução poderia apontar para a rede interna: DNS rebinding).
+    """
+    url = httpx.URL(callback_url)
+    if url.scheme not in ("http", "https"):
+        raise UnsafeCallbackError("esquema não suportado")
+    if settings.WEBHOOK_REQUIRE_HTTPS and url.scheme != "https":
+        raise UnsafeCallbackError("é exigido https")
+    if url.userinfo:
+        raise UnsafeCallbackError("credenciais na URL não são aceitas")
+    host = url.host.lower()
+    if not host:
+        raise UnsafeCallbackError("host ausente")
+    if settings.WEBHOOK_ALLOWED_HOSTS and not _host_allowed(host):
+        raise UnsafeCallbackError(f"host {host} não permitido")
+
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise CallbackResolutionError(f"host {host} não resolvido: {e}") from e
+    addresses = [info[4][0] for info in infos]
+    if not addresses:
+        raise CallbackResolutionError(f"host {host} sem endereços")
+    for address in addresses:
+        if not _is_public_address(address):
+            raise UnsafeCallbackError(f"host {host} aponta para endereço interno ({address})")
+    return addresses[0]
+
+
+def sign_webhook_payload(body: bytes) -> str:
+    """Assinatura HMAC-SHA256 do corpo do webhook com WEBHOOK_SIGNING_SECRET."""
+    return hmac.new(
+        settings.WEBHOOK_SIGNING_SECRET.encode("utf-8"), body, hashlib.sha256
+    ).hexdigest()
+
+
+@celery.task(
+    name="plate.deliver_webhook_task",
+    bind=True,
+    max_retries=settings.WEBHOOK_MAX_RETRIES,
+)
+def deliver_webhook_task(self, callback_url: str, payload: dict) -> dict:
+    """
+    Envia (POST JSON) o resultado de uma task ao callback_url do cliente.
+    Falhas de rede e respostas 5xx são retentadas com backoff exponencial;
+    respostas 4xx encerram a entrega. O destino é verificado de novo aqui (ver
+    resolve_callback_url) e a conexão vai ao IP verificado; redirecionamentos
+    não são seguidos.
+    """
+    try:
+        address = resolve_callback_url(callback_url)
+    except CallbackResolutionError as e:
+        raise self.retry(exc=e, countdown=2**self.request.retries)
+    except UnsafeCallbackError as e:
+        print(
+            f"ATENÇÃO: Callback {callback_url} da task {payload.get('task_id')} "
+            f"recusado: {str(e)}"
+        )
+        return {"status_code": None}
+
+    url = httpx.URL(callback_url)
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Host": url.netloc.decode("ascii")}
+    if settings.WEBHOOK_SIGNING_SECRET:
+        headers["X-BRPlates-Signature"] = f"sha256={sign_webhook_payload(body)}"
+    # O certificado continua sendo conferido contra o nome do host (SNI)
+    extensions = {"sni_hostname": url.host} if url.scheme == "https" else None
+    try:
+        with httpx.Client(
+            timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+            follow_redirects=False,
+            trust_env=False,
+        ) as client:
+            resp = client.post(
+                url.copy_with(host=address),
+                content=body,
+                headers=headers,
+                extensions=extensions,
+            )
+    except httpx.TransportError as e:
+        raise self.retry(exc=e, countdown=2**self.request.retries)
+    if resp.status_code >= 500:
+        raise self.retry(
+            exc=httpx.HTTPStatusError(
+                f"Callback respondeu {resp.status_code}",
+                request=resp.request,
+                response=resp,
+            ),
+            countdown=2**self.request.retries,
+        )
+    if not resp.is_success:
+        print(
+            f"ATENÇÃO: Callback {callback_url} recusou o resultado da task "
+            f"{payload.get('task_id')} ({resp.status_code})."
+        )
+    return {"status_code": resp.status_code}
+
+
+task_notifier = TaskNotifier(
+    subscription_ttl_seconds=settings.NOTIFY_SUBSCRIPTION_TTL_SECONDS
+)
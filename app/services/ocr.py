@@ -0,0 +1,255 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.http_client import http_timeout, post_with_retry
+from app.services.plate_format import ranquear_placas
+
+# (url, categoria, timeout em segundos)
+Tentativa = Tuple[str, Optional[str], float]
+# Executa uma tentativa de OCR: (categoria, url, timeout) -> resultado padronizado
+ChamadaOCR = Callable[[Optional[str], str, float], Awaitable[dict]]
+
+
+def resultado_vazio() -> dict:
+    return {"placa": None, "results": []}
+
+
+def padronizar_resultado_ocr_bruto(resultado_ocr: Dict | str) -> dict:
+    results = None
+    if isinstance(resultado_ocr, dict):
+        if "resultado" in resultado_ocr:
+            try:
+                parsed = json.loads(resultado_ocr["resultado"])
+                results = parsed.get("results", [])
+            except json.JSONDecodeError:
+                return resultado_vazio()
+        elif "results" in resultado_ocr:
+            results = resultado_ocr["results"]
+    if results is None:
+        return resultado_vazio()
+    return validar_resultado_ocr(
+        {
+            "placa": results[0]["plate"] if results else None,
+            "results": results,
+        }
+    )
+
+
+def validar_resultado_ocr(resultado: dict) -> dict:
+    """
+    Confere as leituras do OCR contra a gramática das placas (ver plate_format).
+    Havendo leitura válida (após corrigir trocas como O/0 e B/8), 'placa' passa
+    a ser a melhor delas e 'alternativas', as demais válidas em ordem; o
+    resultado ganha 'valida' e a 'confianca' informada pelo OCR (ou None).
+    """
+    if not settings.OCR_PLATE_VALIDATION:
+        return resultado
+    ranking = ranquear_placas(resultado["results"])
+    if not ranking:
+        return {**resultado, "valida": False, "confianca": None}
+    placa, _, confianca = ranking[0]
+    return {
+        **resultado,
+        "placa": placa,
+        "alternativas": [alternativa for alternativa, _, _ in ranking[1:]],
+        "valida": True,
+        "confianca": confianca,
+    }
+
+
+def resultado_util(resultado: dict) -> bool:
+    return bool(resultado["placa"] or resultado["results"])
+
+
+def resultado_aceitavel(resultado: dict) -> bool:
+    """
+    A cascata pode parar neste resultado: placa válida com confiança de pelo
+    menos OCR_MIN_CONFIDENCE (ou sem confiança informada). Sem validação de
+    formato, basta uma leitura não vazia.
+    """
+    if not settings.OCR_PLATE_VALIDATION:
+        return resultado_util(resultado)
+    if not resultado.get("valida"):
+        return False
+    confianca = resultado.get("confianca")
+    return confianca is None or confianca >= settings.OCR_MIN_CONFIDENCE
+
+
+def melhor_resultado(resultados: List[dict]) -> dict:
+    """
+    Resultado final quando nenhuma tentativa foi aceitável, na ordem de
+    prioridade: a primeira placa válida (mesmo com confiança baixa), senão a
+    primeira leitura não vazia.
+    """
+    for resultado in resultados:
+        if resultado.get("valida"):
+            return resultado
+    for resultado in resultados:
+        if resultado_util(resultado):
+            return resultado
+    return resultado_vazio()
+
+
+async def enviar_ocr(
+    client: httpx.AsyncClient,
+    crop_bytes: bytes,
+    categoria: Optional[str],
+    anpr_api_url: str,
+    timeout: float,
+) -> dict:
+    """Como chamar_ocr, mas repassa as falhas (rede, timeout, 4xx/5xx) a quem chamou."""
+    data = {"categoria": categoria} if categoria else {}
+    resp = await post_with_retry(
+        client,
+        anpr_api_url,
+        files={"file": ("input.jpg", crop_bytes, "image/jpeg")},
+        data=data,
+        timeout=http_timeout(timeout),
+    )
+    resp.raise_for_status()
+    return padronizar_resultado_ocr_bruto(resp.json())
+
+
+async def chamar_ocr(
+    client: httpx.AsyncClient,
+    crop_bytes: bytes,
+    categoria: Optional[str],
+    anpr_api_url: str,
+    timeout: float,
+) -> dict:
+    try:
+        return await enviar_ocr(client, crop_bytes, categoria, anpr_api_url, timeout)
+    except Exception:
+        return resultado_vazio()
+
+
+def montar_tentativas(
+    classe_detectada: Optional[str],
+    ocr_api_url: str,
+    ezocr_api_url: str,
+    ordem: Optional[List[str]] = None,
+) -> List[Tentativa]:
+    """
+    Tentativas da cascata de OCR na ordem de prioridade (por padrão,
+    OCR_CASCADE_ORDER), com o timeout de cada backend. Cada nome é
+    "<backend>:categoria" (usa a classe detectada pelo YOLO) ou "<backend>"
+    (sem categoria), com backend "ezocr" ou "ocr".
+    """
+    backends = {
+        "ezocr": (ezocr_api_url, settings.EZOCR_TIMEOUT_SECONDS),
+        "ocr": (ocr_api_url, settings.OCR_TIMEOUT_SECONDS),
+    }
+    tentativas = []
+    for nome in ordem or settings.OCR_CASCADE_ORDER:
+        backend, _, modo = nome.partition(":")
+        url, timeout = backends[backend]
+        categoria = classe_detectada if modo == "categoria" else None
+        tentativas.append((url, categoria, timeout))
+    return tentativas
+
+
+async def executar_cascata_ocr(
+    chamar: ChamadaOCR,
+    tentativas: List[Tentativa],
+    hedge_delay: float,
+    grace_period: float,
+    registrar: Optional[Callable[[int, dict, float], None]] = None,
+) -> dict:
+    """
+    Executa a cascata de OCR com disparos escalonados (hedging): a tentativa
+    seguinte é disparada após 'hedge_delay' segundos sem resposta aceitável, ou
+    imediatamente quando todas as anteriores já falharam. Com hedge_delay=0,
+    todas as tentativas saem em paralelo. 'chamar' executa uma tentativa
+    (individual ou via micro-batching) e devolve o resultado padronizado.
+
+    O resultado respeita a ordem de prioridade: uma resposta (ver
+    resultado_aceitavel) é aceita assim que todas as tentativas mais
+    prioritárias terminaram sem resultado aceitável. Se uma tentativa menos
+    prioritária já tem resultado aceitável, as mais prioritárias ainda em curso
+    têm até 'grace_period' segundos para responder; depois disso, fica o
+    aceitável mais prioritário disponível (um backend travado não segura a
+    resposta até o próprio timeout). As tentativas restantes são canceladas,
+    interrompendo as requisições em curso. Se nenhuma for aceitável, o retorno
+    é o melhor_resultado entre todas.
+
+    'registrar', se informado, recebe (índice da tentativa, resultado, duração em
+    segundos) de cada tentativa que terminou; as canceladas não são informadas.
+    """
+    pendentes_por_ordem: List[Optional[asyncio.Task]] = [None] * len(tentativas)
+    proximo_disparo = time.monotonic()
+    disparadas = 0
+    # Prazo da espera pelas tentativas mais prioritárias, contado a partir do
+    # primeiro resultado aceitável de uma menos prioritária
+    prazo_reserva: Optional[float] = None
+
+    async def executar(indice: int) -> dict:
+        url, categoria, timeout = tentativas[indice]
+        inicio = time.monotonic()
+        resultado = await chamar(categoria, url, timeout)
+        if registrar is not None:
+            registrar(indice, resultado, time.monotonic() - inicio)
+        return resultado
+
+    def disparar() -> None:
+        nonlocal disparadas, proximo_disparo
+        pendentes_por_ordem[disparadas] = asyncio.create_task(executar(disparadas))
+        disparadas += 1
+        proximo_disparo = time.monotonic() + hedge_delay
+
+    try:
+        while True:
+            # Percorre na ordem de prioridade até a primeira tentativa sem resposta
+            for task in pendentes_por_ordem:
+                if task is None:
+                    # Todas as anteriores falharam: não há por que esperar o atraso
+                    disparar()
+                    break
+                if not task.done():
+                    break
+                resultado = task.result()
+                if resultado_aceitavel(resultado):
+                    return resultado
+            else:
+                # Todas terminaram sem resultado aceitável
+                return melhor_resultado([task.result() for task in pendentes_por_ordem])
+
+            # Aceitável mais prioritário entre as que já responderam depois da
+            # primeira ainda em curso (as não disparadas são menos prioritárias)
+            reserva = next(
+                (
+                    task.result()
+                    for task in pendentes_por_ordem
+                    if task is not None
+                    and task.done()
+                    and resultado_aceitavel(task.result())
+                ),
+                None,
+            )
+            if reserva is not None:
+                if prazo_reserva is None:
+                    prazo_reserva = time.monotonic() + grace_period
+                if time.monotonic() >= prazo_reserva:
+                    return reserva
+            else:
+                while disparadas < len(tentativas) and time.monotonic() >= proximo_disparo:
+                    disparar()
+
+            pendentes = [t for t in pendentes_por_ordem if t is not None and not t.done()]
+            espera = None
+            if reserva is not None:
+                espera = max(0.0, prazo_reserva - time.monotonic())
+            elif disparadas < len(tentativas):
+                espera = max(0.0, proximo_disparo - time.monotonic())
+            if pendentes:
+                await asyncio.wait(
+                    pendentes, timeout=espera, return_when=asyncio.FIRST_COMPLETED
+                )
+    finally:
+        for task in pendentes_por_ordem:
+            if task is not None and not task.done():
+                task.cancel()
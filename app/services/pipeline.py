@@ -0,0 +1,411 @@
+import asyncio
+import base64
+import io
+import json
+import os
+import threading
+from functools import partial
+from typing import Coroutine, List, Optional
+
+import httpx
+from celery.signals import worker_process_init
+from PIL import Image
+
+from app.core.config import settings
+from app.core.metrics import OCR_ATTEMPT_SECONDS, OCR_ATTEMPTS, PLATE_STAGE_SECONDS
+from app.services.batching import MicroBatcher, enviar_lote_ocr, enviar_lote_yolo
+from app.services.blob_store import blob_store
+from app.services.cascade_stats import Observacao, cascade_stats
+from app.services.circuit_breaker import circuit_breaker
+from app.services.http_client import create_http_client, http_timeout, post_with_retry
+from app.services.ocr import (
+    enviar_ocr,
+    executar_cascata_ocr,
+    montar_tentativas,
+    padronizar_resultado_ocr_bruto,
+    resultado_aceitavel,
+    resultado_util,
+    resultado_vazio,
+)
+
+
+def _ler_blob(blob_ref: str) -> bytes:
+    with blob_store.open(blob_ref) as mapped:
+        return bytes(mapped)
+
+
+def _ler_arquivo(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _yolo_form_data() -> dict:
+    """Campos enviados ao YOLO; 'crop_mode' pede o recorte inline ou o bbox."""
+    if settings.YOLO_CROP_MODE in ("inline", "bbox"):
+        return {"crop_mode": settings.YOLO_CROP_MODE}
+    return {}
+
+
+def _recortar_blob(blob_ref: str, bbox: list) -> bytes:
+    """Recorta a região (x1, y1, x2, y2) da imagem original e devolve um JPEG."""
+    with blob_store.open(blob_ref) as mapped:
+        with Image.open(mapped) as image:
+            x1, y1, x2, y2 = (int(round(float(v))) for v in bbox[:4])
+            recorte = image.crop((x1, y1, x2, y2)).convert("RGB")
+    buffer = io.BytesIO()
+    recorte.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def _salvar_resultado(output_dir_for_file: str, file_id: str, raw_result: dict) -> None:
+    os.makedirs(output_dir_for_file, exist_ok=True)
+    with open(
+        os.path.join(output_dir_for_file, f"{file_id}.txt"),
+        "w",
+        encoding="utf-8",
+    ) as f:
+        json.dump(raw_result, f, ensure_ascii=False, indent=2)
+
+
+def _observar_tentativa(nome: str, resultado: dict, duracao: float) -> Observacao:
+    """Publica as métricas de uma tentativa de OCR e a devolve para o CascadeStats."""
+    aceita = resultado_aceitavel(resultado)
+    if aceita:
+        outcome = "accepted"
+    elif resultado_util(resultado):
+        outcome = "invalid"
+    else:
+        outcome = "empty"
+    OCR_ATTEMPTS.labels(nome, outcome).inc()
+    OCR_ATTEMPT_SECONDS.labels(nome).observe(duracao)
+    return nome, aceita, duracao
+
+
+class PlatePipeline:
+    """
+    Pipeline assíncrono YOLO → recorte → OCR. Como quase todo o tempo de uma
+    imagem é espera de rede, um único processo atende várias imagens ao mesmo
+    tempo, até 'max_concurrency'. O cliente HTTP e o semáforo são criados no
+    primeiro uso e ficam presos ao event loop em que foram criados.
+
+    Pode ser usado diretamente num event loop (ex.: na API) com
+    'await plate_pipeline.process(...)', ou de código síncrono pelo PipelineRunner.
+
+    Quando um backend tem endpoint em lote configurado, as chamadas das imagens
+    em processamento simultâneo são agrupadas por um MicroBatcher.
+
+    Toda chamada passa pelo circuit_breaker: réplicas com o circuito aberto são
+    puladas e, sem réplica disponível, a etapa falha na hora em vez de esperar
+    o timeout de um backend fora do ar.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._batchers: dict[str, MicroBatcher] = {}
+
+    def _ensure_started(self) -> None:
+        if self._client is None:
+            self._client = create_http_client()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def reset(self) -> None:
+        """Descarta cliente e semáforo herdados (ex.: após fork), sem fechá-los."""
+        self._client = None
+        self._semaphore = None
+        self._batchers = {}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self.reset()
+
+    @staticmethod
+    def _batch_url(api_url: str) -> str:
+        """Endpoint em lote correspondente a um endpoint individual (ou '')."""
+        return {
+            settings.YOLO_API_URL: settings.YOLO_BATCH_API_URL,
+            settings.EZOCR_API_URL: settings.EZOCR_BATCH_API_URL,
+            settings.OCR_API_URL: settings.OCR_BATCH_API_URL,
+        }.get(api_url, "")
+
+    @staticmethod
+    def _replicas(api_url: str) -> List[str]:
+        """URLs das réplicas do backend, começando pela URL informada."""
+        replicas = {
+            settings.YOLO_API_URL: settings.YOLO_REPLICA_URLS,
+            settings.EZOCR_API_URL: settings.EZOCR_REPLICA_URLS,
+            settings.OCR_API_URL: settings.OCR_REPLICA_URLS,
+        }.get(api_url, [])
+        return [api_url] + [url for url in replicas if url != api_url]
+
+    def _batcher(self, batch_url: str, send_batch) -> MicroBatcher:
+        batcher = self._batchers.get(batch_url)
+        if batcher is None:
+            batcher = MicroBatcher(
+                send_batch,
+                max_size=settings.BATCH_MAX_SIZE,
+                max_wait=settings.BATCH_MAX_WAIT_MS / 1000,
+            )
+            self._batchers[batch_url] = batcher
+        return batcher
+
+    async def _detectar(
+        self, yolo_api_url: str, blob_ref: str, filename: str, content_type: str
+    ) -> dict:
+        """Envia a imagem ao YOLO (individualmente ou em lote) e devolve o JSON."""
+        batch_url = self._batch_url(yolo_api_url)
+        if batch_url:
+            original_bytes = await asyncio.to_thread(_ler_blob, blob_ref)
+            batcher = self._batcher(
+                batch_url,
+                partial(
+                    enviar_lote_yolo,
+                    self._client,
+                    batch_url,
+                    settings.YOLO_TIMEOUT_SECONDS,
+                    settings.YOLO_CROP_MODE,
+                ),
+            )
+            return await circuit_breaker.call(
+                [batch_url],
+                lambda _: batcher.submit((filename, original_bytes, content_type)),
+            )
+
+        return await circuit_breaker.call(
+            self._replicas(yolo_api_url),
+            partial(
+                self._enviar_yolo,
+                blob_ref=blob_ref,
+                filename=filename,
+                content_type=content_type,
+            ),
+        )
+
+    async def _enviar_yolo(
+        self, yolo_api_url: str, blob_ref: str, filename: str, content_type: str
+    ) -> dict:
+        with blob_store.open(blob_ref) as original_image:
+            yolo_resp = await post_with_retry(
+                self._client,
+                yolo_api_url,
+                files={"file": (filename, original_image, content_type)},
+                data=_yolo_form_data(),
+                timeout=http_timeout(settings.YOLO_TIMEOUT_SECONDS),
+            )
+        if yolo_resp.status_code == 404:
+            pass
+        elif not yolo_resp.is_success:
+            yolo_resp.raise_for_status()
+        return yolo_resp.json()
+
+    async def _obter_recorte(
+        self, yolo_json: dict, blob_ref: str, yolo_output_dir: str
+    ) -> bytes:
+        """
+        Obtém o recorte da placa a partir da resposta do YOLO, nesta ordem:
+        1. 'crop_b64': o recorte veio na própria resposta (JPEG em base64);
+        2. 'bbox': coordenadas [x1, y1, x2, y2]; o worker recorta a original;
+        3. 'arquivo'/'file_id': o recorte está no volume compartilhado.
+        """
+        if yolo_json.get("crop_b64"):
+            return base64.b64decode(yolo_json["crop_b64"])
+
+        if yolo_json.get("bbox"):
+            return await asyncio.to_thread(_recortar_blob, blob_ref, yolo_json["bbox"])
+
+        crop_path = None
+        if "arquivo" in yolo_json:
+            crop_path = yolo_json["arquivo"]
+        elif "file_id" in yolo_json:
+            crop_path = os.path.join(
+                yolo_output_dir,
+                yolo_json["file_id"],
+                f"{yolo_json['file_id']}.jpg",
+            )
+
+        if not crop_path:
+            raise ValueError("Resposta do YOLO não continha recorte nem caminho válido.")
+
+        if not os.path.exists(crop_path):
+            raise FileNotFoundError(f"Imagem recortada não encontrada: {crop_path}")
+
+        return await asyncio.to_thread(_ler_arquivo, crop_path)
+
+    async def _chamar_ocr(
+        self, crop_bytes: bytes, categoria: Optional[str], url: str, timeout: float
+    ) -> dict:
+        """
+        Executa uma tentativa de OCR, em lote se o backend tiver endpoint de lote.
+        Falhas (inclusive circuito aberto) viram resultado vazio, e a cascata
+        segue para a próxima tentativa.
+        """
+        batch_url = self._batch_url(url)
+        try:
+            if not batch_url:
+                return await circuit_breaker.call(
+                    self._replicas(url),
+                    lambda replica: enviar_ocr(
+                        self._client, crop_bytes, categoria, replica, timeout
+                    ),
+                )
+            batcher = self._batcher(
+                batch_url, partial(enviar_lote_ocr, self._client, batch_url, timeout)
+            )
+            return padronizar_resultado_ocr_bruto(
+                await circuit_breaker.call(
+                    [batch_url], lambda _: batcher.submit((crop_bytes, categoria))
+                )
+            )
+        except Exception:
+            return resultado_vazio()
+
+    async def process(
+        self,
+        blob_ref: str,
+        filename: str,
+        content_type: str,
+        yolo_api_url: str,
+        ocr_api_url: str,
+        ezocr_api_url: str,
+        yolo_output_dir: str,
+    ) -> dict:
+        """
+        Processa a imagem referenciada por blob_ref:
+        1. Detecta placa com YOLO
+        2. Tenta OCR com ezOCR e OCR
+        3. Retorna dict serializável com resultados
+        """
+        self._ensure_started()
+        async with self._semaphore:
+            return await self._process(
+                blob_ref,
+                filename,
+                content_type,
+                yolo_api_url,
+                ocr_api_url,
+                ezocr_api_url,
+                yolo_output_dir,
+            )
+
+    async def _process(
+        self,
+        blob_ref: str,
+        filename: str,
+        content_type: str,
+        yolo_api_url: str,
+        ocr_api_url: str,
+        ezocr_api_url: str,
+        yolo_output_dir: str,
+    ) -> dict:
+        file_id = None
+        classe_detectada = None
+        crop_bytes = None
+
+        # === Etapa 1: Envia imagem ao YOLO ===
+        try:
+            with PLATE_STAGE_SECONDS.labels("yolo").time():
+                yolo_json = await self._detectar(
+                    yolo_api_url, blob_ref, filename, content_type
+                )
+
+            file_id = yolo_json.get("file_id")
+            classe_detectada = yolo_json.get("classe")
+
+            with PLATE_STAGE_SECONDS.labels("crop").time():
+                crop_bytes = await self._obter_recorte(
+                    yolo_json, blob_ref, yolo_output_dir
+                )
+
+        except Exception as e:
+            return {"error": f"Erro no YOLO: {str(e)}"}
+
+        # === Etapa 2: Tentativas OCR (disparos escalonados, ordem de prioridade) ===
+        # A ordem é escolhida por classe a partir do histórico de acertos
+        ordem = await cascade_stats.ordem(classe_detectada)
+        tentativas = montar_tentativas(
+            classe_detectada, ocr_api_url, ezocr_api_url, ordem
+        )
+        observacoes = []
+        with PLATE_STAGE_SECONDS.labels("ocr").time():
+            raw_result = await executar_cascata_ocr(
+                partial(self._chamar_ocr, crop_bytes),
+                tentativas,
+                settings.OCR_HEDGE_DELAY_SECONDS,
+                settings.OCR_CASCADE_GRACE_SECONDS,
+                registrar=lambda indice, resultado, duracao: observacoes.append(
+                    _observar_tentativa(ordem[indice], resultado, duracao)
+                ),
+            )
+        await cascade_stats.record(classe_detectada, observacoes)
+
+        if not raw_result["placa"] and not raw_result["results"]:
+            return {"placa": None, "results": []}
+
+        # === Etapa 3: Salvar resultado em disco (opcional) ===
+        try:
+            if file_id and raw_result["placa"]:
+                with PLATE_STAGE_SECONDS.labels("result_write").time():
+                    await asyncio.to_thread(
+                        _salvar_resultado,
+                        os.path.join(yolo_output_dir, file_id),
+                        file_id,
+                        raw_result,
+                    )
+        except Exception as e:
+            print(f"ATENÇÃO: Erro ao salvar resultado em disco para {file_id}: {str(e)}")
+
+        return raw_result
+
+
+class PipelineRunner:
+    """
+    Executa corrotinas do pipeline num event loop dedicado, rodando numa thread
+    própria do processo. Chamadas síncronas (ex.: tasks do Celery com
+    '--pool threads') submetem o trabalho a esse loop e aguardam o resultado,
+    de modo que as várias threads do worker compartilham o mesmo loop, o mesmo
+    pool de conexões e o mesmo limite de concorrência.
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="plate-pipeline-loop",
+                    daemon=True,
+                )
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro: Coroutine):
+        """Executa a corrotina no loop do pipeline e bloqueia até o resultado."""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def reset(self) -> None:
+        """Descarta o loop herdado (ex.: após fork, onde a thread não existe mais)."""
+        with self._lock:
+            self._loop = None
+            self._thread = None
+
+
+plate_pipeline = PlatePipeline(max_concurrency=settings.PIPELINE_MAX_CONCURRENCY)
+pipeline_runner = PipelineRunner()
+
+
+@worker_process_init.connect
+def reset_pipeline_after_fork(**kwargs) -> None:
+    """
+    Cada processo do worker cria seu próprio loop e cliente HTTP: conexões e
+    threads não sobrevivem ao fork do processo pai.
+    """
+    pipeline_runner.reset()
+    plate_pipeline.reset()
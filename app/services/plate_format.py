@@ -0,0 +1,110 @@
+import re
+from typing import Iterator, List, Optional, Tuple
+
+# Gramática das placas brasileiras: modelo antigo LLL9999 e Mercosul LLL9L99.
+# As duas só diferem na quinta posição (dígito no antigo, letra no Mercosul).
+PADRAO_PLACA = re.compile(r"^[A-Z]{3}[0-9][A-Z0-9][0-9]{2}$")
+
+# Posições da placa: L = letra, 9 = dígito, * = letra ou dígito
+POSICOES = "LLL9*99"
+
+# Trocas comuns do OCR entre letras e dígitos parecidos
+LETRA_PARA_DIGITO = {
+    "O": "0",
+    "Q": "0",
+    "D": "0",
+    "U": "0",
+    "I": "1",
+    "L": "1",
+    "J": "1",
+    "Z": "2",
+    "A": "4",
+    "S": "5",
+    "G": "6",
+    "T": "7",
+    "B": "8",
+}
+DIGITO_PARA_LETRA = {
+    "0": "O",
+    "1": "I",
+    "2": "Z",
+    "4": "A",
+    "5": "S",
+    "6": "G",
+    "7": "T",
+    "8": "B",
+}
+
+# Campos em que os backends de OCR costumam informar a confiança da leitura
+CAMPOS_CONFIANCA = ("confidence", "score", "conf")
+
+
+def normalizar_placa(texto: Optional[str]) -> str:
+    """Maiúsculas, sem hífen, espaços ou outros separadores."""
+    return re.sub(r"[^A-Z0-9]", "", (texto or "").upper())
+
+
+def corrigir_placa(texto: Optional[str]) -> Tuple[Optional[str], int]:
+    """
+    Ajusta a leitura à gramática da placa, trocando letras e dígitos confundidos
+    pelo OCR (O/0, I/1, B/8...) nas posições onde o tipo está errado. Devolve a
+    placa corrigida e o número de trocas, ou (None, 0) se não houver correção.
+    """
+    placa = normalizar_placa(texto)
+    if len(placa) != len(POSICOES):
+        return None, 0
+    corrigida = []
+    trocas = 0
+    for char, posicao in zip(placa, POSICOES):
+        if posicao == "L" and char.isdigit():
+            char = DIGITO_PARA_LETRA.get(char)
+            trocas += 1
+        elif posicao == "9" and char.isalpha():
+            char = LETRA_PARA_DIGITO.get(char)
+            trocas += 1
+        if char is None:
+            return None, 0
+        corrigida.append(char)
+    placa = "".join(corrigida)
+    if not PADRAO_PLACA.match(placa):
+        return None, 0
+    return placa, trocas
+
+
+def _confianca(item: dict) -> Optional[float]:
+    """Confiança informada pelo OCR, normalizada para 0..1 (None se ausente)."""
+    for campo in CAMPOS_CONFIANCA:
+        valor = item.get(campo)
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            return valor / 100 if valor > 1 else float(valor)
+    return None
+
+
+def _leituras(results: List[dict]) -> Iterator[Tuple[str, Optional[float]]]:
+    """Leituras do OCR na ordem original: a placa de cada resultado e seus candidatos."""
+    for result in results:
+        if result.get("plate"):
+            yield result["plate"], _confianca(result)
+        for candidato in result.get("candidates") or []:
+            if candidato.get("plate"):
+                yield candidato["plate"], _confianca(candidato)
+
+
+def ranquear_placas(results: List[dict]) -> List[Tuple[str, int, Optional[float]]]:
+    """
+    Placas válidas (já corrigidas) entre todas as leituras do OCR, sem
+    repetição, como (placa, trocas, confiança). Ordem: menos trocas, maior
+    confiança e, no empate, a ordem original do OCR.
+    """
+    melhores: dict[str, Tuple[int, Optional[float], int]] = {}
+    for ordem, (texto, confianca) in enumerate(_leituras(results)):
+        placa, trocas = corrigir_placa(texto)
+        if placa is None:
+            continue
+        atual = melhores.get(placa)
+        if atual is None or (trocas, -(confianca or 0)) < (atual[0], -(atual[1] or 0)):
+            melhores[placa] = (trocas, confianca, ordem if atual is None else atual[2])
+    ranking = sorted(
+        melhores.items(), key=lambda item: (item[1][0], -(item[1][1] or 0), item[1][2])
+    )
+    return [(placa, trocas, confianca) for placa, (trocas, confianca, _) in ranking]
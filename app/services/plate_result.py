@@ -0,0 +1,37 @@
+from typing import List, Optional, Tuple
+
+
+def summarize_plate_result(result: Optional[dict]) -> Tuple[Optional[str], List[str]]:
+    """
+    Extrai do resultado bruto da task a placa principal e as alternativas
+    (candidatos do primeiro resultado de OCR diferentes da placa principal).
+    Se o resultado já traz 'alternativas' (leituras validadas e ranqueadas, ver
+    validar_resultado_ocr, ou resultado resumido por trim_plate_result), elas
+    são usadas diretamente.
+    """
+    placa = None
+    alternativas = []
+    if result and "alternativas" in result:
+        return result.get("placa"), list(result["alternativas"] or [])
+    if result:
+        placa = result.get("placa")
+        if result.get("results") and len(result["results"]) > 0:
+            top_result = result["results"][0]
+            alternativas = [
+                c.get("plate")
+                for c in top_result.get("candidates", [])
+                if c.get("plate") and c.get("plate") != placa
+            ]
+    return placa, alternativas
+
+
+def trim_plate_result(result: dict) -> dict:
+    """
+    Reduz o resultado bruto ao que as consultas de status usam: placa,
+    alternativas e, se houver, a mensagem de erro.
+    """
+    placa, alternativas = summarize_plate_result(result)
+    trimmed = {"placa": placa, "alternativas": alternativas}
+    if "error" in result:
+        trimmed["error"] = result["error"]
+    return trimmed
@@ -1,7 +1,79 @@
-from fastapi import UploadFile
-from app.schemas.plate import TaskStatusInit
+import itertools
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from uuid import uuid4
+from celery import group
+from celery.result import GroupResult
+from fastapi import UploadFile, HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from app.schemas.plate import (
+    BatchItemStatus,
+    BatchSubmissionResponse,
+    TaskStatusInit,
+    TaskStatusResponse,
+)
+from app.celery_app import celery, plate_queue
+from app.schemas.api_key import ApiKeyInDB
+from app.services.admission import admission_controller
 from app.services.task import process_plate_image_task
+from app.services.task_status import record_task_owner
+from app.services.blob_store import blob_store, BlobTooLargeError
+from app.services.notifications import task_notifier
+from app.services.result_cache import plate_result_cache
 from app.core.config import settings
+from app.core.metrics import PLATE_STAGE_SECONDS, RESULT_CACHE_LOOKUPS
+
+# Bytes iniciais suficientes para reconhecer a assinatura dos formatos aceitos
+IMAGE_HEADER_BYTES = 16
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Identifica o formato da imagem pelos bytes iniciais (magic bytes)."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+
+# Imagem de um lote já gravada no blob_store: (posição, nome, referência, content type)
+StagedImage = Tuple[int, str, str, str]
+
+
+def iter_archive(fileobj: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Percorre os arquivos de um zip ou tar (com ou sem compressão), devolvendo
+    (nome, arquivo) de cada membro. O tar é lido em streaming, sem índice.
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+
+    fileobj.seek(0)
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, archive.extractfile(info)
+    except tarfile.TarError:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail="Arquivo compactado inválido: envie um zip ou tar.",
+        )
 
 
 class PlateService:
@@ -11,20 +83,345 @@ class PlateService:
         self.EZOCR_API_URL = settings.EZOCR_API_URL
         self.YOLO_OUTPUT_DIR = settings.YOLO_OUTPUT_DIR
 
-    async def process_plate_image(self, file: UploadFile) -> TaskStatusInit:
-        original_bytes = await file.read()
+    async def stage(self, file: UploadFile) -> Tuple[str, str]:
+        # A imagem é copiada em blocos para o armazenamento compartilhado (o broker
+        # leva só a referência), sem nunca ser carregada inteira em memória.
+        # A referência é o hash do conteúdo e também indexa o cache de resultados.
+        # O content type vem dos magic bytes, não do cabeçalho enviado pelo cliente.
+        return await run_in_threadpool(self.stage_upload, file.file)
+
+    async def process_plate_image(
+        self,
+        blob_ref: str,
+        filename: str,
+        content_type: str,
+        api_key: ApiKeyInDB | None = None,
+        callback_url: str | None = None,
+    ) -> TaskStatusInit | TaskStatusResponse:
+        """
+        Enfileira a imagem já gravada por stage(). Se a chave reservou uma vaga no
+        controle de admissão, ela é devolvida quando nenhuma task nova é criada.
+        """
+        task_id = str(uuid4())
+        api_key_id = api_key.id if api_key is not None else None
+        held = 1  # vagas de admissão ainda reservadas por esta chamada
+        claimed: List[str] = []  # imagens registradas como em curso por esta chamada
+        try:
+            if settings.RESULT_CACHE_ENABLED:
+                # Imagem já processada: devolve o resultado sem rodar YOLO/OCR de novo
+                cached = await plate_result_cache.get(api_key_id, blob_ref)
+                if cached:
+                    RESULT_CACHE_LOOKUPS.labels("hit").inc()
+                    held = 0
+                    await self._release_admission(api_key, 1)
+                    return TaskStatusResponse(
+                        task_id=cached["task_id"],
+                        status="success",
+                        placa=cached["placa"],
+                        alternativas=cached["alternativas"],
+                    )
+
+                # Imagem idêntica já em processamento: reaproveita a mesma task
+                existing_task_id = await plate_result_cache.claim(
+                    api_key_id, blob_ref, task_id
+                )
+                if existing_task_id:
+                    RESULT_CACHE_LOOKUPS.labels("inflight").inc()
+                    held = 0
+                    await self._release_admission(api_key, 1)
+                    await self._subscribe([existing_task_id], api_key, callback_url)
+                    return TaskStatusInit(task_id=existing_task_id, status="processing")
+                claimed.append(blob_ref)
+                RESULT_CACHE_LOOKUPS.labels("miss").inc()
+
+            # A inscrição vem antes do enfileiramento para não perder uma task rápida
+            await self._subscribe([task_id], api_key, callback_url)
+            await self._record_owner([task_id], api_key)
+            task = self._enqueue(
+                blob_ref,
+                filename,
+                content_type,
+                task_id=task_id,
+                api_key=api_key,
+            )
+        except Exception:
+            await self._rollback(api_key, held, claimed)
+            raise
+
+        return TaskStatusInit(
+            task_id=task.id,
+            status="processing",
+        )
+
+    async def _release_admission(self, api_key: ApiKeyInDB | None, amount: int) -> None:
+        if api_key is not None:
+            await admission_controller.release(api_key.id, amount)
+
+    async def _rollback(
+        self, api_key: ApiKeyInDB | None, held: int, claimed: List[str]
+    ) -> None:
+        """
+        Desfaz o que uma submissão que falhou deixou reservado: os registros de
+        task em curso feitos por ela e as vagas de admissão ainda não devolvidas.
+        Falhas aqui só são registradas, para não encobrir o erro original; o que
+        ficar para trás expira pelo TTL.
+        """
+        try:
+            await plate_result_cache.release_many(
+                api_key.id if api_key is not None else None, claimed
+            )
+        except Exception as e:
+            print(f"ATENÇÃO: Falha ao liberar imagens em curso: {str(e)}")
+        try:
+            await self._release_admission(api_key, held)
+        except Exception as e:
+            print(f"ATENÇÃO: Falha ao devolver {held} vagas de admissão: {str(e)}")
+
+    async def _subscribe(
+        self,
+        task_ids: List[str],
+        api_key: ApiKeyInDB | None,
+        callback_url: str | None,
+        group_id: str | None = None,
+    ) -> None:
+        """Inscreve a chave nos avisos de conclusão (SSE e webhook) das tasks."""
+        if not settings.NOTIFY_ENABLED or api_key is None:
+            return
+        await task_notifier.subscribe_many(task_ids, api_key.id, callback_url, group_id)
 
-        task = process_plate_image_task.delay(
-            original_bytes,
-            file.filename,
-            file.content_type,
+    async def _record_owner(self, task_ids: List[str], api_key: ApiKeyInDB | None) -> None:
+        """Registra a chave como dona das tasks, a única que pode consultar o status."""
+        if api_key is not None:
+            await record_task_owner(api_key.id, task_ids)
+
+    async def process_plate_batch(
+        self,
+        staged: List[StagedImage],
+        rejected: List[BatchItemStatus],
+        api_key: ApiKeyInDB | None = None,
+        callback_url: str | None = None,
+    ) -> BatchSubmissionResponse:
+        """
+        Enfileira um lote de imagens já gravadas (ver stage_batch) como um único
+        grupo Celery. As consultas e reservas no cache de resultados são feitas
+        em lote; imagens já processadas ou em processamento não geram task nova.
+        Os avisos de conclusão das tasks do lote levam o group_id. Das vagas
+        reservadas no controle de admissão (uma por imagem aceita), são devolvidas
+        as que não viraram task.
+        """
+        items = list(rejected)
+        api_key_id = api_key.id if api_key is not None else None
+        to_enqueue: List[Tuple[StagedImage, str]] = []
+        reused_task_ids: List[str] = []
+        held = len(staged)  # vagas de admissão ainda reservadas por esta chamada
+        claimed: List[str] = []  # imagens registradas como em curso por esta chamada
+
+        try:
+            if settings.RESULT_CACHE_ENABLED:
+                refs = [blob_ref for _, _, blob_ref, _ in staged]
+                cached_results = await plate_result_cache.get_many(api_key_id, refs)
+                pending = []
+                for image, cached in zip(staged, cached_results):
+                    index, filename = image[0], image[1]
+                    if cached:
+                        items.append(
+                            BatchItemStatus(
+                                index=index,
+                                filename=filename,
+                                task_id=cached["task_id"],
+                                status="success",
+                                placa=cached["placa"],
+                                alternativas=cached["alternativas"],
+                            )
+                        )
+                    else:
+                        pending.append((image, str(uuid4())))
+                existing = await plate_result_cache.claim_many(
+                    api_key_id, [(image[2], task_id) for image, task_id in pending]
+                )
+                for (image, task_id), existing_task_id in zip(pending, existing):
+                    if existing_task_id:
+                        reused_task_ids.append(existing_task_id)
+                        items.append(
+                            BatchItemStatus(
+                                index=image[0],
+                                filename=image[1],
+                                task_id=existing_task_id,
+                                status="processing",
+                            )
+                        )
+                    else:
+                        to_enqueue.append((image, task_id))
+                        claimed.append(image[2])
+                RESULT_CACHE_LOOKUPS.labels("hit").inc(len(staged) - len(pending))
+                RESULT_CACHE_LOOKUPS.labels("inflight").inc(len(reused_task_ids))
+                RESULT_CACHE_LOOKUPS.labels("miss").inc(len(to_enqueue))
+            else:
+                to_enqueue = [(image, str(uuid4())) for image in staged]
+
+            unused = held - len(to_enqueue)
+            held = len(to_enqueue)
+            await self._release_admission(api_key, unused)
+
+            group_id = None
+            if to_enqueue or reused_task_ids:
+                group_id = str(uuid4())
+                await self._subscribe(
+                    [task_id for _, task_id in to_enqueue] + reused_task_ids,
+                    api_key,
+                    callback_url,
+                    group_id,
+                )
+            if to_enqueue:
+                await self._record_owner([task_id for _, task_id in to_enqueue], api_key)
+                self._enqueue_group(group_id, to_enqueue, api_key)
+        except Exception:
+            await self._rollback(api_key, held, claimed)
+            raise
+
+        items.extend(
+            BatchItemStatus(
+                index=image[0],
+                filename=image[1],
+                task_id=task_id,
+                status="processing",
+            )
+            for image, task_id in to_enqueue
+        )
+        if group_id:
+            self._save_group(group_id, [task_id for _, task_id in to_enqueue] + reused_task_ids)
+
+        items.sort(key=lambda item: item.index)
+        return BatchSubmissionResponse(
+            group_id=group_id,
+            total=len(items),
+            accepted=len(staged),
+            items=items,
+        )
+
+    def _enqueue_group(
+        self,
+        group_id: str,
+        to_enqueue: List[Tuple[StagedImage, str]],
+        api_key: ApiKeyInDB | None = None,
+    ) -> None:
+        """Publica as tasks novas do lote como um grupo."""
+        signatures = [
+            process_plate_image_task.signature(
+                args=self._task_args(blob_ref, filename, content_type),
+                **self._task_options(api_key),
+                task_id=task_id,
+            )
+            for (_, filename, blob_ref, content_type), task_id in to_enqueue
+        ]
+        # Em um grupo, o task_id informado vira o id do grupo
+        with PLATE_STAGE_SECONDS.labels("enqueue").time():
+            group(signatures).apply_async(task_id=group_id)
+
+    def _save_group(self, group_id: str, task_ids: List[str]) -> None:
+        """
+        Salva no backend o grupo com todas as tasks do lote, novas e
+        reaproveitadas, para que o group_id devolvido sempre possa ser
+        consultado (GroupResult.restore), mesmo sem nenhuma task nova.
+        """
+        try:
+            GroupResult(
+                group_id, [celery.AsyncResult(task_id) for task_id in task_ids]
+            ).save(backend=celery.backend)
+        except Exception as e:
+            print(f"ATENÇÃO: Erro ao salvar o grupo {group_id}: {str(e)}")
+
+    def _enqueue(
+        self,
+        blob_ref: str,
+        filename: str,
+        content_type: str,
+        task_id: str | None = None,
+        api_key: ApiKeyInDB | None = None,
+    ):
+        with PLATE_STAGE_SECONDS.labels("enqueue").time():
+            return process_plate_image_task.apply_async(
+                args=self._task_args(blob_ref, filename, content_type),
+                **self._task_options(api_key),
+                task_id=task_id,
+            )
+
+    def _task_args(self, blob_ref: str, filename: str, content_type: str) -> tuple:
+        return (
+            blob_ref,
+            filename,
+            content_type,
             self.YOLO_API_URL,
             self.OCR_API_URL,
             self.EZOCR_API_URL,
             self.YOLO_OUTPUT_DIR,
         )
 
-        return TaskStatusInit(
-            task_id=task.id,
-            status="processing",
-        )
+    def _task_options(self, api_key: ApiKeyInDB | None) -> dict:
+        """
+        Fila do tier da chave e o ID da chave, usado pelo worker para limitar
+        quantas tasks de uma mesma chave executam ao mesmo tempo.
+        """
+        if api_key is None:
+            return {"queue": plate_queue(None)}
+        return {
+            "queue": plate_queue(api_key.tier),
+            "kwargs": {"api_key_id": api_key.id},
+        }
+
+    def stage_upload(self, fileobj: BinaryIO) -> Tuple[str, str]:
+        """
+        Valida a assinatura da imagem e grava o envio no blob_store, recusando-o
+        se passar de MAX_UPLOAD_BYTES. Retorna a referência (SHA-256) do conteúdo
+        e o content type identificado pelos magic bytes.
+        """
+        with PLATE_STAGE_SECONDS.labels("upload").time():
+            head = fileobj.read(IMAGE_HEADER_BYTES)
+            content_type = sniff_image_type(head)
+            if not content_type:
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST,
+                    detail="Arquivo enviado não é uma imagem válida.",
+                )
+            try:
+                blob_ref = blob_store.put_stream(
+                    fileobj, settings.MAX_UPLOAD_BYTES, head=head
+                )
+            except BlobTooLargeError:
+                raise HTTPException(
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Arquivo enviado excede o tamanho máximo permitido.",
+                )
+            return blob_ref, content_type
+
+    def stage_batch(
+        self, files: List[UploadFile], archive: Optional[UploadFile]
+    ) -> Tuple[List[StagedImage], List[BatchItemStatus]]:
+        """
+        Grava no blob_store as imagens de um lote (arquivos do multipart e/ou
+        membros de um zip/tar). Itens inválidos não derrubam o lote: voltam como
+        rejeitados, com o motivo, e não são cobrados.
+        """
+        entries = ((f.filename, f.file) for f in files)
+        if archive is not None:
+            entries = itertools.chain(entries, iter_archive(archive.file))
+
+        staged: List[StagedImage] = []
+        rejected: List[BatchItemStatus] = []
+        for index, (filename, fileobj) in enumerate(entries):
+            if index >= settings.BULK_MAX_ITEMS:
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST,
+                    detail=f"O lote excede o máximo de {settings.BULK_MAX_ITEMS} imagens.",
+                )
+            try:
+                blob_ref, content_type = self.stage_upload(fileobj)
+            except HTTPException as e:
+                rejected.append(
+                    BatchItemStatus(
+                        index=index, filename=filename, status="rejected", detail=e.detail
+                    )
+                )
+                continue
+            staged.append((index, filename, blob_ref, content_type))
+        return staged, rejected
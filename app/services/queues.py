@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import math
+import time
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.celery_app import plate_queue
+from app.core.config import settings
+from app.core.redis_client import get_async_broker_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+TENANT_IN_FLIGHT_KEY = "plate:tenant:{api_key_id}:inflight"
+
+# Tasks da chave em execução: conjunto ordenado com o task_id de cada uma e o
+# momento em que pegou a vaga. Tokens mais antigos que ARGV[2] segundos (worker
+# morto sem devolver a vaga) são descartados antes de contar. Uma task que já
+# tem a vaga (ex.: mensagem reentregue) a mantém.
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local ttl = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+if not redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+        return 0
+    end
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('EXPIRE', KEYS[1], ttl)
+return 1
+"""
+
+
+async def queue_depths() -> dict[str, int]:
+    """
+    Mensagens aguardando em cada fila de placa, por tier (LLEN no broker Redis).
+    Não inclui as mensagens já reservadas pelos workers.
+    """
+    pipe = get_async_broker_redis().pipeline(transaction=False)
+    for tier in settings.PLATE_QUEUE_TIERS:
+        pipe.llen(plate_queue(tier))
+    depths = await pipe.execute()
+    return dict(zip(settings.PLATE_QUEUE_TIERS, depths))
+
+
+class QueueDepthCollector(Collector):
+    """
+    Publica o tamanho das filas de placa (gauge 'plate_queue_depth', por tier).
+    O broker é consultado por run(), uma tarefa de fundo do event loop da API, a
+    cada 'refresh_seconds'; a coleta só lê o último valor obtido, sem I/O, pois
+    o /metrics (make_asgi_app) chama collect dentro do event loop. Se o broker
+    não responder por mais de três intervalos, a métrica é omitida sem derrubar
+    o resto da coleta.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._depths: dict[str, int] | None = None
+        self._updated_at = -math.inf
+
+    @staticmethod
+    def _gauge() -> GaugeMetricFamily:
+        return GaugeMetricFamily(
+            "plate_queue_depth",
+            "Mensagens aguardando nas filas de placa.",
+            labels=["tier", "queue"],
+        )
+
+    async def refresh(self) -> None:
+        try:
+            self._depths = await queue_depths()
+            self._updated_at = time.monotonic()
+        except Exception:
+            logger.warning("Tamanho das filas indisponível para as métricas.", exc_info=True)
+
+    async def run(self) -> None:
+        """Atualiza o tamanho das filas periodicamente, até ser cancelada."""
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_seconds)
+
+    def describe(self):
+        # Evita que o registro chame collect só para conhecer os nomes
+        yield self._gauge()
+
+    def collect(self):
+        depths = self._depths
+        if depths is None or time.monotonic() - self._updated_at > 3 * self.refresh_seconds:
+            return
+        gauge = self._gauge()
+        for tier, depth in depths.items():
+            gauge.add_metric([tier, plate_queue(tier)], depth)
+        yield gauge
+
+
+class TenantInFlightLimiter:
+    """
+    Limita quantas tasks de uma mesma chave de API executam ao mesmo tempo em
+    todos os workers, para que uma chave com um grande acúmulo não ocupe todos
+    os workers do seu tier. A task que não consegue vaga é republicada sem
+    atraso, indo para o fim da fila, atrás das tasks das outras chaves (ver
+    process_plate_image_task).
+
+    Cada vaga é um token com o task_id e o horário em que foi obtida; tokens com
+    mais de 'ttl_seconds' são descartados, de modo que vagas de um worker morto
+    (SIGKILL, OOM, limite de tempo) voltam a ficar livres.
+    """
+
+    def __init__(self, max_in_flight: int, ttl_seconds: int):
+        self.max_in_flight = max_in_flight
+        self.ttl_seconds = ttl_seconds
+
+    def acquire(self, api_key_id: int, task_id: str) -> bool:
+        if self.max_in_flight <= 0:
+            return True
+        return bool(
+            get_redis().eval(
+                ACQUIRE_SCRIPT,
+                1,
+                TENANT_IN_FLIGHT_KEY.format(api_key_id=api_key_id),
+                self.max_in_flight,
+                self.ttl_seconds,
+                task_id,
+            )
+        )
+
+    def release(self, api_key_id: int, task_id: str) -> None:
+        if self.max_in_flight <= 0:
+            return
+        get_redis().zrem(TENANT_IN_FLIGHT_KEY.format(api_key_id=api_key_id), task_id)
+
+
+tenant_limiter = TenantInFlightLimiter(
+    max_in_flight=settings.TENANT_MAX_IN_FLIGHT,
+    ttl_seconds=settings.TENANT_IN_FLIGHT_TTL_SECONDS,
+)
+
+# Registrado no /metrics da API (ver app/main.py), que também inicia run()
+queue_depth_collector = QueueDepthCollector(
+    refresh_seconds=settings.QUEUE_DEPTH_METRICS_INTERVAL_SECONDS
+)
@@ -0,0 +1,123 @@
+import logging
+
+from app.celery_app import celery
+from app.core.config import settings
+from app.core.redis_client import get_async_redis, get_redis
+from app.crud.api_key import add_api_key_calls
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "quota:pending"
+
+# Semeia o contador com o calls_made do banco na primeira vez, confere a quota e
+# incrementa; o incremento também vai para o hash de pendentes a sincronizar.
+CHARGE_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]))
+if not used then
+    used = tonumber(ARGV[1])
+end
+local amount = tonumber(ARGV[3])
+if used + amount > tonumber(ARGV[2]) then
+    return -1
+end
+used = used + amount
+redis.call('SET', KEYS[1], used, 'EX', tonumber(ARGV[4]))
+redis.call('HINCRBY', KEYS[2], ARGV[5], amount)
+return used
+"""
+
+# Devolve chamadas cobradas: desconta do contador (se ainda existir, sem ficar
+# negativo) e registra o desconto nos pendentes, para que chegue ao banco.
+REFUND_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]))
+local amount = tonumber(ARGV[1])
+if used then
+    redis.call('DECRBY', KEYS[1], math.min(used, amount))
+end
+redis.call('HINCRBY', KEYS[2], ARGV[2], -amount)
+return 1
+"""
+
+# Lê e zera os pendentes numa única operação, para que duas sincronizações
+# concorrentes (várias réplicas do beat) não gravem o mesmo incremento duas vezes.
+DRAIN_SCRIPT = """
+local pending = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return pending
+"""
+
+
+class RedisQuotaCounter:
+    """
+    Contador de quota total por chave de API no Redis, compartilhado por todas as
+    réplicas. O caminho da requisição só fala com o Redis; os incrementos são
+    acumulados em 'quota:pending' e gravados no Postgres pela task periódica
+    sync_quota_counters_task.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _used_key(api_key_id: int) -> str:
+        return f"quota:{api_key_id}:used"
+
+    async def try_charge(
+        self, api_key_id: int, calls_made: int, call_limit: int, amount: int = 1
+    ) -> int | None:
+        """
+        Reserva 'amount' chamadas se couberem na quota.
+        Retorna o total de chamadas usadas, ou None se o limite foi excedido.
+        """
+        used = await get_async_redis().eval(
+            CHARGE_SCRIPT,
+            2,
+            self._used_key(api_key_id),
+            PENDING_KEY,
+            calls_made,
+            call_limit,
+            amount,
+            self.ttl_seconds,
+            api_key_id,
+        )
+        return None if used < 0 else used
+
+    async def refund(self, api_key_id: int, amount: int = 1) -> None:
+        """Devolve 'amount' chamadas reservadas por try_charge."""
+        await get_async_redis().eval(
+            REFUND_SCRIPT, 2, self._used_key(api_key_id), PENDING_KEY, amount, api_key_id
+        )
+
+    def sync(self) -> dict[int, int]:
+        """Grava no Postgres os incrementos pendentes e retorna o que foi gravado."""
+        client = get_redis()
+        raw = client.eval(DRAIN_SCRIPT, 1, PENDING_KEY)
+        batch = {int(raw[i]): int(raw[i + 1]) for i in range(0, len(raw), 2)}
+        if not batch:
+            return batch
+        db = SessionLocal()
+        try:
+            add_api_key_calls(db, batch)
+        except Exception:
+            logger.exception("Erro ao sincronizar quotas; devolvendo pendentes ao Redis.")
+            pipe = client.pipeline()
+            for api_key_id, amount in batch.items():
+                pipe.hincrby(PENDING_KEY, api_key_id, amount)
+            pipe.execute()
+            raise
+        finally:
+            db.close()
+        return batch
+
+
+# O TTL do contador precisa ser bem maior que o intervalo de sincronização:
+# ao expirar, ele é semeado de novo a partir do banco.
+redis_quota_counter = RedisQuotaCounter(ttl_seconds=settings.QUOTA_COUNTER_TTL_SECONDS)
+
+
+@celery.task(name="quota.sync_quota_counters_task")
+def sync_quota_counters_task() -> dict:
+    """Task periódica que sincroniza os contadores de quota do Redis com o Postgres."""
+    synced = redis_quota_counter.sync()
+    return {"keys": len(synced), "calls": sum(synced.values())}
@@ -0,0 +1,140 @@
+import json
+import time
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis, get_redis
+
+# As entradas são "<api_key_id>:<ref>": cada chave de API só enxerga os próprios
+# resultados e tasks em curso (ver PlateResultCache)
+RESULT_KEY = "plate:result:{entry}"
+INFLIGHT_KEY = "plate:inflight:{entry}"
+# Conjunto ordenado (score = momento da gravação) usado para limitar o tamanho
+INDEX_KEY = "plate:result:index"
+
+
+def _entry(api_key_id: int | None, ref: str) -> str:
+    """Identificador da imagem no escopo da chave (sem chave: escopo '-')."""
+    return f"{'-' if api_key_id is None else api_key_id}:{ref}"
+
+
+class PlateResultCache:
+    """
+    Cache de resultados no Redis indexado pela chave de API e pelo hash do
+    conteúdo da imagem (a mesma referência do blob_store).
+
+    - Resultado pronto: 'plate:result:<api_key_id>:<ref>' guarda task_id, placa e
+      alternativas, com TTL e limite de entradas (as mais antigas são descartadas).
+    - Em processamento: 'plate:inflight:<api_key_id>:<ref>' guarda o task_id da
+      task em curso, para que envios idênticos simultâneos reaproveitem a mesma task.
+
+    O escopo por chave impede que uma chave receba o task_id (e, por ele, o
+    resultado e os avisos de conclusão) de uma task enviada por outra; a mesma
+    imagem enviada por chaves diferentes é processada uma vez por chave.
+
+    A API usa os métodos assíncronos; o worker, os síncronos.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, inflight_ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.inflight_ttl_seconds = inflight_ttl_seconds
+
+    async def get(self, api_key_id: int | None, ref: str) -> dict | None:
+        """Retorna o resultado em cache para a imagem, se houver."""
+        raw = await get_async_redis().get(RESULT_KEY.format(entry=_entry(api_key_id, ref)))
+        return json.loads(raw) if raw else None
+
+    async def claim(self, api_key_id: int | None, ref: str, task_id: str) -> str | None:
+        """
+        Registra 'task_id' como a task em curso para a imagem. Se outra task já
+        estiver processando a mesma imagem, retorna o task_id dela.
+        """
+        client = get_async_redis()
+        key = INFLIGHT_KEY.format(entry=_entry(api_key_id, ref))
+        if await client.set(key, task_id, nx=True, ex=self.inflight_ttl_seconds):
+            return None
+        existing = await client.get(key)
+        return existing.decode() if existing else None
+
+    async def get_many(self, api_key_id: int | None, refs: list[str]) -> list[dict | None]:
+        """Como get, para várias imagens numa única ida ao Redis."""
+        if not refs:
+            return []
+        raws = await get_async_redis().mget(
+            [RESULT_KEY.format(entry=_entry(api_key_id, ref)) for ref in refs]
+        )
+        return [json.loads(raw) if raw else None for raw in raws]
+
+    async def claim_many(
+        self, api_key_id: int | None, claims: list[tuple[str, str]]
+    ) -> list[str | None]:
+        """
+        Como claim, para vários pares (ref, task_id) num único pipeline. Uma
+        imagem repetida no mesmo lote recebe o task_id da primeira ocorrência.
+        """
+        if not claims:
+            return []
+        client = get_async_redis()
+        pipe = client.pipeline(transaction=False)
+        for ref, task_id in claims:
+            key = INFLIGHT_KEY.format(entry=_entry(api_key_id, ref))
+            pipe.set(key, task_id, nx=True, ex=self.inflight_ttl_seconds)
+            pipe.get(key)
+        replies = await pipe.execute()
+        results = []
+        for i in range(len(claims)):
+            acquired, current = replies[2 * i], replies[2 * i + 1]
+            results.append(None if acquired else (current.decode() if current else None))
+        return results
+
+    async def release_many(self, api_key_id: int | None, refs: list[str]) -> None:
+        """Libera vários registros de task em curso."""
+        if refs:
+            await get_async_redis().delete(
+                *(INFLIGHT_KEY.format(entry=_entry(api_key_id, ref)) for ref in refs)
+            )
+
+    async def release(self, api_key_id: int | None, ref: str) -> None:
+        """Libera o registro de task em curso (ex.: falha ao enfileirar)."""
+        await get_async_redis().delete(INFLIGHT_KEY.format(entry=_entry(api_key_id, ref)))
+
+    def store(
+        self,
+        api_key_id: int | None,
+        ref: str,
+        task_id: str,
+        placa: str | None,
+        alternativas: list,
+    ) -> None:
+        """Grava o resultado de uma task concluída e libera o registro em curso."""
+        client = get_redis()
+        entry = _entry(api_key_id, ref)
+        now = time.time()
+        payload = json.dumps(
+            {"task_id": task_id, "placa": placa, "alternativas": alternativas}
+        )
+        pipe = client.pipeline()
+        pipe.set(RESULT_KEY.format(entry=entry), payload, ex=self.ttl_seconds)
+        pipe.zadd(INDEX_KEY, {entry: now})
+        pipe.delete(INFLIGHT_KEY.format(entry=entry))
+        # Remove do índice o que já expirou pelo TTL
+        pipe.zremrangebyscore(INDEX_KEY, "-inf", now - self.ttl_seconds)
+        pipe.zcard(INDEX_KEY)
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            evicted = client.zpopmin(INDEX_KEY, size - self.max_entries)
+            if evicted:
+                client.delete(
+                    *(RESULT_KEY.format(entry=member.decode()) for member, _ in evicted)
+                )
+
+    def discard_inflight(self, api_key_id: int | None, ref: str) -> None:
+        """Libera o registro de task em curso sem gravar resultado (ex.: erro)."""
+        get_redis().delete(INFLIGHT_KEY.format(entry=_entry(api_key_id, ref)))
+
+
+plate_result_cache = PlateResultCache(
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    inflight_ttl_seconds=settings.RESULT_CACHE_INFLIGHT_TTL_SECONDS,
+)
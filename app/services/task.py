@@ -1,135 +1,164 @@
-import os
-import json
-import requests
-from typing import Dict, Optional
+import time
+
 from app.celery_app import celery
+from app.core.config import settings
+from app.core.metrics import PLATE_STAGE_SECONDS, TASKS_IN_FLIGHT
+from app.services.admission import admission_controller
+from app.services.blob_store import blob_store
+from app.services.notifications import task_notifier
+from app.services.queues import tenant_limiter
+from app.services.pipeline import pipeline_runner, plate_pipeline
+from app.services.plate_result import summarize_plate_result, trim_plate_result
+from app.services.result_cache import plate_result_cache
+
 
+@celery.task(name="plate.cleanup_blobs_task")
+def cleanup_blobs_task() -> dict:
+    """Task periódica que remove do armazenamento as imagens mais antigas que o TTL."""
+    return {"removed": blob_store.cleanup(settings.BLOB_TTL_SECONDS)}
 
-@celery.task(name="plate.process_plate_image_task")
+
+# O limite de republicações por falta de vaga é TENANT_MAX_REQUEUES (ver abaixo)
+@celery.task(name="plate.process_plate_image_task", bind=True, max_retries=None)
 def process_plate_image_task(
-    original_bytes: bytes,
+    self,
+    blob_ref: str,
     filename: str,
     content_type: str,
     yolo_api_url: str,
     ocr_api_url: str,
     ezocr_api_url: str,
     yolo_output_dir: str,
+    api_key_id: int | None = None,
 ) -> dict:
     """
-    Task Celery que processa a imagem recebida:
-    1. Detecta placa com YOLO
-    2. Tenta OCR com ezOCR e OCR
-    3. Retorna dict serializável com resultados
+    Task Celery que processa a imagem recebida (lida do blob_store pela referência).
+    O processamento em si (YOLO → recorte → OCR) é feito pelo PlatePipeline
+    assíncrono; com '--pool threads', várias tasks do mesmo processo
+    compartilham o loop do pipeline, limitadas por PIPELINE_MAX_CONCURRENCY.
+
+    Se a chave que enviou a imagem já tem TENANT_MAX_IN_FLIGHT tasks em execução,
+    a task é republicada sem atraso (countdown=0: mensagem comum, no fim da fila,
+    e não uma mensagem com ETA retida na memória do worker), dando vez às outras
+    chaves. Depois de TENANT_MAX_REQUEUES republicações, executa sem vaga.
     """
-
-    file_id = None
-    classe_detectada = None
-    crop_bytes = None
-
-    # === Etapa 1: Envia imagem ao YOLO ===
+    if api_key_id is not None and not tenant_limiter.acquire(api_key_id, self.request.id):
+        if self.request.retries < settings.TENANT_MAX_REQUEUES:
+            time.sleep(settings.TENANT_REQUEUE_PAUSE_SECONDS)
+            raise self.retry(countdown=0)
+        print(
+            f"ATENÇÃO: Task {self.request.id} da chave {api_key_id} executando sem "
+            f"vaga após {self.request.retries} republicações."
+        )
     try:
-        yolo_resp = requests.post(
+        return _process_plate_image(
+            self,
+            blob_ref,
+            filename,
+            content_type,
             yolo_api_url,
-            files={"file": (filename, original_bytes, content_type)},
-            timeout=30,
+            ocr_api_url,
+            ezocr_api_url,
+            yolo_output_dir,
+            api_key_id,
         )
-        if yolo_resp.status_code == 404:
-            pass
-        elif not yolo_resp.ok:
-            yolo_resp.raise_for_status()
-
-        yolo_json = yolo_resp.json()
-
-        crop_path = None
-        if "arquivo" in yolo_json:
-            crop_path = yolo_json["arquivo"]
-        elif "file_id" in yolo_json:
-            crop_path = os.path.join(
-                yolo_output_dir,
-                yolo_json["file_id"],
-                f"{yolo_json['file_id']}.jpg",
-            )
-
-        if not crop_path:
-            raise ValueError("Resposta do YOLO não continha caminho válido.")
+    finally:
+        if api_key_id is not None:
+            _release_tenant_slot(api_key_id, self.request.id)
+            _complete_admission(api_key_id)
 
-        file_id = yolo_json.get("file_id")
-        classe_detectada = yolo_json.get("classe")
 
-        if not os.path.exists(crop_path):
-            raise FileNotFoundError(f"Imagem recortada não encontrada: {crop_path}")
+def _process_plate_image(
+    task,
+    blob_ref: str,
+    filename: str,
+    content_type: str,
+    yolo_api_url: str,
+    ocr_api_url: str,
+    ezocr_api_url: str,
+    yolo_output_dir: str,
+    api_key_id: int | None,
+) -> dict:
+    try:
+        with TASKS_IN_FLIGHT.track_inprogress(), PLATE_STAGE_SECONDS.labels("task").time():
+            raw_result = pipeline_runner.run(
+                plate_pipeline.process(
+                    blob_ref,
+                    filename,
+                    content_type,
+                    yolo_api_url,
+                    ocr_api_url,
+                    ezocr_api_url,
+                    yolo_output_dir,
+                )
+            )
+    except Exception:
+        _update_result_cache(api_key_id, blob_ref, task.request.id, {})
+        _notify_subscribers(task.request.id, None)
+        raise
+    _update_result_cache(api_key_id, blob_ref, task.request.id, raw_result)
+    _notify_subscribers(task.request.id, raw_result)
+    if settings.TRIM_TASK_RESULTS:
+        return trim_plate_result(raw_result)
+    return raw_result
 
-        with open(crop_path, "rb") as f:
-            crop_bytes = f.read()
 
+def _update_result_cache(
+    api_key_id: int | None, blob_ref: str, task_id: str, raw_result: dict
+) -> None:
+    """
+    Grava no cache de resultados as leituras bem-sucedidas. Erros e imagens sem
+    placa não são guardados (podem ser falhas temporárias do YOLO/OCR); nesses
+    casos apenas o registro de "em processamento" é liberado.
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return
+    try:
+        with PLATE_STAGE_SECONDS.labels("result_cache").time():
+            if raw_result.get("placa"):
+                placa, alternativas = summarize_plate_result(raw_result)
+                plate_result_cache.store(api_key_id, blob_ref, task_id, placa, alternativas)
+            else:
+                plate_result_cache.discard_inflight(api_key_id, blob_ref)
     except Exception as e:
-        return {"error": f"Erro no YOLO: {str(e)}"}
-
-    # === Etapa 2: Tentativas OCR ===
-    tentativa_urls = [
-        (ezocr_api_url, classe_detectada),
-        (ocr_api_url, classe_detectada),
-        (ezocr_api_url, None),
-        (ocr_api_url, None),
-    ]
-
-    def padronizar_resultado_ocr_bruto(resultado_ocr: Dict | str) -> dict:
-        if isinstance(resultado_ocr, dict):
-            if "resultado" in resultado_ocr:
-                try:
-                    parsed = json.loads(resultado_ocr["resultado"])
-                    results = parsed.get("results", [])
-                    return {
-                        "placa": results[0]["plate"] if results else None,
-                        "results": results,
-                    }
-                except json.JSONDecodeError:
-                    return {"placa": None, "results": []}
-            if "results" in resultado_ocr:
-                results = resultado_ocr["results"]
-                return {
-                    "placa": results[0]["plate"] if results else None,
-                    "results": results,
-                }
-        return {"placa": None, "results": []}
-
-    def chamar_ocr(
-        crop_bytes: bytes, categoria: Optional[str], anpr_api_url: str
-    ) -> dict:
-        data = {"categoria": categoria} if categoria else {}
-        try:
-            resp = requests.post(
-                anpr_api_url,
-                files={"file": ("input.jpg", crop_bytes, "image/jpeg")},
-                data=data,
-                timeout=30,
-            )
-            resp.raise_for_status()
-            return padronizar_resultado_ocr_bruto(resp.json())
-        except Exception:
-            return {"placa": None, "results": []}
+        print(f"ATENÇÃO: Erro ao atualizar cache de resultados para {blob_ref}: {str(e)}")
 
-    raw_result = {"placa": None, "results": []}
-    for url, categoria in tentativa_urls:
-        raw_result = chamar_ocr(crop_bytes, categoria, url)
-        if raw_result["placa"] or raw_result["results"]:
-            break
 
-    if not raw_result["placa"] and not raw_result["results"]:
-        return {"placa": None, "results": []}
+def _notify_subscribers(task_id: str, raw_result: dict | None) -> None:
+    """
+    Avisa quem se inscreveu na task (SSE e webhook) com o mesmo formato de
+    GET /tasks/{task_id}. raw_result None indica falha da task.
+    """
+    if not settings.NOTIFY_ENABLED:
+        return
+    if raw_result is None:
+        event = {"task_id": task_id, "status": "failure"}
+    else:
+        placa, alternativas = summarize_plate_result(raw_result)
+        event = {
+            "task_id": task_id,
+            "status": "success",
+            "placa": placa,
+            "alternativas": alternativas,
+        }
+    try:
+        with PLATE_STAGE_SECONDS.labels("notify").time():
+            task_notifier.publish(task_id, event)
+    except Exception as e:
+        print(f"ATENÇÃO: Erro ao avisar os inscritos da task {task_id}: {str(e)}")
 
-    # === Etapa 3: Salvar resultado em disco (opcional) ===
+
+def _release_tenant_slot(api_key_id: int, task_id: str) -> None:
+    """Devolve a vaga da task no limite de tasks simultâneas da chave."""
     try:
-        if file_id and raw_result["placa"]:
-            output_dir_for_file = os.path.join(yolo_output_dir, file_id)
-            os.makedirs(output_dir_for_file, exist_ok=True)
-            with open(
-                os.path.join(output_dir_for_file, f"{file_id}.txt"),
-                "w",
-                encoding="utf-8",
-            ) as f:
-                json.dump(raw_result, f, ensure_ascii=False, indent=2)
+        tenant_limiter.release(api_key_id, task_id)
     except Exception as e:
-        print(f"ATENÇÃO: Erro ao salvar resultado em disco para {file_id}: {str(e)}")
+        print(f"ATENÇÃO: Erro ao liberar a vaga da task {task_id} da chave {api_key_id}: {str(e)}")
 
-    return raw_result
+
+def _complete_admission(api_key_id: int) -> None:
+    """Devolve a vaga de pendência da chave no controle de admissão."""
+    try:
+        admission_controller.complete(api_key_id)
+    except Exception as e:
+        print(f"ATENÇÃO: Erro ao liberar a pendência da chave {api_key_id}: {str(e)}")
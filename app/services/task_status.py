@@ -0,0 +1,93 @@
+from typing import Any, List
+
+from celery.backends.base import BaseKeyValueStoreBackend
+
+from app.celery_app import celery
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.schemas.plate import TaskStatusResponse
+from app.services.plate_result import summarize_plate_result
+
+# ID da chave de API que enviou a task
+TASK_OWNER_KEY = "plate:task-owner:{task_id}"
+
+
+async def record_task_owner(api_key_id: int, task_ids: List[str]) -> None:
+    """Registra a chave de API que enviou as tasks (antes de enfileirá-las)."""
+    if not task_ids:
+        return
+    pipe = get_async_redis().pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.set(
+            TASK_OWNER_KEY.format(task_id=task_id),
+            api_key_id,
+            ex=settings.TASK_OWNER_TTL_SECONDS,
+        )
+    await pipe.execute()
+
+
+async def owned_task_ids(api_key_id: int, task_ids: List[str]) -> List[str]:
+    """
+    Filtra, mantendo a ordem, as tasks enviadas pela chave. Tasks de outras
+    chaves e ids desconhecidos ficam de fora, sem distinção entre os dois casos.
+    """
+    if not task_ids:
+        return []
+    owners = await get_async_redis().mget(
+        [TASK_OWNER_KEY.format(task_id=task_id) for task_id in task_ids]
+    )
+    owner = str(api_key_id).encode()
+    return [task_id for task_id, raw in zip(task_ids, owners) if raw == owner]
+
+
+def task_status_response(task_id: str, state: str, result: Any) -> TaskStatusResponse:
+    """Monta a resposta de status de uma task a partir do estado e do resultado."""
+    if state == "PENDING":
+        return TaskStatusResponse(task_id=task_id, status="pending")
+    elif state == "STARTED":
+        return TaskStatusResponse(task_id=task_id, status="started")
+    elif state == "FAILURE":
+        # Pode retornar a exceção ou mensagem de erro
+        return TaskStatusResponse(task_id=task_id, status="failure")
+    elif state == "SUCCESS":
+        # deve ser dict com placa e alternativas
+        placa, alternativas = summarize_plate_result(result)
+        return TaskStatusResponse(
+            task_id=task_id,
+            status="success",
+            placa=placa,
+            alternativas=alternativas,
+        )
+    else:
+        return TaskStatusResponse(task_id=task_id, status=state.lower())
+
+
+def get_task_status(task_id: str) -> TaskStatusResponse:
+    async_result = celery.AsyncResult(task_id)
+    return task_status_response(task_id, async_result.state, async_result.result)
+
+
+def get_task_statuses(task_ids: List[str]) -> List[TaskStatusResponse]:
+    """
+    Consulta o status de várias tasks. Com backend chave-valor (ex.: Redis), os
+    metadados de todas são lidos numa única operação (MGET); nos demais
+    backends, uma consulta por task. A ordem da resposta segue a de task_ids.
+    """
+    if not task_ids:
+        return []
+    backend = celery.backend
+    if not isinstance(backend, BaseKeyValueStoreBackend):
+        return [get_task_status(task_id) for task_id in task_ids]
+
+    raws = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    responses = []
+    for task_id, raw in zip(task_ids, raws):
+        if raw is None:
+            # Sem registro no backend: a task ainda não começou (ou não existe)
+            responses.append(task_status_response(task_id, "PENDING", None))
+            continue
+        meta = backend.decode_result(raw)
+        responses.append(
+            task_status_response(task_id, meta["status"], meta.get("result"))
+        )
+    return responses
@@ -0,0 +1,46 @@
+import os
+
+from celery.signals import worker_init, worker_process_shutdown
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+from app.core.config import settings
+
+# Exposição das métricas Prometheus dos workers do Celery (etapas do pipeline,
+# chamadas aos backends, tentativas de OCR e tasks em execução).
+#
+# O servidor HTTP roda no processo principal do worker, na WORKER_METRICS_PORT.
+# Com '--pool threads' (ou solo) as tasks rodam nesse mesmo processo. Com o pool
+# prefork, as tasks rodam nos processos filhos: defina PROMETHEUS_MULTIPROC_DIR
+# (diretório vazio, exclusivo do worker) para que o prometheus_client grave as
+# métricas de cada processo em arquivos e o servidor publique a soma.
+
+
+def _multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+@worker_init.connect
+def start_worker_metrics_server(**kwargs) -> None:
+    if settings.WORKER_METRICS_PORT <= 0:
+        return
+    registry = None
+    if _multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    try:
+        if registry is None:
+            start_http_server(settings.WORKER_METRICS_PORT)
+        else:
+            start_http_server(settings.WORKER_METRICS_PORT, registry=registry)
+    except OSError as e:
+        print(
+            f"ATENÇÃO: Métricas do worker indisponíveis na porta "
+            f"{settings.WORKER_METRICS_PORT}: {str(e)}"
+        )
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs) -> None:
+    """Descarta as métricas 'live' (ex.: tasks em execução) do processo filho encerrado."""
+    if _multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,177 @@
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import random
+import string
+import uuid
+from typing import List
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+# Servidores locais que imitam o detector (YOLO) e o OCR, nos formatos
+# individual e em lote (contrato em app/services/batching.py). Servem para
+# testar o pipeline sem GPU:
+#
+#   uvicorn app.stubs.plate_services:detector_app --port 8001
+#   uvicorn app.stubs.plate_services:ocr_app --port 8002
+#
+# Não dependem do Settings da API; o detector grava os recortes em
+# STUB_OUTPUT_DIR (ou YOLO_OUTPUT_DIR), como o YOLO real faz no volume
+# compartilhado.
+#
+# Latência e falhas simuladas (ver PerfilStub) vêm do ambiente, com o prefixo
+# STUB_DETECTOR_ no detector e STUB_OCR_ no OCR, por exemplo:
+#
+#   STUB_OCR_LATENCY_MS=30 STUB_OCR_ERROR_RATE=0.1 uvicorn app.stubs.plate_services:ocr_app
+
+STUB_OUTPUT_DIR = os.environ.get(
+    "STUB_OUTPUT_DIR", os.environ.get("YOLO_OUTPUT_DIR", "/tmp/yolo_output")
+)
+
+
+class PerfilStub:
+    """
+    Comportamento simulado de um backend, aplicado a cada requisição:
+    - LATENCY_MS e JITTER_MS: atraso de LATENCY_MS ± JITTER_MS (uniforme);
+    - ERROR_RATE: fração das requisições respondidas com 500;
+    - HANG_RATE e HANG_SECONDS: fração das requisições que fica HANG_SECONDS
+      sem responder (backend travado; o cliente deve estourar o timeout).
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 300.0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "PerfilStub":
+        def valor(nome: str, padrao: float) -> float:
+            return float(os.environ.get(f"{prefix}{nome}", padrao))
+
+        return cls(
+            latency_ms=valor("LATENCY_MS", 0.0),
+            jitter_ms=valor("JITTER_MS", 0.0),
+            error_rate=valor("ERROR_RATE", 0.0),
+            hang_rate=valor("HANG_RATE", 0.0),
+            hang_seconds=valor("HANG_SECONDS", 300.0),
+        )
+
+    async def aplicar(self) -> JSONResponse | None:
+        """Espera o atraso sorteado; devolve a resposta de erro, se for o caso."""
+        if self.hang_rate and random.random() < self.hang_rate:
+            await asyncio.sleep(self.hang_seconds)
+        atraso_ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if atraso_ms > 0:
+            await asyncio.sleep(atraso_ms / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            return JSONResponse({"detail": "Falha simulada."}, status_code=500)
+        return None
+
+
+def instalar_perfil(app: FastAPI, perfil: PerfilStub) -> None:
+    @app.middleware("http")
+    async def simular_backend(request: Request, call_next):
+        return await perfil.aplicar() or await call_next(request)
+
+
+def placa_deterministica(data: bytes) -> str:
+    """Gera uma placa Mercosul (LLL9L99) estável a partir do conteúdo da imagem."""
+    digest = hashlib.sha256(data).digest()
+    letras = string.ascii_uppercase
+    return (
+        letras[digest[0] % 26]
+        + letras[digest[1] % 26]
+        + letras[digest[2] % 26]
+        + str(digest[3] % 10)
+        + letras[digest[4] % 26]
+        + str(digest[5] % 10)
+        + str(digest[6] % 10)
+    )
+
+
+def detectar(data: bytes, crop_mode: str | None = None) -> dict:
+    """
+    Simula o YOLO. O "recorte" é a própria imagem: devolvido em base64
+    (crop_mode=inline), como bbox da imagem inteira (crop_mode=bbox) ou gravado
+    no diretório de saída (padrão, volume compartilhado).
+    """
+    if crop_mode == "inline":
+        return {"classe": "carro", "crop_b64": base64.b64encode(data).decode()}
+    if crop_mode == "bbox":
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+        return {"classe": "carro", "bbox": [0, 0, width, height]}
+
+    file_id = uuid.uuid4().hex
+    output_dir = os.path.join(STUB_OUTPUT_DIR, file_id)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f"{file_id}.jpg"), "wb") as f:
+        f.write(data)
+    return {"file_id": file_id, "classe": "carro"}
+
+
+def ler_placa(data: bytes, categoria: str | None) -> dict:
+    """Simula o OCR no formato {"results": [{"plate", "candidates"}]}."""
+    placa = placa_deterministica(data)
+    alternativa = placa[:-1] + str((int(placa[-1]) + 1) % 10)
+    return {
+        "results": [
+            {
+                "plate": placa,
+                "candidates": [{"plate": placa}, {"plate": alternativa}],
+            }
+        ]
+    }
+
+
+detector_app = FastAPI(title="Stub do detector de placas")
+instalar_perfil(detector_app, PerfilStub.from_env("STUB_DETECTOR_"))
+
+
+@detector_app.post("/detect")
+async def detect(
+    file: UploadFile = File(...), crop_mode: str | None = Form(None)
+):
+    return detectar(await file.read(), crop_mode)
+
+
+@detector_app.post("/detect/batch")
+async def detect_batch(
+    files: List[UploadFile] = File(...), crop_mode: str | None = Form(None)
+):
+    return {"results": [detectar(await f.read(), crop_mode) for f in files]}
+
+
+ocr_app = FastAPI(title="Stub do OCR de placas")
+instalar_perfil(ocr_app, PerfilStub.from_env("STUB_OCR_"))
+
+
+@ocr_app.post("/ocr")
+async def ocr(file: UploadFile = File(...), categoria: str | None = Form(None)):
+    return ler_placa(await file.read(), categoria)
+
+
+@ocr_app.post("/ocr/batch")
+async def ocr_batch(
+    files: List[UploadFile] = File(...),
+    categorias: List[str] = Form(default_factory=list),
+):
+    categorias = categorias + [""] * (len(files) - len(categorias))
+    return {
+        "results": [
+            ler_placa(await f.read(), c or None) for f, c in zip(files, categorias)
+        ]
+    }
@@ -0,0 +1,112 @@
+import os
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+# Configuração mínima para importar app.core.config sem um .env (os testes não
+# acessam Postgres nem os backends de YOLO/OCR)
+for nome, valor in {
+    "POSTGRES_DB": "brplates_test",
+    "POSTGRES_USER": "brplates",
+    "POSTGRES_PASSWORD": "brplates",
+    "POSTGRES_HOST": "localhost",
+    "API_KEY_LENGTH": "32",
+    "DEFAULT_CALL_LIMIT": "1000",
+    "YOLO_API_URL": "http://yolo.test",
+    "OCR_API_URL": "http://ocr.test",
+    "EZOCR_API_URL": "http://ezocr.test",
+    "YOLO_OUTPUT_DIR": "/tmp/yolo_test",
+    "CELERY_BROKER_URL": "redis://localhost:6379/0",
+    "CELERY_RESULT_BACKEND": "redis://localhost:6379/1",
+}.items():
+    os.environ.setdefault(nome, valor)
+
+
+@pytest.fixture
+def redis_server():
+    """Servidor Redis em memória (fakeredis, com suporte a scripts Lua)."""
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def fake_redis(redis_server):
+    """Cliente síncrono do servidor de teste, para conferir o estado gravado."""
+    return fakeredis.FakeRedis(server=redis_server)
+
+
+@pytest.fixture
+def patch_redis(monkeypatch, redis_server):
+    """
+    Troca os clientes Redis de um módulo (get_redis e get_async_redis, os que
+    ele importar) por clientes do servidor de teste.
+    """
+
+    def aplicar(modulo) -> None:
+        if hasattr(modulo, "get_redis"):
+            monkeypatch.setattr(
+                modulo, "get_redis", lambda: fakeredis.FakeRedis(server=redis_server)
+            )
+        if hasattr(modulo, "get_async_redis"):
+            monkeypatch.setattr(
+                modulo,
+                "get_async_redis",
+                lambda: fakeredis.aioredis.FakeRedis(server=redis_server),
+            )
+
+    return aplicar
+
+
+@pytest.fixture
+def with_async_db():
+    """
+    Executa 'cenario(db)' numa AsyncSession ligada a um SQLite em memória com as
+    tabelas dos modelos, tudo dentro de um único event loop.
+    """
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import StaticPool
+
+    from app.db.database import Base
+
+    def executar(cenario):
+        async def principal():
+            engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+            try:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                async with AsyncSession(engine, expire_on_commit=False) as db:
+                    return await cenario(db)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(principal())
+
+    return executar
+
+
+@pytest.fixture
+def sync_db():
+    """Session síncrona num SQLite em memória com as tabelas dos modelos."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.pool import StaticPool
+
+    from app.db.database import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        yield db
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def limpar_cache_de_chaves():
+    """O cache de chaves verificadas é global ao processo."""
+    from app.core.api_key_cache import verified_key_cache
+
+    verified_key_cache.clear()
+    yield
+    verified_key_cache.clear()
@@ -0,0 +1,171 @@
+import asyncio
+import io
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api.v1.endpoints import plates
+from app.crud.api_key_async import decrement_api_key_calls
+from app.db.models import ApiKey
+from app.schemas.api_key import ApiKeyInDB
+from app.services import admission, plate_service, result_cache, task_status
+from app.services.admission import AdmissionController
+from app.services.blob_store import BlobStore
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+
+
+def _controller(max_pending: int = 3) -> AdmissionController:
+    return AdmissionController(
+        max_queue_depth=0,
+        max_pending_per_key=max_pending,
+        depth_cache_seconds=1.0,
+        retry_after_seconds=7,
+        pending_ttl_seconds=60,
+    )
+
+
+@pytest.fixture
+def redis_modulos(patch_redis):
+    for modulo in (admission, result_cache, task_status):
+        patch_redis(modulo)
+
+
+def _pendentes(fake_redis, api_key_id: int) -> int:
+    return int(fake_redis.get(f"plate:pending:{api_key_id}") or 0)
+
+
+def test_reserva_ate_o_limite_e_depois_429(redis_modulos, fake_redis):
+    controller = _controller()
+
+    async def executar():
+        await controller.reserve(1, 2)
+        with pytest.raises(HTTPException) as exc:
+            await controller.reserve(1, 2)  # 2 + 2 > 3: nada é reservado
+        await controller.reserve(1, 1)
+        await controller.reserve(2, 3)  # outra chave, outro contador
+        return exc.value
+
+    erro = asyncio.run(executar())
+    assert erro.status_code == 429
+    assert erro.headers["Retry-After"] == "7"
+    assert _pendentes(fake_redis, 1) == 3
+    assert _pendentes(fake_redis, 2) == 3
+    assert 0 < fake_redis.ttl("plate:pending:1") <= 60
+
+
+def test_release_e_complete_devolvem_sem_ficar_negativo(redis_modulos, fake_redis):
+    controller = _controller()
+
+    async def executar():
+        await controller.reserve(1, 3)
+        await controller.release(1, 2)
+        await controller.release(1, 5)
+
+    asyncio.run(executar())
+    assert _pendentes(fake_redis, 1) == 0
+    controller.complete(1)
+    assert _pendentes(fake_redis, 1) == 0
+
+
+def test_limite_zero_desativa_as_reservas(redis_modulos, fake_redis):
+    controller = _controller(max_pending=0)
+    asyncio.run(controller.reserve(1, 1000))
+    assert not fake_redis.exists("plate:pending:1")
+
+
+async def criar_chave(db, **campos) -> ApiKeyInDB:
+    linha = ApiKey(key_hash=uuid4().hex, **campos)
+    db.add(linha)
+    await db.commit()
+    return ApiKeyInDB.model_validate(linha)
+
+
+async def calls_made(db, api_key_id: int) -> int:
+    linha = await db.get(ApiKey, api_key_id)
+    await db.refresh(linha)
+    return linha.calls_made
+
+
+def test_decremento_nao_deixa_calls_made_negativo(with_async_db):
+    async def cenario(db):
+        chave = await criar_chave(db, call_limit=10, calls_made=3)
+        await decrement_api_key_calls(db, chave.id, 2)
+        primeiro = await calls_made(db, chave.id)
+        await decrement_api_key_calls(db, chave.id, 5)
+        return primeiro, await calls_made(db, chave.id)
+
+    assert with_async_db(cenario) == (1, 0)
+
+
+@pytest.fixture
+def envio(redis_modulos, tmp_path, monkeypatch):
+    """Admissão com limite pequeno e blob_store temporário para processar_placa."""
+    monkeypatch.setattr(plate_service, "blob_store", BlobStore(str(tmp_path / "blobs")))
+    monkeypatch.setattr(plates, "admission_controller", _controller())
+    monkeypatch.setattr(plate_service, "admission_controller", plates.admission_controller)
+    monkeypatch.setattr(plate_service.settings, "CALL_COUNTER_MODE", "atomic")
+    monkeypatch.setattr(plate_service.settings, "NOTIFY_ENABLED", False)
+    monkeypatch.setattr(plate_service.settings, "RESULT_CACHE_ENABLED", True)
+
+
+def _processar(db, chave):
+    return plates.processar_placa(
+        file=UploadFile(io.BytesIO(JPEG), filename="placa.jpg"),
+        callback_url=None,
+        api_key_data=chave,
+        db=db,
+    )
+
+
+def test_falha_ao_enfileirar_devolve_quota_vaga_e_registro_em_curso(
+    envio, with_async_db, fake_redis, monkeypatch
+):
+    def enfileirar(*args, **kwargs):
+        raise ConnectionError("broker fora")
+
+    monkeypatch.setattr(plates.plate_service, "_enqueue", enfileirar)
+
+    async def cenario(db):
+        chave = await criar_chave(db, call_limit=10, calls_made=4)
+        with pytest.raises(ConnectionError):
+            await _processar(db, chave)
+        return chave.id, await calls_made(db, chave.id)
+
+    api_key_id, cobradas = with_async_db(cenario)
+    assert cobradas == 4
+    assert _pendentes(fake_redis, api_key_id) == 0
+    assert fake_redis.keys("plate:inflight:*") == []
+
+
+def test_quota_insuficiente_devolve_a_vaga_reservada(envio, with_async_db, fake_redis):
+    async def cenario(db):
+        chave = await criar_chave(db, call_limit=2, calls_made=2)
+        with pytest.raises(HTTPException) as exc:
+            await _processar(db, chave)
+        return chave.id, exc.value.status_code
+
+    api_key_id, status_code = with_async_db(cenario)
+    assert status_code == 401
+    assert _pendentes(fake_redis, api_key_id) == 0
+
+
+def test_envio_aceito_mantem_a_vaga_ate_o_worker_concluir(
+    envio, with_async_db, fake_redis, monkeypatch
+):
+    monkeypatch.setattr(
+        plates.plate_service,
+        "_enqueue",
+        lambda *args, task_id=None, **kwargs: SimpleNamespace(id=task_id),
+    )
+
+    async def cenario(db):
+        chave = await criar_chave(db, call_limit=10, calls_made=0)
+        resposta = await _processar(db, chave)
+        return chave.id, resposta.status, await calls_made(db, chave.id)
+
+    api_key_id, status, cobradas = with_async_db(cenario)
+    assert (status, cobradas) == ("processing", 1)
+    assert _pendentes(fake_redis, api_key_id) == 1
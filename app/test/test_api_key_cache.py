@@ -0,0 +1,101 @@
+from passlib.context import CryptContext
+from prometheus_client import REGISTRY
+
+from app.core.api_key_cache import VerifiedKeyCache, verified_key_cache
+from app.core.config import settings
+from app.core.security import generate_api_key, get_api_key_prefix
+from app.crud.api_key import deactivate_api_key, update_api_key_call_limit
+from app.db.models import ApiKey
+from app.services import api_key_service as modulo
+from app.services.api_key_service import ApiKeyService
+
+hash_barato = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+
+def amostra(nome: str, **rotulos) -> float:
+    return REGISTRY.get_sample_value(nome, rotulos) or 0.0
+
+
+def test_cache_expira_e_descarta_a_menos_usada(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr("app.core.api_key_cache.time.monotonic", lambda: agora[0])
+    cache = VerifiedKeyCache(max_entries=2, ttl_seconds=10)
+    cache.set("a", 1, "h1")
+    cache.set("b", 2, "h2")
+    assert cache.get("a") == (1, "h1")
+    cache.set("c", 3, "h3")  # descarta "b", a menos usada
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    agora[0] += 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_cache_exporta_acertos_e_falhas():
+    cache = VerifiedKeyCache(max_entries=4, ttl_seconds=10)
+    acertos = amostra("api_key_cache_lookups_total", outcome="hit")
+    falhas = amostra("api_key_cache_lookups_total", outcome="miss")
+    cache.set("a", 1, "h1")
+    cache.get("a")
+    cache.get("x")
+    assert amostra("api_key_cache_lookups_total", outcome="hit") == acertos + 1
+    assert amostra("api_key_cache_lookups_total", outcome="miss") == falhas + 1
+
+
+def criar_chave(db) -> tuple[ApiKey, str]:
+    chave = generate_api_key(settings.API_KEY_LENGTH)
+    linha = ApiKey(
+        key_hash=hash_barato.hash(chave),
+        key_prefix=get_api_key_prefix(chave),
+        call_limit=10,
+    )
+    db.add(linha)
+    db.commit()
+    return linha, chave
+
+
+def test_alterar_limite_ou_desativar_invalida_o_cache(sync_db):
+    linha, chave = criar_chave(sync_db)
+    outra, outra_chave = criar_chave(sync_db)
+    verified_key_cache.set(chave, linha.id, linha.key_hash)
+    verified_key_cache.set(outra_chave, outra.id, outra.key_hash)
+
+    update_api_key_call_limit(sync_db, linha, 20)
+    assert verified_key_cache.get(chave) is None
+    assert verified_key_cache.get(outra_chave) is not None
+
+    verified_key_cache.set(chave, linha.id, linha.key_hash)
+    deactivate_api_key(sync_db, linha)
+    assert verified_key_cache.get(chave) is None
+
+
+def test_acerto_no_cache_dispensa_o_bcrypt(with_async_db, monkeypatch):
+    service = ApiKeyService()
+    verificacoes = []
+    verificar = modulo.verify_api_key_async
+
+    async def contar(chave, key_hash):
+        verificacoes.append(chave)
+        return await verificar(chave, key_hash)
+
+    monkeypatch.setattr(modulo, "verify_api_key_async", contar)
+
+    async def cenario(db):
+        chave = generate_api_key(settings.API_KEY_LENGTH)
+        linha = ApiKey(
+            key_hash=hash_barato.hash(chave),
+            key_prefix=get_api_key_prefix(chave),
+            call_limit=10,
+        )
+        db.add(linha)
+        await db.commit()
+        assert (await service.authenticate_api_key(db, chave)).id == linha.id
+        assert (await service.authenticate_api_key(db, chave)).id == linha.id
+        assert len(verificacoes) == 1
+
+        # Linha desativada por outro processo: a entrada em cache não vale mais
+        linha.is_active = False
+        await db.commit()
+        assert await service.authenticate_api_key(db, chave) is None
+
+    with_async_db(cenario)
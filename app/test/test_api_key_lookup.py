@@ -0,0 +1,92 @@
+import pytest
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.rate_limit import RateLimitResult
+from app.core.security import generate_api_key, get_api_key_prefix
+from app.db.models import ApiKey
+from app.services import api_key_service as modulo
+from app.services.api_key_service import ApiKeyService
+
+# bcrypt barato: o custo não muda o comportamento da busca
+hash_barato = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+service = ApiKeyService()
+
+
+async def criar_chave(db, com_prefixo: bool = True, **campos) -> tuple[ApiKey, str]:
+    chave = generate_api_key(settings.API_KEY_LENGTH)
+    linha = ApiKey(
+        key_hash=hash_barato.hash(chave),
+        key_prefix=get_api_key_prefix(chave) if com_prefixo else None,
+        call_limit=campos.pop("call_limit", 10),
+        **campos,
+    )
+    db.add(linha)
+    await db.commit()
+    return linha, chave
+
+
+@pytest.fixture
+def limite_de_varredura(monkeypatch):
+    """Controla o limite de varreduras de chaves antigas sem Redis."""
+    permitido = {"valor": True}
+
+    async def hit(identifier, cost=1):
+        return RateLimitResult(permitido["valor"], 1, 0, 0, 1)
+
+    monkeypatch.setattr(modulo.legacy_scan_limiter, "hit", hit)
+    return permitido
+
+
+def test_encontra_a_chave_pelo_prefixo(with_async_db, limite_de_varredura):
+    async def cenario(db):
+        linha, chave = await criar_chave(db)
+        await criar_chave(db)
+        encontrada = await service.authenticate_api_key(db, chave)
+        assert encontrada is not None and encontrada.id == linha.id
+
+    with_async_db(cenario)
+
+
+def test_recusa_chave_desconhecida_ou_inativa(with_async_db, limite_de_varredura):
+    async def cenario(db):
+        _, chave = await criar_chave(db)
+        _, inativa = await criar_chave(db, is_active=False)
+        assert await service.authenticate_api_key(db, chave[:-1] + "#") is None
+        assert await service.authenticate_api_key(db, inativa) is None
+
+    with_async_db(cenario)
+
+
+def test_chave_antiga_e_migrada_no_primeiro_uso(with_async_db, limite_de_varredura):
+    async def cenario(db):
+        linha, chave = await criar_chave(db, com_prefixo=False)
+        encontrada = await service.authenticate_api_key(db, chave)
+        assert encontrada is not None and encontrada.id == linha.id
+        await db.refresh(linha)
+        assert linha.key_prefix == get_api_key_prefix(chave)
+
+    with_async_db(cenario)
+
+
+def test_varredura_de_chaves_antigas_respeita_o_limite(with_async_db, limite_de_varredura):
+    limite_de_varredura["valor"] = False
+
+    async def cenario(db):
+        linha, chave = await criar_chave(db, com_prefixo=False)
+        assert await service.authenticate_api_key(db, chave) is None
+        await db.refresh(linha)
+        assert linha.key_prefix is None
+
+    with_async_db(cenario)
+
+
+def test_varredura_desativada(with_async_db, limite_de_varredura, monkeypatch):
+    monkeypatch.setattr(settings, "API_KEY_LEGACY_LOOKUP", False)
+
+    async def cenario(db):
+        _, chave = await criar_chave(db, com_prefixo=False)
+        assert await service.authenticate_api_key(db, chave) is None
+
+    with_async_db(cenario)
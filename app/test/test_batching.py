@@ -0,0 +1,80 @@
+import asyncio
+
+from app.services.batching import BatchItemError, MicroBatcher
+
+
+def _lotes_enviados():
+    lotes = []
+
+    async def enviar(itens):
+        lotes.append(list(itens))
+        await asyncio.sleep(0)
+        return [{"error": "falhou"} if item == "ruim" else item.upper() for item in itens]
+
+    return lotes, enviar
+
+
+def test_lote_cheio_e_despachado_sem_esperar_o_prazo():
+    lotes, enviar = _lotes_enviados()
+
+    async def executar():
+        batcher = MicroBatcher(enviar, max_size=3, max_wait=10.0)
+        resultados = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(x) for x in "abc")), timeout=1.0
+        )
+        return resultados, batcher
+
+    resultados, batcher = asyncio.run(executar())
+    assert resultados == ["A", "B", "C"]
+    assert lotes == [["a", "b", "c"]]
+    assert not batcher._dispatches
+
+
+def test_lote_incompleto_sai_no_prazo_e_erros_sao_por_item():
+    lotes, enviar = _lotes_enviados()
+
+    async def executar():
+        batcher = MicroBatcher(enviar, max_size=10, max_wait=0.01)
+        return await asyncio.gather(
+            batcher.submit("a"), batcher.submit("ruim"), return_exceptions=True
+        )
+
+    bom, ruim = asyncio.run(executar())
+    assert bom == "A"
+    assert isinstance(ruim, BatchItemError)
+    assert lotes == [["a", "ruim"]]
+
+
+def test_falha_do_lote_chega_a_todos_os_itens():
+    async def enviar(itens):
+        raise ConnectionError("backend fora")
+
+    async def executar():
+        batcher = MicroBatcher(enviar, max_size=2, max_wait=10.0)
+        return await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+
+    assert all(isinstance(r, ConnectionError) for r in asyncio.run(executar()))
+
+
+def test_despacho_em_curso_e_mantido_ate_terminar():
+    liberar = None
+
+    async def enviar(itens):
+        await liberar.wait()
+        return itens
+
+    async def executar():
+        nonlocal liberar
+        liberar = asyncio.Event()
+        batcher = MicroBatcher(enviar, max_size=1, max_wait=10.0)
+        pendente = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0)
+        em_curso = len(batcher._dispatches)
+        liberar.set()
+        resultado = await pendente
+        await asyncio.sleep(0)
+        return em_curso, resultado, len(batcher._dispatches)
+
+    assert asyncio.run(executar()) == (1, "a", 0)
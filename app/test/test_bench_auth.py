@@ -0,0 +1,38 @@
+import pytest
+
+from app.bench import auth
+from app.bench.auth import BancoNaoPermitidoError, exigir_banco_de_bench
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    monkeypatch.setattr(auth.settings, "BENCH_ALLOW_DB_WRITES", False)
+
+    def configurar(nome: str) -> None:
+        monkeypatch.setattr(auth.settings, "POSTGRES_DB", nome)
+
+    return configurar
+
+
+def test_recusa_banco_que_nao_e_de_bench(banco):
+    banco("brplates")
+    with pytest.raises(BancoNaoPermitidoError, match="--allow-db-writes"):
+        exigir_banco_de_bench()
+
+
+def test_recusa_gravar_chaves_antes_de_tocar_o_banco(banco):
+    banco("brplates")
+    with pytest.raises(BancoNaoPermitidoError):
+        auth.criar_chaves_preenchimento(None, "execucao", 1000)
+
+
+@pytest.mark.parametrize("nome", ["brplates_bench", "BRPLATES_TEST", "test"])
+def test_aceita_banco_de_bench_ou_teste(banco, nome):
+    banco(nome)
+    exigir_banco_de_bench()
+
+
+def test_aceita_qualquer_banco_com_a_opcao_explicita(banco, monkeypatch):
+    banco("brplates")
+    monkeypatch.setattr(auth.settings, "BENCH_ALLOW_DB_WRITES", True)
+    exigir_banco_de_bench()
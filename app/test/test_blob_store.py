@@ -0,0 +1,46 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from app.services.blob_store import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+def test_put_retorna_o_sha256_e_abre_via_mmap(store):
+    ref = store.put(b"conteudo da imagem")
+    assert ref == hashlib.sha256(b"conteudo da imagem").hexdigest()
+    with store.open(ref) as mapped:
+        assert mapped[:] == b"conteudo da imagem"
+
+
+def test_conteudo_identico_ocupa_um_unico_arquivo(store):
+    assert store.put(b"mesma imagem") == store.put(b"mesma imagem")
+    arquivos = [nome for _, _, nomes in os.walk(store.root_dir) for nome in nomes]
+    assert len(arquivos) == 1
+
+
+@pytest.mark.parametrize("ref", ["", "../../etc/passwd", "A" * 64, "0" * 63])
+def test_referencia_invalida_e_recusada(store, ref):
+    with pytest.raises(ValueError):
+        store.path(ref)
+
+
+def test_cleanup_remove_apenas_blobs_antigos(store):
+    antigo = store.put(b"antigo")
+    recente = store.put(b"recente")
+    passado = time.time() - 120
+    os.utime(store.path(antigo), (passado, passado))
+
+    assert store.cleanup(max_age_seconds=60) == 1
+    assert not os.path.exists(store.path(antigo))
+    assert os.path.exists(store.path(recente))
+
+
+def test_delete_de_blob_inexistente_nao_falha(store):
+    store.delete("0" * 64)
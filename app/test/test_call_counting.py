@@ -0,0 +1,65 @@
+from uuid import uuid4
+
+from app.crud.api_key_async import increment_api_key_calls
+from app.db.models import ApiKey
+from app.services.call_counter import BufferedCallCounter
+
+
+async def criar_chave(db, **campos) -> ApiKey:
+    linha = ApiKey(key_hash=uuid4().hex, call_limit=5, calls_made=0, **campos)
+    db.add(linha)
+    await db.commit()
+    return linha
+
+
+def test_incremento_atomico_respeita_o_limite(with_async_db):
+    async def cenario(db):
+        linha = await criar_chave(db)
+        assert await increment_api_key_calls(db, linha.id, 3) == 3
+        assert await increment_api_key_calls(db, linha.id, 2) == 5
+        # Passaria do limite: nada é cobrado
+        assert await increment_api_key_calls(db, linha.id, 1) is None
+        await db.refresh(linha)
+        assert linha.calls_made == 5
+
+    with_async_db(cenario)
+
+
+def test_lote_maior_que_o_saldo_nao_e_cobrado_em_parte(with_async_db):
+    async def cenario(db):
+        linha = await criar_chave(db)
+        await increment_api_key_calls(db, linha.id, 4)
+        assert await increment_api_key_calls(db, linha.id, 2) is None
+        await db.refresh(linha)
+        assert linha.calls_made == 4
+
+    with_async_db(cenario)
+
+
+def test_chave_inativa_nao_e_cobrada(with_async_db):
+    async def cenario(db):
+        linha = await criar_chave(db, is_active=False)
+        assert await increment_api_key_calls(db, linha.id) is None
+        await db.refresh(linha)
+        assert linha.calls_made == 0
+
+    with_async_db(cenario)
+
+
+def test_incrementos_sucessivos_param_no_limite(with_async_db):
+    async def cenario(db):
+        linha = await criar_chave(db)
+        resultados = [await increment_api_key_calls(db, linha.id) for _ in range(8)]
+        assert [r for r in resultados if r is not None] == [1, 2, 3, 4, 5]
+        assert resultados[5:] == [None, None, None]
+
+    with_async_db(cenario)
+
+
+def test_contador_em_memoria_soma_pendentes_ao_conferir_a_quota(monkeypatch):
+    contador = BufferedCallCounter(flush_interval=60)
+    monkeypatch.setattr(contador, "start", lambda: None)
+    assert contador.try_charge(1, calls_made=3, call_limit=5, amount=2) == 5
+    assert contador.try_charge(1, calls_made=3, call_limit=5) is None
+    # Outra chave não é afetada pelos pendentes da primeira
+    assert contador.try_charge(2, calls_made=0, call_limit=5) == 1
@@ -0,0 +1,219 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import circuit_breaker as modulo
+from app.services.batching import BatchItemError
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, is_backend_failure
+
+A = "http://ocr-a.test"
+B = "http://ocr-b.test"
+
+
+class Relogio:
+    """Substitui time.time() do módulo para controlar a janela e o período aberto."""
+
+    def __init__(self, agora: float):
+        self.agora = agora
+
+    def time(self) -> float:
+        return self.agora
+
+    def monotonic(self) -> float:
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio(1_000_000.0)
+    monkeypatch.setattr(modulo, "time", relogio)
+    return relogio
+
+
+@pytest.fixture
+def breaker(patch_redis, relogio):
+    patch_redis(modulo)
+    return CircuitBreaker(
+        enabled=True,
+        window_seconds=30.0,
+        min_requests=3,
+        error_rate=0.5,
+        slow_call_seconds=5.0,
+        open_seconds=10.0,
+    )
+
+
+def registrar(
+    breaker, url: str, *falhas: bool, latencia: float = 0.1, sonda: str | None = None
+) -> None:
+    async def executar():
+        for falhou in falhas:
+            await breaker.record(url, falhou, latencia, sonda)
+
+    asyncio.run(executar())
+
+
+def selecionar(breaker, urls):
+    return asyncio.run(breaker.select(urls))[0]
+
+
+def reservar_sonda(breaker, urls) -> tuple:
+    url, sonda = asyncio.run(breaker.select(urls))
+    assert sonda is not None
+    return url, sonda
+
+
+def test_abre_com_taxa_de_falha_acima_do_limite(breaker):
+    registrar(breaker, A, True, True)
+    assert selecionar(breaker, [A]) == A  # ainda abaixo de min_requests
+    registrar(breaker, A, False)
+    assert selecionar(breaker, [A]) is None
+
+
+def test_falhas_abaixo_da_taxa_nao_abrem(breaker):
+    registrar(breaker, A, True, False, False, False)
+    assert selecionar(breaker, [A]) == A
+
+
+def test_janela_expirada_zera_a_contagem(breaker, relogio):
+    registrar(breaker, A, True, True)
+    relogio.agora += 31
+    registrar(breaker, A, True)
+    assert selecionar(breaker, [A]) == A
+
+
+def test_chamada_lenta_conta_como_falha(breaker):
+    registrar(breaker, A, False, False, False, latencia=6.0)
+    assert selecionar(breaker, [A]) is None
+
+
+def test_replica_aberta_e_pulada(breaker):
+    registrar(breaker, A, True, True, True)
+    assert selecionar(breaker, [A, B]) == B
+
+
+def test_escolhe_a_replica_de_menor_latencia(breaker):
+    registrar(breaker, A, False, latencia=0.5)
+    registrar(breaker, B, False, latencia=0.1)
+    assert selecionar(breaker, [A, B]) == B
+
+
+def test_meio_aberto_libera_uma_sonda_e_fecha_no_sucesso(breaker, relogio):
+    registrar(breaker, A, True, True, True)
+    relogio.agora += 10
+    url, sonda = reservar_sonda(breaker, [A])
+    assert url == A
+    assert selecionar(breaker, [A]) is None  # sonda já reservada
+    registrar(breaker, A, False, sonda=sonda)
+    assert asyncio.run(breaker.select([A])) == (A, None)
+    assert selecionar(breaker, [A]) == A
+
+
+def test_sonda_com_falha_reabre(breaker, relogio):
+    registrar(breaker, A, True, True, True)
+    relogio.agora += 10
+    _, sonda = reservar_sonda(breaker, [A])
+    registrar(breaker, A, True, sonda=sonda)
+    relogio.agora += 5
+    assert selecionar(breaker, [A]) is None
+
+
+def test_sucesso_atrasado_que_nao_e_a_sonda_nao_fecha(breaker, relogio):
+    registrar(breaker, A, True, True, True)
+    relogio.agora += 10
+    # Chamada iniciada antes da abertura que só termina no período meio aberto
+    registrar(breaker, A, False)
+    _, sonda = reservar_sonda(breaker, [A])
+    registrar(breaker, A, False)
+    assert selecionar(breaker, [A]) is None
+    registrar(breaker, A, False, sonda=sonda)
+    assert selecionar(breaker, [A]) == A
+
+
+def test_sonda_vencida_nao_fecha_depois_de_outra_ser_reservada(breaker, relogio):
+    registrar(breaker, A, True, True, True)
+    relogio.agora += 10
+    _, antiga = reservar_sonda(breaker, [A])
+    relogio.agora += 10  # reserva da sonda venceu sem resultado
+    _, nova = reservar_sonda(breaker, [A])
+    assert nova != antiga
+    registrar(breaker, A, False, sonda=antiga)
+    assert selecionar(breaker, [A]) is None
+    registrar(breaker, A, False, sonda=nova)
+    assert selecionar(breaker, [A]) == A
+
+
+def test_call_levanta_circuit_open_sem_chamar(breaker):
+    registrar(breaker, A, True, True, True)
+    chamadas = []
+
+    async def func(url):
+        chamadas.append(url)
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call([A], func))
+    assert chamadas == []
+
+
+def _cancelar(breaker, relogio, duracao: float) -> None:
+    """Chama a réplica e cancela a chamada depois de 'duracao' segundos."""
+
+    async def executar():
+        iniciada = asyncio.Event()
+
+        async def lenta(url):
+            relogio.agora += duracao
+            iniciada.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(breaker.call([A], lenta))
+        await iniciada.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(executar())
+
+
+def test_cancelamento_depois_do_limite_de_lentidao_conta_como_falha(breaker, relogio):
+    for _ in range(3):
+        _cancelar(breaker, relogio, duracao=6.0)
+    assert selecionar(breaker, [A]) is None
+
+
+def test_cancelamento_rapido_nao_e_contado(breaker, relogio, fake_redis):
+    for _ in range(3):
+        _cancelar(breaker, relogio, duracao=1.0)
+    assert selecionar(breaker, [A]) == A
+    assert not fake_redis.exists(f"plate:circuit:{A}")
+
+
+def test_sonda_cancelada_por_lentidao_reabre(breaker, relogio):
+    registrar(breaker, A, True, True, True)
+    relogio.agora += 10
+    _cancelar(breaker, relogio, duracao=6.0)
+    # A reserva da sonda já venceu, mas o circuito foi reaberto no cancelamento
+    relogio.agora += 5
+    assert selecionar(breaker, [A]) is None
+
+
+def test_redis_indisponivel_usa_a_replica_principal(breaker, monkeypatch):
+    def indisponivel():
+        raise ConnectionError("Redis fora do ar")
+
+    monkeypatch.setattr(modulo, "get_async_redis", indisponivel)
+    assert asyncio.run(breaker.select([A, B])) == (A, None)
+    registrar(breaker, A, True)  # não levanta
+
+
+def test_is_backend_failure():
+    request = httpx.Request("POST", A)
+    assert is_backend_failure(httpx.ConnectTimeout("timeout", request=request))
+    assert is_backend_failure(
+        httpx.HTTPStatusError("503", request=request, response=httpx.Response(503))
+    )
+    assert not is_backend_failure(
+        httpx.HTTPStatusError("422", request=request, response=httpx.Response(422))
+    )
+    assert not is_backend_failure(BatchItemError("item inválido"))
@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.http_client import post_with_retry
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_RETRIES", 2)
+    monkeypatch.setattr(settings, "HTTP_RETRY_BACKOFF_SECONDS", 0.0)
+
+
+def _executar(respostas):
+    """
+    Faz o POST contra um transporte simulado que devolve (ou levanta) cada item
+    de 'respostas' em sequência. Retorna (resposta ou exceção, nº de tentativas).
+    """
+    tentativas = []
+
+    def responder(request):
+        item = respostas[len(tentativas)]
+        tentativas.append(request)
+        if isinstance(item, Exception):
+            raise item
+        return httpx.Response(item)
+
+    async def executar():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(responder)) as client:
+            try:
+                return await post_with_retry(client, "http://backend.test/ocr", content=b"x")
+            except httpx.HTTPError as e:
+                return e
+
+    return asyncio.run(executar()), len(tentativas)
+
+
+def test_5xx_e_repetido_ate_o_sucesso():
+    resp, tentativas = _executar([503, 502, 200])
+    assert resp.status_code == 200
+    assert tentativas == 3
+
+
+def test_5xx_persistente_devolve_a_ultima_resposta():
+    resp, tentativas = _executar([500, 500, 500])
+    assert resp.status_code == 500
+    assert tentativas == 3
+
+
+def test_4xx_nao_e_repetido():
+    resp, tentativas = _executar([422])
+    assert resp.status_code == 422
+    assert tentativas == 1
+
+
+@pytest.mark.parametrize("erro", [httpx.ConnectError, httpx.ConnectTimeout])
+def test_falha_ao_conectar_e_repetida(erro):
+    resp, tentativas = _executar([erro("recusada"), 200])
+    assert resp.status_code == 200
+    assert tentativas == 2
+
+
+def test_falha_ao_conectar_persistente_e_repassada():
+    erro, tentativas = _executar([httpx.ConnectError("recusada")] * 3)
+    assert isinstance(erro, httpx.ConnectError)
+    assert tentativas == 3
+
+
+@pytest.mark.parametrize(
+    "erro", [httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout, httpx.ReadError]
+)
+def test_timeouts_apos_conectar_nao_sao_repetidos(erro):
+    resultado, tentativas = _executar([erro("sem resposta"), 200])
+    assert isinstance(resultado, erro)
+    assert tentativas == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.ocr import executar_cascata_ocr, validar_resultado_ocr
+
+
+@pytest.fixture(autouse=True)
+def validacao_ativa(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PLATE_VALIDATION", True)
+    monkeypatch.setattr(settings, "OCR_MIN_CONFIDENCE", 0.8)
+
+
+def leitura(*placas, confianca=None) -> dict:
+    results = [
+        {"plate": placa, **({"confidence": confianca} if confianca is not None else {})}
+        for placa in placas
+    ]
+    return {"placa": placas[0] if placas else None, "results": results}
+
+
+def _cascata(respostas: dict, grace_period: float, hedge_delay: float = 0.0):
+    """Executa a cascata com backends simulados: url -> (atraso, resultado)."""
+
+    async def chamar(categoria, url, timeout):
+        atraso, resultado = respostas[url]
+        await asyncio.sleep(atraso)
+        return resultado
+
+    tentativas = [(url, None, 30.0) for url in respostas]
+    return asyncio.run(executar_cascata_ocr(chamar, tentativas, hedge_delay, grace_period))
+
+
+def test_cascata_respeita_prioridade_dentro_da_tolerancia():
+    prioritaria = validar_resultado_ocr(leitura("AAA1111"))
+    secundaria = validar_resultado_ocr(leitura("BBB2222"))
+    resultado = _cascata(
+        {"ezocr": (0.05, prioritaria), "ocr": (0.0, secundaria)}, grace_period=1.0
+    )
+    assert resultado is prioritaria
+
+
+def test_cascata_nao_espera_backend_travado_alem_da_tolerancia():
+    travada = validar_resultado_ocr(leitura("AAA1111"))
+    secundaria = validar_resultado_ocr(leitura("BBB2222"))
+    resultado = _cascata(
+        {"ezocr": (10.0, travada), "ocr": (0.0, secundaria)}, grace_period=0.05
+    )
+    assert resultado is secundaria
+
+
+def test_cascata_sem_resultado_aceitavel_usa_o_melhor():
+    invalida = validar_resultado_ocr(leitura("AB-12"))
+    baixa_confianca = validar_resultado_ocr(leitura("ABC1234", confianca=0.3))
+    resultado = _cascata(
+        {"ezocr": (0.0, invalida), "ocr": (0.0, baixa_confianca)}, grace_period=0.05
+    )
+    assert resultado is baixa_confianca
+
+
+def test_cascata_nao_dispara_a_proxima_se_a_primeira_responde_antes_do_hedge():
+    chamadas = []
+    prioritaria = validar_resultado_ocr(leitura("AAA1111"))
+
+    async def chamar(categoria, url, timeout):
+        chamadas.append(url)
+        return prioritaria
+
+    tentativas = [("ezocr", None, 30.0), ("ocr", None, 30.0)]
+    resultado = asyncio.run(
+        executar_cascata_ocr(chamar, tentativas, hedge_delay=1.0, grace_period=1.0)
+    )
+    assert resultado is prioritaria
+    assert chamadas == ["ezocr"]
@@ -0,0 +1,73 @@
+import pytest
+
+from app.core.config import settings
+from app.services.ocr import (
+    melhor_resultado,
+    resultado_aceitavel,
+    validar_resultado_ocr,
+)
+
+
+@pytest.fixture(autouse=True)
+def validacao_ativa(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PLATE_VALIDATION", True)
+    monkeypatch.setattr(settings, "OCR_MIN_CONFIDENCE", 0.8)
+
+
+def leitura(*placas, confianca=None) -> dict:
+    results = [
+        {"plate": placa, **({"confidence": confianca} if confianca is not None else {})}
+        for placa in placas
+    ]
+    return {"placa": placas[0] if placas else None, "results": results}
+
+
+def test_validar_resultado_corrige_e_ordena_alternativas():
+    resultado = validar_resultado_ocr(
+        {
+            "placa": "ABC12O4",
+            "results": [
+                {"plate": "ABC12O4", "confidence": 0.95},
+                {"plate": "XYZ1A23", "confidence": 0.85},
+            ],
+        }
+    )
+    assert resultado["placa"] == "XYZ1A23"
+    assert resultado["alternativas"] == ["ABC1204"]
+    assert resultado["valida"] is True
+    assert resultado["confianca"] == 0.85
+
+
+def test_validar_resultado_sem_placa_valida_mantem_leitura():
+    bruto = leitura("AB-12")
+    resultado = validar_resultado_ocr(bruto)
+    assert resultado["placa"] == "AB-12"
+    assert resultado["valida"] is False
+    assert resultado["confianca"] is None
+
+
+def test_validar_resultado_desativado_devolve_o_bruto(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_PLATE_VALIDATION", False)
+    bruto = leitura("AB-12")
+    assert validar_resultado_ocr(bruto) is bruto
+
+
+@pytest.mark.parametrize(
+    "confianca, aceitavel",
+    [(None, True), (0.8, True), (0.95, True), (0.5, False)],
+)
+def test_resultado_aceitavel_pela_confianca(confianca, aceitavel):
+    resultado = validar_resultado_ocr(leitura("ABC1234", confianca=confianca))
+    assert resultado_aceitavel(resultado) is aceitavel
+
+
+def test_resultado_invalido_nao_e_aceitavel():
+    assert not resultado_aceitavel(validar_resultado_ocr(leitura("AB-12")))
+
+
+def test_melhor_resultado_prefere_placa_valida_a_leitura_qualquer():
+    invalida = validar_resultado_ocr(leitura("AB-12"))
+    baixa_confianca = validar_resultado_ocr(leitura("ABC1234", confianca=0.3))
+    assert melhor_resultado([invalida, baixa_confianca]) is baixa_confianca
+    assert melhor_resultado([invalida]) is invalida
+    assert melhor_resultado([]) == {"placa": None, "results": []}
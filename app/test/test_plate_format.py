@@ -0,0 +1,85 @@
+import pytest
+
+from app.services.plate_format import corrigir_placa, normalizar_placa, ranquear_placas
+
+
+def test_normalizar_placa_remove_separadores():
+    assert normalizar_placa("abc-1d23") == "ABC1D23"
+    assert normalizar_placa(" abc 1234 ") == "ABC1234"
+    assert normalizar_placa(None) == ""
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [
+        ("ABC1234", ("ABC1234", 0)),  # modelo antigo
+        ("ABC1D23", ("ABC1D23", 0)),  # Mercosul
+        ("abc-1234", ("ABC1234", 0)),
+        ("ABC12O4", ("ABC1204", 1)),  # O lido no lugar de 0
+        ("A8C1234", ("ABC1234", 1)),  # 8 lido no lugar de B
+        ("0BC1Z34", ("OBC1Z34", 1)),  # quinta posição aceita letra ou dígito
+        ("5BC1S3B", ("SBC1S38", 2)),
+    ],
+)
+def test_corrigir_placa(texto, esperado):
+    assert corrigir_placa(texto) == esperado
+
+
+@pytest.mark.parametrize(
+    "texto",
+    [
+        None,
+        "",
+        "ABC123",  # curta
+        "ABC12345",  # longa
+        "3BC1234",  # 3 não tem letra correspondente
+        "ABCX234",  # X não tem dígito correspondente
+    ],
+)
+def test_corrigir_placa_sem_correcao(texto):
+    assert corrigir_placa(texto) == (None, 0)
+
+
+def test_ranquear_placas_prefere_menos_trocas_e_maior_confianca():
+    results = [
+        {"plate": "ABC12O4", "confidence": 0.99},  # uma troca
+        {"plate": "XYZ9876", "confidence": 0.70},
+        {"plate": "QWE1A23", "confidence": 0.90},
+    ]
+    assert ranquear_placas(results) == [
+        ("QWE1A23", 0, 0.90),
+        ("XYZ9876", 0, 0.70),
+        ("ABC1204", 1, 0.99),
+    ]
+
+
+def test_ranquear_placas_inclui_candidatos_e_normaliza_confianca():
+    results = [
+        {
+            "plate": "ABC",  # inválida, descartada
+            "score": 80,
+            "candidates": [
+                {"plate": "ABC1234", "score": 95},
+                {"plate": "ABD1234", "conf": 0.5},
+            ],
+        }
+    ]
+    assert ranquear_placas(results) == [("ABC1234", 0, 0.95), ("ABD1234", 0, 0.5)]
+
+
+def test_ranquear_placas_sem_repeticao_guarda_melhor_leitura():
+    results = [
+        {"plate": "ABC1234"},
+        {"plate": "ABC-1234", "confidence": 0.9},
+        {"plate": "A8C1234", "confidence": 1.0},  # mesma placa, com troca
+    ]
+    assert ranquear_placas(results) == [("ABC1234", 0, 0.9)]
+
+
+def test_ranquear_placas_empate_mantem_ordem_do_ocr():
+    results = [{"plate": "BBB2222"}, {"plate": "AAA1111"}]
+    assert [placa for placa, _, _ in ranquear_placas(results)] == ["BBB2222", "AAA1111"]
+
+
+def test_ranquear_placas_sem_leitura_valida():
+    assert ranquear_placas([{"plate": "???"}, {"candidates": []}, {}]) == []
@@ -0,0 +1,111 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.core import rate_limit
+from app.core.api_key_cache import verified_key_cache
+from app.core.rate_limit import RateLimitMiddleware, TokenBucketRateLimiter
+
+
+@pytest.fixture
+def limiter(patch_redis):
+    patch_redis(rate_limit)
+    return TokenBucketRateLimiter(rate=1.0, burst=3, key_prefix="ratelimit:test")
+
+
+def hits(limiter, identifier: str, n: int, cost: int = 1):
+    async def executar():
+        return [await limiter.hit(identifier, cost) for _ in range(n)]
+
+    return asyncio.run(executar())
+
+
+def test_permite_ate_o_burst_e_depois_recusa(limiter):
+    resultados = hits(limiter, "chave", 4)
+    assert [r.allowed for r in resultados] == [True, True, True, False]
+    assert [r.remaining for r in resultados[:3]] == [2, 1, 0]
+    recusado = resultados[-1]
+    assert recusado.retry_after_seconds == 1
+    assert recusado.headers()["Retry-After"] == "1"
+    assert recusado.headers()["X-RateLimit-Limit"] == "3"
+
+
+def test_identificadores_tem_baldes_independentes(limiter):
+    assert all(r.allowed for r in hits(limiter, "a", 3))
+    assert hits(limiter, "b", 1)[0].allowed
+
+
+def test_custo_maior_que_as_fichas_e_recusado_sem_consumir(limiter):
+    assert not hits(limiter, "lote", 1, cost=5)[0].allowed
+    assert hits(limiter, "lote", 1, cost=3)[0].allowed
+
+
+def test_fichas_voltam_com_o_tempo(limiter, fake_redis):
+    hits(limiter, "chave", 3)
+    assert not hits(limiter, "chave", 1)[0].allowed
+    # Simula dois segundos sem requisições recuando o horário da última recarga
+    key = "ratelimit:test:chave"
+    ts = float(fake_redis.hget(key, "ts"))
+    fake_redis.hset(key, "ts", ts - 2)
+    resultados = hits(limiter, "chave", 3)
+    assert [r.allowed for r in resultados] == [True, True, False]
+
+
+def test_balde_expira_depois_de_encher(limiter, fake_redis):
+    hits(limiter, "chave", 1)
+    assert 0 < fake_redis.ttl("ratelimit:test:chave") <= 4
+
+
+@pytest.fixture
+def cliente(patch_redis):
+    from fastapi.testclient import TestClient
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    patch_redis(rate_limit)
+
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/", ok)])
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=TokenBucketRateLimiter(rate=0.01, burst=3, key_prefix="ratelimit:key"),
+        ip_limiter=TokenBucketRateLimiter(rate=0.01, burst=2, key_prefix="ratelimit:ip"),
+    )
+    return TestClient(app)
+
+
+def status(cliente, n: int, chave=None) -> list[int]:
+    """Status de n requisições; 'chave' pode ser uma função (chave nova a cada vez)."""
+    codigos = []
+    for _ in range(n):
+        valor = chave() if callable(chave) else chave
+        headers = {"X-API-Key": valor} if valor else {}
+        codigos.append(cliente.get("/", headers=headers).status_code)
+    return codigos
+
+
+def test_sem_chave_usa_o_balde_do_ip(cliente):
+    assert status(cliente, 3) == [200, 200, 429]
+
+
+def test_chaves_aleatorias_compartilham_o_balde_do_ip(cliente):
+    assert status(cliente, 3, lambda: uuid4().hex) == [200, 200, 429]
+
+
+def test_chave_verificada_usa_o_proprio_balde(cliente):
+    verified_key_cache.set("chave-boa", 1, "hash")
+    # O IP já esgotou o balde com chaves inválidas; a chave verificada não é afetada
+    status(cliente, 3, "invalida")
+    assert status(cliente, 4, "chave-boa") == [200, 200, 200, 429]
+
+
+def test_redis_indisponivel_libera_a_requisicao(cliente, monkeypatch):
+    def indisponivel():
+        raise ConnectionError("Redis fora do ar")
+
+    monkeypatch.setattr(rate_limit, "get_async_redis", indisponivel)
+    assert status(cliente, 5) == [200] * 5
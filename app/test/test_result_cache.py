@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.services import result_cache
+from app.services.result_cache import PlateResultCache
+
+
+@pytest.fixture
+def cache(patch_redis):
+    patch_redis(result_cache)
+    return PlateResultCache(ttl_seconds=60, max_entries=10, inflight_ttl_seconds=60)
+
+
+def test_resultado_de_uma_chave_nao_e_visto_por_outra(cache):
+    cache.store(1, "ref", "task-1", "ABC1D23", ["ABC1023"])
+
+    async def executar():
+        return await cache.get(1, "ref"), await cache.get(2, "ref"), await cache.get(None, "ref")
+
+    da_dona, de_outra, sem_chave = asyncio.run(executar())
+    assert da_dona == {"task_id": "task-1", "placa": "ABC1D23", "alternativas": ["ABC1023"]}
+    assert de_outra is None
+    assert sem_chave is None
+
+
+def test_get_many_respeita_o_escopo_da_chave(cache):
+    cache.store(1, "a", "task-a", "AAA1111", [])
+    cache.store(2, "b", "task-b", "BBB2222", [])
+
+    async def executar():
+        return await cache.get_many(1, ["a", "b"]), await cache.get_many(2, ["a", "b"])
+
+    da_chave_1, da_chave_2 = asyncio.run(executar())
+    assert [r and r["task_id"] for r in da_chave_1] == ["task-a", None]
+    assert [r and r["task_id"] for r in da_chave_2] == [None, "task-b"]
+
+
+def test_claim_em_curso_nao_e_compartilhado_entre_chaves(cache):
+    async def executar():
+        return (
+            await cache.claim(1, "ref", "task-1"),
+            await cache.claim(2, "ref", "task-2"),
+            await cache.claim(1, "ref", "task-3"),
+            await cache.claim(2, "ref", "task-4"),
+        )
+
+    assert asyncio.run(executar()) == (None, None, "task-1", "task-2")
+
+
+def test_claim_many_respeita_o_escopo_e_repeticoes_no_lote(cache):
+    async def executar():
+        await cache.claim(1, "a", "task-1a")
+        return await cache.claim_many(2, [("a", "task-2a"), ("b", "task-2b"), ("a", "task-2c")])
+
+    assert asyncio.run(executar()) == [None, None, "task-2a"]
+
+
+def test_store_e_release_liberam_so_o_registro_da_propria_chave(cache, fake_redis):
+    async def reservar():
+        await cache.claim(1, "ref", "task-1")
+        await cache.claim(2, "ref", "task-2")
+
+    asyncio.run(reservar())
+    cache.store(1, "ref", "task-1", "ABC1D23", [])
+    assert not fake_redis.exists("plate:inflight:1:ref")
+    assert fake_redis.get("plate:inflight:2:ref") == b"task-2"
+
+    asyncio.run(cache.release(2, "ref"))
+    assert not fake_redis.exists("plate:inflight:2:ref")
+
+
+def test_limite_de_entradas_descarta_as_mais_antigas(patch_redis, fake_redis):
+    patch_redis(result_cache)
+    cache = PlateResultCache(ttl_seconds=60, max_entries=2, inflight_ttl_seconds=60)
+    for i, chave in enumerate([1, 2, 1]):
+        cache.store(chave, f"ref{i}", f"task-{i}", None, [])
+
+    assert not fake_redis.exists("plate:result:1:ref0")
+    assert fake_redis.exists("plate:result:2:ref1")
+    assert fake_redis.exists("plate:result:1:ref2")
@@ -0,0 +1,100 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.services import plate_service as modulo
+from app.services.blob_store import BlobStore
+from app.services.plate_service import PlateService
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(modulo, "blob_store", store)
+    monkeypatch.setattr(modulo.settings, "BULK_MAX_ITEMS", 5)
+    return store
+
+
+def _upload(nome: str, conteudo: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(conteudo), filename=nome)
+
+
+def _zip(membros: dict) -> UploadFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("subdir/", b"")
+        for nome, conteudo in membros.items():
+            archive.writestr(nome, conteudo)
+    buffer.seek(0)
+    return UploadFile(buffer, filename="lote.zip")
+
+
+def _tar(membros: dict, mode: str = "w:gz") -> UploadFile:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for nome, conteudo in membros.items():
+            info = tarfile.TarInfo(nome)
+            info.size = len(conteudo)
+            archive.addfile(info, io.BytesIO(conteudo))
+    buffer.seek(0)
+    return UploadFile(buffer, filename="lote.tar.gz")
+
+
+def test_arquivos_e_zip_sao_gravados_na_ordem_e_invalidos_rejeitados(store):
+    staged, rejected = PlateService().stage_batch(
+        [_upload("a.jpg", JPEG)], _zip({"b.png": PNG, "leia-me.txt": b"texto"})
+    )
+    assert [(i, nome, tipo) for i, nome, _, tipo in staged] == [
+        (0, "a.jpg", "image/jpeg"),
+        (1, "b.png", "image/png"),
+    ]
+    with store.open(staged[1][2]) as mapped:
+        assert mapped[:] == PNG
+    assert [(r.index, r.filename, r.status) for r in rejected] == [
+        (2, "leia-me.txt", "rejected")
+    ]
+
+
+@pytest.mark.parametrize("mode", ["w", "w:gz", "w:bz2"])
+def test_tar_com_e_sem_compressao(mode):
+    staged, rejected = PlateService().stage_batch([], _tar({"a.jpg": JPEG, "b.jpg": JPEG}, mode))
+    assert [nome for _, nome, _, _ in staged] == ["a.jpg", "b.jpg"]
+    # Conteúdos idênticos compartilham a mesma referência
+    assert staged[0][2] == staged[1][2]
+    assert rejected == []
+
+
+def test_imagem_acima_do_limite_e_rejeitada_sem_derrubar_o_lote(monkeypatch):
+    monkeypatch.setattr(modulo.settings, "MAX_UPLOAD_BYTES", 100)
+    staged, rejected = PlateService().stage_batch(
+        [_upload("grande.jpg", JPEG * 2), _upload("ok.jpg", JPEG)], None
+    )
+    assert [nome for _, nome, _, _ in staged] == ["ok.jpg"]
+    assert [(r.index, r.filename) for r in rejected] == [(0, "grande.jpg")]
+
+
+def test_lote_acima_de_bulk_max_items_e_recusado():
+    arquivos = [_upload(f"{i}.jpg", JPEG) for i in range(3)]
+    with pytest.raises(HTTPException) as exc:
+        PlateService().stage_batch(arquivos, _zip({f"z{i}.jpg": JPEG for i in range(3)}))
+    assert exc.value.status_code == 400
+    assert "5" in exc.value.detail
+
+
+def test_lote_no_limite_de_bulk_max_items_e_aceito():
+    staged, _ = PlateService().stage_batch(
+        [_upload(f"{i}.jpg", JPEG) for i in range(5)], None
+    )
+    assert len(staged) == 5
+
+
+def test_arquivo_compactado_invalido_e_recusado():
+    with pytest.raises(HTTPException) as exc:
+        PlateService().stage_batch([], _upload("lote.zip", b"nao e um arquivo compactado" * 40))
+    assert exc.value.status_code == 400
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import plates
+from app.core.dependencies import get_authenticated_api_key
+from app.schemas.api_key import ApiKeyInDB
+from app.schemas.plate import TaskStatusResponse
+from app.services import plate_service as modulo
+from app.services import task_status
+from app.services.task_status import owned_task_ids, record_task_owner
+
+
+def _chave(api_key_id: int) -> ApiKeyInDB:
+    return ApiKeyInDB(
+        id=api_key_id,
+        key_hash="hash",
+        call_limit=100,
+        calls_made=0,
+        is_active=True,
+        created_at=datetime(2026, 1, 1),
+    )
+
+
+@pytest.fixture
+def registro(patch_redis):
+    patch_redis(task_status)
+
+    async def registrar():
+        await record_task_owner(1, ["t1", "t2"])
+        await record_task_owner(2, ["t3"])
+
+    asyncio.run(registrar())
+
+
+def test_owned_task_ids_filtra_pela_chave_e_mantem_a_ordem(registro, fake_redis):
+    async def consultar():
+        return (
+            await owned_task_ids(1, ["t3", "t2", "desconhecida", "t1"]),
+            await owned_task_ids(2, ["t1", "t3"]),
+            await owned_task_ids(1, []),
+        )
+
+    assert asyncio.run(consultar()) == (["t2", "t1"], ["t3"], [])
+    assert 0 < fake_redis.ttl("plate:task-owner:t1") <= task_status.settings.TASK_OWNER_TTL_SECONDS
+
+
+@pytest.fixture
+def cliente(registro, monkeypatch):
+    consultadas = []
+
+    def status_de(task_id):
+        consultadas.append(task_id)
+        return TaskStatusResponse(task_id=task_id, status="success", placa="ABC1D23")
+
+    monkeypatch.setattr(task_status, "get_task_status", status_de)
+    monkeypatch.setattr(
+        task_status, "get_task_statuses", lambda task_ids: [status_de(t) for t in task_ids]
+    )
+
+    async def autenticar(x_api_key: str | None = Header(None, alias="X-API-Key")):
+        if x_api_key not in ("chave-1", "chave-2"):
+            raise HTTPException(status_code=401)
+        return _chave(int(x_api_key[-1]))
+
+    app = FastAPI()
+    app.include_router(plates.router, prefix="/api/v1")
+    app.dependency_overrides[get_authenticated_api_key] = autenticar
+    with TestClient(app) as client:
+        client.consultadas = consultadas
+        yield client
+
+
+def test_status_exige_chave(cliente):
+    assert cliente.get("/api/v1/tasks/t1").status_code == 401
+    assert cliente.post("/api/v1/tasks/status", json={"task_ids": ["t1"]}).status_code == 401
+    assert cliente.consultadas == []
+
+
+def test_status_de_task_propria(cliente):
+    resp = cliente.get("/api/v1/tasks/t1", headers={"X-API-Key": "chave-1"})
+    assert resp.status_code == 200
+    assert resp.json()["placa"] == "ABC1D23"
+
+
+def test_status_de_task_de_outra_chave_e_404(cliente):
+    resp = cliente.get("/api/v1/tasks/t3", headers={"X-API-Key": "chave-1"})
+    assert resp.status_code == 404
+    assert cliente.consultadas == []
+
+
+def test_status_em_lote_devolve_so_as_tasks_da_chave(cliente):
+    resp = cliente.post(
+        "/api/v1/tasks/status",
+        json={"task_ids": ["t3", "t2", "t1", "desconhecida"]},
+        headers={"X-API-Key": "chave-1"},
+    )
+    assert resp.status_code == 200
+    assert [item["task_id"] for item in resp.json()] == ["t2", "t1"]
+    assert cliente.consultadas == ["t2", "t1"]
+
+
+def test_status_em_lote_sem_tasks_da_chave_e_vazio(cliente):
+    resp = cliente.post(
+        "/api/v1/tasks/status", json={"task_ids": ["t1"]}, headers={"X-API-Key": "chave-2"}
+    )
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+def test_envio_registra_a_chave_antes_de_enfileirar(registro, fake_redis, monkeypatch):
+    monkeypatch.setattr(modulo.settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(modulo.settings, "NOTIFY_ENABLED", False)
+    servico = modulo.PlateService()
+    donos_ao_enfileirar = []
+
+    def enfileirar(blob_ref, filename, content_type, task_id=None, api_key=None):
+        donos_ao_enfileirar.append(fake_redis.get(f"plate:task-owner:{task_id}"))
+        return SimpleNamespace(id=task_id)
+
+    monkeypatch.setattr(servico, "_enqueue", enfileirar)
+
+    async def enviar():
+        return await servico.process_plate_image("0" * 64, "a.jpg", "image/jpeg", api_key=_chave(7))
+
+    resposta = asyncio.run(enviar())
+    assert resposta.task_id
+    assert donos_ao_enfileirar == [b"7"]
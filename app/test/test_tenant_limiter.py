@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from app.services import queues
+from app.services.queues import TENANT_IN_FLIGHT_KEY, TenantInFlightLimiter
+
+
+@pytest.fixture
+def limiter(patch_redis):
+    patch_redis(queues)
+    return TenantInFlightLimiter(max_in_flight=2, ttl_seconds=60)
+
+
+def test_limita_tasks_simultaneas_por_chave(limiter):
+    assert limiter.acquire(1, "t1")
+    assert limiter.acquire(1, "t2")
+    assert not limiter.acquire(1, "t3")
+    # Outra chave tem as próprias vagas
+    assert limiter.acquire(2, "t4")
+
+
+def test_task_que_ja_tem_a_vaga_a_mantem(limiter):
+    assert limiter.acquire(1, "t1")
+    assert limiter.acquire(1, "t2")
+    # Mensagem reentregue da mesma task
+    assert limiter.acquire(1, "t1")
+
+
+def test_release_libera_a_vaga(limiter, fake_redis):
+    limiter.acquire(1, "t1")
+    limiter.acquire(1, "t2")
+    limiter.release(1, "t1")
+    assert fake_redis.zrange(TENANT_IN_FLIGHT_KEY.format(api_key_id=1), 0, -1) == [b"t2"]
+    assert limiter.acquire(1, "t3")
+
+
+def test_vagas_vencidas_sao_descartadas(limiter, fake_redis):
+    key = TENANT_IN_FLIGHT_KEY.format(api_key_id=1)
+    # Vagas de um worker que morreu sem devolvê-las
+    antigo = time.time() - 120
+    fake_redis.zadd(key, {"morta1": antigo, "morta2": antigo})
+    assert limiter.acquire(1, "t1")
+    assert fake_redis.zrange(key, 0, -1) == [b"t1"]
+    assert 0 < fake_redis.ttl(key) <= 60
+
+
+def test_limite_zero_desativa(patch_redis, fake_redis):
+    patch_redis(queues)
+    limiter = TenantInFlightLimiter(max_in_flight=0, ttl_seconds=60)
+    assert all(limiter.acquire(1, f"t{i}") for i in range(10))
+    limiter.release(1, "t1")
+    assert fake_redis.keys() == []
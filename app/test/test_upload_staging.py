@@ -0,0 +1,149 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from app.core.upload_limit import UploadSizeLimitMiddleware
+from app.services import plate_service as modulo
+from app.services.blob_store import BlobStore, BlobTooLargeError
+from app.services.plate_service import PlateService, sniff_image_type
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+
+
+@pytest.mark.parametrize(
+    "head, esperado",
+    [
+        (JPEG, "image/jpeg"),
+        (PNG, "image/png"),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"GIF89a\x01\x00", "image/gif"),
+        (b"II*\x00\x08\x00", "image/tiff"),
+        (b"MM\x00*\x00\x08", "image/tiff"),
+        (b"BM\x00\x00", "image/bmp"),
+        (b"%PDF-1.7", None),
+        (b"RIFF\x00\x00\x00\x00WAVE", None),
+        (b"", None),
+    ],
+)
+def test_sniff_image_type(head, esperado):
+    assert sniff_image_type(head) == esperado
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(modulo, "blob_store", store)
+    return store
+
+
+def _arquivos(store):
+    return [nome for _, _, nomes in os.walk(store.root_dir) for nome in nomes]
+
+
+def test_put_stream_no_limite_grava_o_conteudo(store):
+    conteudo = b"x" * 200_000  # vários blocos de CHUNK_SIZE
+    ref = store.put_stream(io.BytesIO(conteudo[4:]), len(conteudo), head=conteudo[:4])
+    with store.open(ref) as mapped:
+        assert mapped[:] == conteudo
+
+
+def test_put_stream_acima_do_limite_descarta_o_temporario(store):
+    with pytest.raises(BlobTooLargeError):
+        store.put_stream(io.BytesIO(b"x" * 200_001), 200_000)
+    assert _arquivos(store) == []
+
+
+def test_stage_usa_o_tipo_identificado_e_nao_o_declarado(store):
+    upload = UploadFile(
+        io.BytesIO(JPEG),
+        filename="placa.png",
+        headers=Headers({"content-type": "image/png"}),
+    )
+    blob_ref, content_type = asyncio.run(PlateService().stage(upload))
+    assert content_type == "image/jpeg"
+    with store.open(blob_ref) as mapped:
+        assert mapped[:] == JPEG
+
+
+def test_stage_recusa_conteudo_que_nao_e_imagem(store):
+    upload = UploadFile(
+        io.BytesIO(b"%PDF-1.7 ..."),
+        filename="placa.jpg",
+        headers=Headers({"content-type": "image/jpeg"}),
+    )
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(PlateService().stage(upload))
+    assert exc.value.status_code == 400
+    assert _arquivos(store) == []
+
+
+def test_stage_recusa_imagem_acima_de_max_upload_bytes(store, monkeypatch):
+    monkeypatch.setattr(modulo.settings, "MAX_UPLOAD_BYTES", 100)
+    with pytest.raises(HTTPException) as exc:
+        PlateService().stage_upload(io.BytesIO(JPEG * 2))
+    assert exc.value.status_code == 413
+
+
+@pytest.fixture
+def cliente():
+    app = FastAPI()
+    recebidos = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        recebidos.append(await file.read())
+        return {"ok": True}
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_body_bytes=1024)
+    with TestClient(app) as client:
+        client.recebidos = recebidos
+        yield client
+
+
+def _multipart(tamanho: int) -> tuple[bytes, str]:
+    boundary = "limite"
+    corpo = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="placa.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + b"x" * tamanho + f"\r\n--{boundary}--\r\n".encode()
+    return corpo, f"multipart/form-data; boundary={boundary}"
+
+
+def test_content_length_acima_do_limite_e_recusado_sem_ler_o_corpo(cliente):
+    corpo, content_type = _multipart(2048)
+    resposta = cliente.post(
+        "/upload", content=corpo, headers={"content-type": content_type}
+    )
+    assert resposta.status_code == 413
+    assert cliente.recebidos == []
+
+
+def test_corpo_chunked_acima_do_limite_e_interrompido_com_413(cliente):
+    corpo, content_type = _multipart(4096)
+
+    def em_blocos():
+        for i in range(0, len(corpo), 256):
+            yield corpo[i : i + 256]
+
+    resposta = cliente.post(
+        "/upload", content=em_blocos(), headers={"content-type": content_type}
+    )
+    assert resposta.status_code == 413
+    assert resposta.json()["detail"] == "Arquivo enviado excede o tamanho máximo permitido."
+    assert cliente.recebidos == []
+
+
+def test_corpo_chunked_dentro_do_limite_e_aceito(cliente):
+    corpo, content_type = _multipart(100)
+    resposta = cliente.post(
+        "/upload", content=iter([corpo]), headers={"content-type": content_type}
+    )
+    assert resposta.status_code == 200
+    assert cliente.recebidos == [b"x" * 100]